@@ -0,0 +1,117 @@
+"""Compare recall and latency of the feature index against exact search.
+
+Run with `python -m benchmark.feature_index`. Uses the tracks in --feature-store
+when given, otherwise --tracks random tracks clustered the way songs of a
+genre are. Each query is three tracks picked as seeds and asks for as many
+candidates as a LOCAL preview does. Recall is the share of the exact nearest
+candidates the index also found, for each FEATURE_INDEX_PROBES.
+"""
+
+import argparse
+import math
+import tempfile
+import time
+
+import numpy as np
+from loguru import logger
+
+from mixtapestudy.build_feature_index import build_feature_index
+from mixtapestudy.feature_store import FeatureStore
+from mixtapestudy.features import (
+    FEATURES,
+    FeatureIndex,
+    FeatureMatrix,
+    load_feature_matrix,
+)
+from mixtapestudy.routes.playlist import RECOMMENDATION_LIMIT
+
+CANDIDATES = RECOMMENDATION_LIMIT * 2
+SEEDS = 3
+CLUSTERS = 500
+
+
+def _random_tracks(tracks: int, rng: np.random.Generator) -> FeatureMatrix:
+    centers = rng.random((CLUSTERS, len(FEATURES)))
+    features = centers[rng.integers(0, CLUSTERS, tracks)]
+    features += rng.normal(0, 0.05, features.shape)
+    return FeatureMatrix.from_features(np.arange(tracks), features)
+
+
+def _time_queries(
+    search: FeatureMatrix | FeatureIndex, queries: list[np.ndarray]
+) -> tuple[list[set[int]], list[float]]:
+    results = []
+    latencies = []
+    for seed_vectors in queries:
+        start = time.perf_counter()
+        rows, _ = search.nearest(seed_vectors, CANDIDATES, excluded_rows=[])
+        latencies.append(time.perf_counter() - start)
+        results.append(set(rows.tolist()))
+    return results, latencies
+
+
+def _report(name: str, latencies: list[float], recall: float) -> None:
+    milliseconds = np.array(latencies) * 1000
+    logger.info(
+        "{: <9} recall {:6.2%}, p50 {:6.2f}ms, p99 {:6.2f}ms",
+        name,
+        recall,
+        np.percentile(milliseconds, 50),
+        np.percentile(milliseconds, 99),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--feature-store")
+    parser.add_argument("--tracks", type=int, default=2_000_000)
+    parser.add_argument("--partitions", type=int)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--probes",
+        type=lambda value: [int(probes) for probes in value.split(",")],
+        default=[1, 2, 4, 8, 16, 32],
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.feature_store:
+        feature_matrix = load_feature_matrix(FeatureStore.open(args.feature_store))
+    else:
+        feature_matrix = _random_tracks(args.tracks, rng)
+    partitions = args.partitions or round(math.sqrt(len(feature_matrix.vectors)))
+
+    start = time.perf_counter()
+    feature_index = build_feature_index(feature_matrix, partitions)
+    logger.info(
+        "{} tracks, {} partitions built in {:.1f}s",
+        len(feature_matrix.vectors),
+        partitions,
+        time.perf_counter() - start,
+    )
+
+    queries = [
+        feature_matrix.vectors[rng.integers(0, len(feature_matrix.vectors), SEEDS)]
+        for _ in range(args.queries)
+    ]
+    exact_results, exact_latencies = _time_queries(feature_matrix, queries)
+    _report("exact", exact_latencies, 1.0)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        # Searched memory-mapped, the way the workers do
+        feature_index.save(index_dir)
+        for probes in args.probes:
+            results, latencies = _time_queries(
+                FeatureIndex.open(index_dir, probes), queries
+            )
+            recall = np.mean(
+                [
+                    len(result & exact) / len(exact)
+                    for result, exact in zip(results, exact_results, strict=True)
+                ]
+            )
+            _report(f"{probes} probes", latencies, recall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Measure how much logging adds to each request.
+
+Run with `python -m benchmark.logging_overhead`. Each simulated request logs
+what a playlist request does: a few SQL statements through the
+sqlalchemy.engine logger (run against SQLite so Postgres isn't needed), a few
+urllib3 connection lines and a few lines from g.logger. Requests are timed
+with logging set up the way development runs it and the way production should,
+against a baseline that only logs CRITICAL.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import Connection, create_engine, text
+
+from mixtapestudy.app import configure_logging
+
+STATEMENTS_PER_REQUEST = 6
+HTTP_CALLS_PER_REQUEST = 3
+
+_urllib3_logger = logging.getLogger("urllib3.connectionpool")
+
+
+def _logger_levels(level: int) -> dict[str, int]:
+    # Every mode sets both, configure_logging leaves loggers it isn't given as
+    # the previous mode set them
+    return {"sqlalchemy.engine": level, "urllib3": level}
+
+
+def _request(connection: Connection) -> None:
+    # What before_request binds to g.logger
+    request_log = logger.bind(spotify_id="benchmar", user="k")
+    request_log.debug("Selected songs: {}", ["a", "b", "c"])
+    for i in range(STATEMENTS_PER_REQUEST):
+        connection.execute(text("SELECT :value"), {"value": i})
+    for _ in range(HTTP_CALLS_PER_REQUEST):
+        # What urllib3 logs for each call it makes
+        _urllib3_logger.debug(
+            '%s://%s:%s "%s %s %s" %s %s',
+            "https",
+            "api.spotify.com",
+            443,
+            "GET",
+            "/v1/tracks",
+            "HTTP/1.1",
+            200,
+            None,
+        )
+    request_log.info("Generated playlist with {} songs", 25)
+
+
+def _time_requests(requests: int, configure: Callable[[], None]) -> float:
+    with Path(os.devnull).open("w") as devnull, redirect_stdout(devnull):
+        configure()
+        engine = create_engine("sqlite://")
+        with engine.connect() as connection:
+            start = time.perf_counter()
+            for _ in range(requests):
+                _request(connection)
+            elapsed = time.perf_counter() - start
+        engine.dispose()
+        logger.complete()
+    return elapsed / requests * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_directory:
+        log_file = str(Path(log_directory) / "mixtapestudy.log")
+        modes = {
+            "baseline": lambda: configure_logging(
+                logging.CRITICAL, _logger_levels(logging.CRITICAL)
+            ),
+            "development": lambda: configure_logging(
+                logging.DEBUG, _logger_levels(logging.DEBUG), log_file
+            ),
+            "production": lambda: configure_logging(
+                logging.INFO, _logger_levels(logging.WARNING), log_file
+            ),
+        }
+
+        # Rounds alternate between modes and the fastest counts, so a noisy
+        # neighbour slowing one round doesn't skew the comparison
+        results = dict.fromkeys(modes, float("inf"))
+        for _ in range(args.rounds):
+            for mode, configure in modes.items():
+                per_request = _time_requests(args.requests, configure)
+                results[mode] = min(results[mode], per_request)
+        configure_logging(logging.DEBUG, {})
+
+    baseline = results.pop("baseline")
+    logger.info(
+        "{} requests, {:.0f}us each logging only CRITICAL", args.requests, baseline
+    )
+    for mode, per_request in results.items():
+        logger.info(
+            "{: <11} {:.0f}us per request, {:.0f}us of it logging",
+            mode,
+            per_request,
+            per_request - baseline,
+        )
+
+
+if __name__ == "__main__":
+    main()
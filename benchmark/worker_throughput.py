@@ -0,0 +1,110 @@
+"""Compare request throughput of sync and gevent gunicorn workers.
+
+Run with `python -m benchmark.worker_throughput` while Postgres is up (`docker
+compose up --detach migration_done`, DATABASE_URL points at it by default).
+The app is served with gunicorn.conf.py once per worker class, against the
+stand-in Spotify and ListenBrainz of benchmark.app_throughput, and /search and
+/playlist/preview are driven with the same requests. Both routes use the
+database for the user, caches and rate limiter as well as the upstreams, so
+pool waits show up too: each run reports how long requests waited for a
+connection, from the app's /metrics.
+"""
+
+import argparse
+import os
+import re
+import secrets
+
+import requests
+from loguru import logger
+
+from benchmark.app_throughput import (
+    LISTENBRAINZ_ROUTES,
+    SPOTIFY_ROUTES,
+    BenchmarkClient,
+    Latency,
+    StandIn,
+    measure,
+    start_app,
+)
+
+WORKER_CLASSES = ("sync", "gevent")
+POOL_METRICS = re.compile(
+    r"^mixtapestudy_(database_checkouts|database_checkout_wait_ms"
+    r"|database_pool_overflows)_total (\S+)$",
+    re.MULTILINE,
+)
+
+
+def _pool_metrics(app_url: str) -> dict[str, float]:
+    metrics = requests.get(f"{app_url}/metrics", timeout=10).text
+    return {name: float(value) for name, value in POOL_METRICS.findall(metrics)}
+
+
+def _measure_worker_class(
+    worker_class: str, args: argparse.Namespace, spotify: StandIn, listenbrainz: StandIn
+) -> dict[str, float]:
+    secret = secrets.token_hex()
+    gunicorn, app_url = start_app(
+        args.workers, worker_class, spotify, listenbrainz, secret
+    )
+    try:
+        client = BenchmarkClient(app_url, secret, users=args.concurrency)
+        throughput = {
+            name: measure(
+                f"{worker_class} {name}", send, 0, args.requests, args.concurrency
+            )
+            for name, send in (
+                ("/search", client.search),
+                ("/playlist/preview", client.preview),
+            )
+        }
+        pool = _pool_metrics(app_url)
+    finally:
+        gunicorn.terminate()
+        gunicorn.wait()
+
+    checkouts = pool.get("database_checkouts", 0)
+    logger.info(
+        "{: <7} {:.0f} database checkouts, {:.1f}ms average wait, {:.0f} overflows",
+        worker_class,
+        checkouts,
+        pool.get("database_checkout_wait_ms", 0) / max(checkouts, 1),
+        pool.get("database_pool_overflows", 0),
+    )
+    return throughput
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # Written often enough for /metrics to be current when each run ends
+    os.environ.setdefault("METRICS_WRITE_INTERVAL", "1")
+    spotify = StandIn(SPOTIFY_ROUTES, Latency(0.05, 0.4), error_rate=0)
+    listenbrainz = StandIn(LISTENBRAINZ_ROUTES, Latency(0.5, 3), error_rate=0)
+
+    logger.info(
+        "{} workers, {} requests per route, {} at a time",
+        args.workers,
+        args.requests,
+        args.concurrency,
+    )
+    try:
+        sync, gevent = (
+            _measure_worker_class(worker_class, args, spotify, listenbrainz)
+            for worker_class in WORKER_CLASSES
+        )
+    finally:
+        spotify.shutdown()
+        listenbrainz.shutdown()
+
+    for name in sync:
+        logger.info("{: <17} gevent is {:.1f}x sync", name, gevent[name] / sync[name])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Gunicorn settings, loaded automatically from the working directory.
+
+GUNICORN_WORKER_CLASS=gevent runs each worker as an event loop instead of one
+request at a time. Routes spend nearly all their time waiting on Spotify,
+ListenBrainz and Postgres, so a gevent worker can serve up to
+GUNICORN_WORKER_CONNECTIONS requests at once.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+bind = "0.0.0.0"  # noqa: S104 (inside the container, nginx proxies to it)
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+timeout = 120
+
+if worker_class == "gevent":
+    # Every request in a gevent worker shares its pool, and a preview's
+    # RADIO_SEARCH_CONCURRENCY searches each take a connection for the caches,
+    # so 5 + 5 leaves most of them waiting on a checkout.
+    # Sessions are short, only a token refresh holds one across an upstream
+    # call, so a few more connections go a long way. 4 workers of
+    # 10 + 10 stay under Postgres' default max_connections of 100, put
+    # pgbouncer in front (DATABASE_POOL_MODE=pgbouncer) before raising them
+    os.environ.setdefault("DATABASE_POOL_SIZE", "10")
+    os.environ.setdefault("DATABASE_MAX_OVERFLOW", "10")
+
+# Workers write their metrics here for /metrics to add up, see metrics.py
+metrics_dir = os.environ.setdefault(
+    "METRICS_DIR", str(Path(tempfile.gettempdir()) / "mixtapestudy-metrics")
+)
+metrics_write_interval = float(os.getenv("METRICS_WRITE_INTERVAL", "5"))
+
+
+def on_starting(_: object) -> None:
+    from mixtapestudy.metrics import clear_metrics_dir
+
+    clear_metrics_dir(metrics_dir)
+
+
+def post_worker_init(_: object) -> None:
+    if worker_class == "gevent":
+        # The gevent worker has monkey patched the standard library by now,
+        # which covers requests, but psycopg2 talks to its socket in C
+        from mixtapestudy.database import make_connections_cooperative
+
+        make_connections_cooperative()
+
+    from mixtapestudy.metrics import start_metrics_writer
+
+    start_metrics_writer(metrics_dir, metrics_write_interval)
+
+    from mixtapestudy.config import RecommendationService, get_config
+    from mixtapestudy.features import get_feature_search, get_feature_store
+    from mixtapestudy.track_match import get_track_match_index
+
+    # Map the store and indexes (or load every vector) before the first
+    # preview needs them
+    config = get_config()
+    if config.feature_store:
+        get_feature_store(config.feature_store)
+    if config.recommendation_service == RecommendationService.LOCAL:
+        get_feature_search()
+    if config.track_match_index:
+        get_track_match_index(config.track_match_index)
+
+
+def worker_exit(_: object, __: object) -> None:
+    from mixtapestudy.metrics import write_metrics
+
+    write_metrics(metrics_dir)
@@ -1,26 +1,45 @@
 import inspect
 import logging
 import sys
+import time
+from contextlib import suppress
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from queue import SimpleQueue
+from threading import Thread
 from urllib.parse import urlparse
 
 import flask
 import sentry_sdk
-from flask import Flask, g, session
+from flask import Flask, g, request, session
 from loguru import logger
 from requests import HTTPError
 from sentry_sdk.types import Event, Hint
 from werkzeug.exceptions import MethodNotAllowed, NotFound
 
+from mixtapestudy.client import get_http_client
 from mixtapestudy.config import get_config
+from mixtapestudy.database import get_engine
 from mixtapestudy.error_handlers import (
     handle_404_not_found,
     handle_dev_null_bots,
     handle_generic_errors,
     handle_http_request_error,
+    handle_rate_limit_exceeded,
     handle_user_id_missing,
     handle_user_missing,
 )
 from mixtapestudy.errors import UserDatabaseRowMissingError, UserIDMissingError
+from mixtapestudy.ledger import finish_ledger, start_ledger
+from mixtapestudy.metrics import gauge, histogram
+from mixtapestudy.rate_limit import RateLimitExceededError
+
+REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "Time taken to answer requests, per route"
+)
+REQUESTS_IN_FLIGHT = gauge(
+    "http_requests_in_flight", "Requests being answered right now, per route"
+)
 
 
 class InterceptHandler(logging.Handler):
@@ -42,27 +61,115 @@ class InterceptHandler(logging.Handler):
         )
 
 
-# https://loguru.readthedocs.io/en/stable/api/logger.html#record
-logger.remove()
-logger.configure(extra={"spotify_id": "-", "user": "-"})
-logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
-logger.add(
-    sys.stdout,
-    colorize=True,
-    format="<level>{level: <8}</level> "
+class QueuedFileSink:
+    """Loguru sink that hands each formatted line to a thread to write.
+
+    Loguru's own enqueue=True pickles every record into a pipe, which costs
+    the request thread more than writing the line itself. This only puts the
+    line on an in-process queue, the thread writes whatever has queued up in
+    one go.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._queue = SimpleQueue()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file_handler = RotatingFileHandler(
+            path, maxBytes=500 * 1024 * 1024, backupCount=10, encoding="utf-8"
+        )
+        self._writer = Thread(target=self._write_lines, name="log-file", daemon=True)
+        self._writer.start()
+
+    def write(self, message: str) -> None:
+        self._queue.put(message)
+
+    def stop(self) -> None:
+        """Write what's still queued and close the file, loguru calls this."""
+        self._queue.put(None)
+        self._writer.join()
+        self._file_handler.close()
+
+    def _write_lines(self) -> None:
+        while True:
+            lines = [self._queue.get()]
+            while not self._queue.empty():
+                lines.append(self._queue.get())
+            stopping = None in lines
+            lines = [line for line in lines if line is not None]
+            if lines:
+                # Loguru formatted each line, the handler only rotates the file
+                self._file_handler.handle(
+                    logging.makeLogRecord({"msg": "".join(lines).rstrip("\n")})
+                )
+            if stopping:
+                return
+
+
+_LOG_FORMAT = (
+    "{time:YYYY-MM-DD HH:mm:ss.SSS} "
+    "| {extra[spotify_id]}:{extra[user]} "
+    "| {level: <8} | {name}:{line} | {message}"
+)
+_STDOUT_LOG_FORMAT = (
+    "<level>{level: <8}</level> "
     "| <light-blue>{extra[spotify_id]}</light-blue>"
     ":<light-green>{extra[user]}</light-green> "
     "| <yellow>{name}:{line}</yellow> "
-    "| <level>{message}</level>",
+    "| <level>{message}</level>"
 )
+_log_sink_ids = []
 
-requests_logger = logging.getLogger("requests.packages.urllib3")
-requests_logger.setLevel(logging.DEBUG)
-requests_logger.propagate = True
 
-sqlalchemy_logger = logging.getLogger("sqlalchemy.engine")
-sqlalchemy_logger.setLevel(logging.DEBUG)
-sqlalchemy_logger.propagate = True
+def configure_logging(
+    level: int,
+    logger_levels: dict[str, int],
+    log_file: str | None = None,
+    file_level: int = logging.INFO,
+) -> None:
+    """(Re)configure the loguru sinks and the standard library loggers.
+
+    The file sink is queued so requests never wait on the disk.
+    """
+    for sink_id in _log_sink_ids:
+        # Scripts like track_data.logsetup may have removed every sink already
+        with suppress(ValueError):
+            logger.remove(sink_id)  # Waits for the file sink to drain
+    _log_sink_ids.clear()
+
+    _log_sink_ids.append(
+        logger.add(sys.stdout, level=level, colorize=True, format=_STDOUT_LOG_FORMAT)
+    )
+    lowest_level = level
+    if log_file:
+        _log_sink_ids.append(
+            logger.add(
+                QueuedFileSink(log_file),
+                level=file_level,
+                colorize=False,
+                format=_LOG_FORMAT,
+            )
+        )
+        lowest_level = min(level, file_level)
+
+    # Loggers without a level of their own don't create records below the
+    # lowest sink level, and the handler's level drops records from loggers
+    # set lower than that before InterceptHandler looks for the caller's frame
+    logging.basicConfig(
+        handlers=[InterceptHandler(level=lowest_level)],
+        level=lowest_level,
+        force=True,
+    )
+    for name, logger_level in logger_levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+
+
+# https://loguru.readthedocs.io/en/stable/api/logger.html#record
+logger.remove()
+logger.configure(extra={"spotify_id": "-", "user": "-"})
+# SQLAlchemy sets its own loggers to WARNING, development wants every statement
+# until create_app applies LOG_LEVELS
+configure_logging(
+    logging.DEBUG, {"sqlalchemy.engine": logging.DEBUG, "urllib3": logging.DEBUG}
+)
 
 
 def filter_healthchecks(event: Event, _: Hint) -> Event:
@@ -75,20 +182,16 @@ def filter_healthchecks(event: Event, _: Hint) -> Event:
     if parsed_url.path == "/flask-health-check":
         return None
 
+    if parsed_url.path == "/metrics":
+        return None
+
     return event
 
 
 def create_app() -> Flask:
     config = get_config()  # Loads environment variables
-    logger.add(
-        config.log_file,
-        level=logging.INFO,
-        colorize=False,
-        rotation="500 MB",
-        retention=10,
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} "
-        "| {extra[spotify_id]}:{extra[user]} "
-        "| {level: <8} | {name}:{line} | {message}",
+    configure_logging(
+        config.log_level, config.log_levels, config.log_file, config.log_file_level
     )
 
     sentry_sdk.init(
@@ -102,6 +205,11 @@ def create_app() -> Flask:
 
     @flask_app.before_request
     def before_request() -> None:
+        g.request_route = request.endpoint or "unmatched"
+        g.request_start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.increment(route=g.request_route)
+        start_ledger()
+
         if "id" in session and "spotify_id" in session:
             user_id = str(session["id"])[24:]
             spotify_id = session["spotify_id"][:8]
@@ -109,6 +217,23 @@ def create_app() -> Flask:
         else:
             g.logger = logger.bind()
 
+    @flask_app.after_request
+    def after_request(response: flask.Response) -> flask.Response:
+        g.logger.debug("HTTP connection pool: {}", get_http_client().pool_stats())
+        g.logger.debug("Database connection pool: {}", get_engine().pool.status())
+        return response
+
+    @flask_app.teardown_request
+    def teardown_request(_: BaseException | None) -> None:
+        # Runs after errors and once a streamed response has been sent too
+        if "request_start" not in g:
+            return
+        REQUESTS_IN_FLIGHT.decrement(route=g.request_route)
+        REQUEST_DURATION.observe(
+            time.perf_counter() - g.pop("request_start"), route=g.request_route
+        )
+        finish_ledger(g.request_route)
+
     from mixtapestudy.routes.auth import auth
     from mixtapestudy.routes.playlist import playlist
     from mixtapestudy.routes.root import root
@@ -125,6 +250,7 @@ def create_app() -> Flask:
     flask_app.register_error_handler(NotFound, handle_404_not_found)
     flask_app.register_error_handler(MethodNotAllowed, handle_dev_null_bots)
     flask_app.register_error_handler(HTTPError, handle_http_request_error)
+    flask_app.register_error_handler(RateLimitExceededError, handle_rate_limit_exceeded)
     flask_app.register_error_handler(Exception, handle_generic_errors)
 
     return flask_app
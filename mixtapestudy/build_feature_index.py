@@ -0,0 +1,115 @@
+"""Build the FEATURE_INDEX for a FEATURE_STORE, see mixtapestudy.features.
+
+Run with `python -m mixtapestudy.build_feature_index FEATURE_STORE INDEX_DIR`.
+Centroids are trained with k-means on a sample of the vectors, then every
+vector is assigned to its nearest centroid and stored sorted by partition.
+Rebuild the index whenever the store is exported again, rows are tied to it.
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+from loguru import logger
+
+from mixtapestudy.feature_store import FeatureStore
+from mixtapestudy.features import FeatureIndex, FeatureMatrix, load_feature_matrix
+
+# Vectors per partition k-means is trained on, enough to place centroids well
+SAMPLE_PER_PARTITION = 64
+KMEANS_ITERATIONS = 15
+_ASSIGN_BATCH_SIZE = 8192
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the index of the centroid nearest each vector."""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    # In batches, a distance for every vector and centroid at once won't fit
+    for start in range(0, len(vectors), _ASSIGN_BATCH_SIZE):
+        distances = vectors[start : start + _ASSIGN_BATCH_SIZE] @ (-2 * centroids.T)
+        distances += centroid_norms
+        assignments[start : start + _ASSIGN_BATCH_SIZE] = distances.argmin(axis=1)
+    return assignments
+
+
+def train_centroids(
+    vectors: np.ndarray, partitions: int, rng: np.random.Generator
+) -> np.ndarray:
+    sample_size = min(len(vectors), partitions * SAMPLE_PER_PARTITION)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, partitions, replace=False)]
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = nearest_centroids(sample, centroids)
+        counts = np.bincount(assignments, minlength=partitions)
+        sums = np.stack(
+            [
+                np.bincount(
+                    assignments, weights=sample[:, feature], minlength=partitions
+                )
+                for feature in range(sample.shape[1])
+            ],
+            axis=1,
+        )
+        empty = counts == 0
+        centroids = (sums / np.maximum(counts, 1)[:, np.newaxis]).astype(np.float32)
+        # Partitions nothing was assigned to start again somewhere else
+        centroids[empty] = sample[rng.choice(sample_size, empty.sum())]
+    return centroids
+
+
+def build_feature_index(
+    feature_matrix: FeatureMatrix, partitions: int, seed: int = 0
+) -> FeatureIndex:
+    rng = np.random.default_rng(seed)
+    partitions = max(1, min(partitions, len(feature_matrix.vectors)))
+    if not len(feature_matrix.vectors):
+        centroids = np.empty((0, feature_matrix.vectors.shape[1]), dtype=np.float32)
+        order = np.empty(0, dtype=np.int64)
+        counts = np.empty(0, dtype=np.int64)
+    else:
+        centroids = train_centroids(feature_matrix.vectors, partitions, rng)
+        assignments = nearest_centroids(feature_matrix.vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=partitions)
+
+    return FeatureIndex(
+        centroids=centroids,
+        offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        rows=feature_matrix.rows[order],
+        vectors=feature_matrix.vectors[order],
+        squared_norms=feature_matrix.squared_norms[order],
+        mean=feature_matrix.mean,
+        std=feature_matrix.std,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("feature_store")
+    parser.add_argument("index_dir")
+    parser.add_argument(
+        "--partitions", type=int, help="defaults to the square root of the tracks"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    feature_matrix = load_feature_matrix(FeatureStore.open(args.feature_store))
+    partitions = args.partitions or round(math.sqrt(len(feature_matrix.vectors)))
+    logger.info(
+        "Loaded {} tracks in {:.1f}s, building {} partitions",
+        len(feature_matrix.vectors),
+        time.perf_counter() - start,
+        partitions,
+    )
+
+    build_feature_index(feature_matrix, partitions).save(args.index_dir)
+    logger.info(
+        "Index saved to {} in {:.1f}s", args.index_dir, time.perf_counter() - start
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Build the TRACK_MATCH_INDEX for a FEATURE_STORE, see mixtapestudy.track_match.
+
+Run with `python -m mixtapestudy.build_track_match_index FEATURE_STORE INDEX_DIR`.
+Rebuild the index whenever the store is exported again, rows are tied to it.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from loguru import logger
+
+from mixtapestudy.feature_store import FeatureStore, split_artists
+from mixtapestudy.track_match import TrackMatchIndex, key_hash, store_match_keys
+
+
+def build_track_match_index(feature_store: FeatureStore) -> TrackMatchIndex:
+    # Decoded a row at a time from the whole column, millions of mmap slices
+    # would take far longer
+    names = feature_store.columns["track_name"].tobytes()
+    name_offsets = feature_store.columns["track_name_offsets"].tolist()
+    artists = feature_store.columns["artist"].tobytes()
+    artist_offsets = feature_store.columns["artist_offsets"].tolist()
+
+    hashes = []
+    rows = []
+    for row in feature_store.complete(()).tolist():
+        name = names[name_offsets[row] : name_offsets[row + 1]].decode()
+        artist = artists[artist_offsets[row] : artist_offsets[row + 1]].decode()
+        for key in store_match_keys(name, split_artists(artist)):
+            hashes.append(key_hash(key))
+            rows.append(row)
+
+    hashes = np.array(hashes, dtype=np.uint64)
+    rows = np.array(rows, dtype=np.int64)
+    order = np.lexsort((rows, hashes))
+    hashes = hashes[order]
+    rows = rows[order]
+    first = np.ones(len(hashes), dtype=bool)
+    first[1:] = hashes[1:] != hashes[:-1]
+    return TrackMatchIndex(hashes=hashes[first], rows=rows[first])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("feature_store")
+    parser.add_argument("index_dir")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    track_match_index = build_track_match_index(FeatureStore.open(args.feature_store))
+    track_match_index.save(args.index_dir)
+    logger.info(
+        "{} match keys saved to {} in {:.1f}s",
+        len(track_match_index.hashes),
+        args.index_dir,
+        time.perf_counter() - start,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Caches for upstream results, all sharing the same get/set/TTL API.
+
+Which backend get_cache() hands out is chosen by CACHE_BACKEND:
+
+* postgres: an UNLOGGED table every gunicorn worker on every node shares,
+  it survives worker restarts and needs no service beyond the database.
+* memory: an LRU dict inside each worker, fastest but split per process.
+
+Values must be JSON serializable so callers work with either backend.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from threading import Lock
+from typing import Any, Protocol
+
+from sqlalchemy import delete, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from mixtapestudy.config import CacheBackend, get_config
+from mixtapestudy.database import CacheEntry, get_session
+from mixtapestudy.metrics import counter
+
+_caches = {}
+_local_caches = {}
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Cache(Protocol):
+    namespace: str
+
+    def get(self, key: str) -> Any | None: ...  # noqa: ANN401
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None: ...  # noqa: ANN401
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]: ...
+
+    def set_many(self, values: dict[str, Any], ttl: int | None = None) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def stats(self) -> CacheStats: ...
+
+
+class _CacheCounters:
+    def __init__(self, namespace: str) -> None:
+        self.hits = counter(f"{namespace}_cache_hits", f"{namespace} cache hits")
+        self.misses = counter(f"{namespace}_cache_misses", f"{namespace} cache misses")
+        self.evictions = counter(
+            f"{namespace}_cache_evictions", f"{namespace} entries evicted or expired"
+        )
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self.hits.value,
+            misses=self.misses.value,
+            evictions=self.evictions.value,
+        )
+
+
+class PostgresCache:
+    """TTL cache shared by every gunicorn worker through the cache_entry table.
+
+    Each namespace keeps at most max_entries rows, the least recently used
+    entries are evicted first. Reads mark an entry used, at most once every
+    TOUCH_INTERVAL seconds so popular entries don't cost a write per read.
+    """
+
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, namespace: str, ttl: int, max_entries: int) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._counters = _CacheCounters(namespace)
+
+    def get(self, key: str) -> Any | None:  # noqa: ANN401
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:  # noqa: ANN401
+        self.set_many({key: value}, ttl)
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Return the values found for the keys, in one query however many."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = datetime.now(tz=UTC)
+        touch_before = now - timedelta(seconds=self.TOUCH_INTERVAL)
+        with get_session() as db_session:
+            found = db_session.execute(
+                select(CacheEntry.key, CacheEntry.value, CacheEntry.updated).where(
+                    CacheEntry.namespace == self.namespace,
+                    CacheEntry.key.in_(keys),
+                    CacheEntry.expires > now,
+                )
+            ).all()
+            # Only entries not marked used recently are written
+            stale_keys = [key for key, _, updated in found if updated < touch_before]
+            if stale_keys:
+                db_session.execute(
+                    update(CacheEntry)
+                    .where(
+                        CacheEntry.namespace == self.namespace,
+                        CacheEntry.key.in_(stale_keys),
+                        CacheEntry.updated < touch_before,
+                    )
+                    .values(updated=now)
+                )
+
+        values = {key: value for key, value, _ in found}
+        self._counters.hits.increment(len(values))
+        self._counters.misses.increment(len(keys) - len(values))
+        return {key: values[key] for key in keys if key in values}
+
+    def set_many(self, values: dict[str, Any], ttl: int | None = None) -> None:
+        """Store every value in one upsert, then evict if the namespace is full."""
+        if not values:
+            return
+        now = datetime.now(tz=UTC)
+        expires = now + timedelta(seconds=ttl or self.ttl)
+        statement = insert(CacheEntry).values(
+            [
+                {
+                    "namespace": self.namespace,
+                    "key": key,
+                    "value": value,
+                    "expires": expires,
+                    "updated": now,
+                }
+                for key, value in values.items()
+            ]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[CacheEntry.namespace, CacheEntry.key],
+            set_={
+                "value": statement.excluded.value,
+                "expires": statement.excluded.expires,
+                "updated": statement.excluded.updated,
+            },
+        )
+
+        # The newest entry past max_entries, found by walking the namespace's
+        # updated index. None until the namespace is full.
+        first_evicted = (
+            select(CacheEntry.updated, CacheEntry.key)
+            .where(CacheEntry.namespace == self.namespace)
+            .order_by(CacheEntry.updated.desc(), CacheEntry.key.desc())
+            .offset(self.max_entries)
+            .limit(1)
+        )
+
+        with get_session() as db_session:
+            db_session.execute(statement)
+            evict_from = db_session.execute(first_evicted).one_or_none()
+            if evict_from is None:
+                return
+            evicted = db_session.execute(
+                delete(CacheEntry).where(
+                    CacheEntry.namespace == self.namespace,
+                    or_(
+                        tuple_(CacheEntry.updated, CacheEntry.key)
+                        <= tuple_(*evict_from),
+                        CacheEntry.expires <= now,
+                    ),
+                )
+            )
+        self._counters.evictions.increment(evicted.rowcount)
+
+    def delete(self, key: str) -> None:
+        with get_session() as db_session:
+            db_session.execute(
+                delete(CacheEntry).where(
+                    CacheEntry.namespace == self.namespace, CacheEntry.key == key
+                )
+            )
+
+    def clear(self) -> None:
+        with get_session() as db_session:
+            db_session.execute(
+                delete(CacheEntry).where(CacheEntry.namespace == self.namespace)
+            )
+
+    def stats(self) -> CacheStats:
+        return self._counters.stats()
+
+
+class LRUCache:
+    """TTL cache held in this worker's memory.
+
+    Once max_entries is reached the least recently used entry is evicted.
+    """
+
+    def __init__(self, namespace: str, ttl: int, max_entries: int) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+        self._counters = _CacheCounters(namespace)
+
+    def get(self, key: str) -> Any | None:  # noqa: ANN401
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self._counters.misses.increment()
+                return None
+
+            self._entries.move_to_end(key)
+            self._counters.hits.increment()
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: int | None = None) -> None:  # noqa: ANN401
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters.evictions.increment()
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        found = {}
+        for key in dict.fromkeys(keys):
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set_many(self, values: dict[str, Any], ttl: int | None = None) -> None:
+        for key, value in values.items():
+            self.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        return self._counters.stats()
+
+
+def get_cache(namespace: str, ttl: int, max_entries: int) -> Cache:
+    """Return this worker's cache for the namespace, creating it once."""
+    if namespace not in _caches:
+        match get_config().cache_backend:
+            case CacheBackend.POSTGRES:
+                _caches[namespace] = PostgresCache(namespace, ttl, max_entries)
+            case CacheBackend.MEMORY:
+                _caches[namespace] = LRUCache(namespace, ttl, max_entries)
+    return _caches[namespace]
+
+
+def get_local_cache(namespace: str, ttl: int, max_entries: int) -> LRUCache:
+    """Return this worker's in-memory cache for the namespace, whatever the backend.
+
+    For values that aren't JSON serializable or that must not cost a round trip.
+    """
+    if namespace not in _local_caches:
+        _local_caches[namespace] = LRUCache(namespace, ttl, max_entries)
+    return _local_caches[namespace]
+
+
+def clear_caches() -> None:
+    for cache in [*_caches.values(), *_local_caches.values()]:
+        cache.clear()
@@ -0,0 +1,170 @@
+import os
+import time
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from mixtapestudy.config import SPOTIFY_BASE_URL, USER_AGENT, get_config
+from mixtapestudy.ledger import UpstreamCall, current_ledger
+from mixtapestudy.metrics import gauge, histogram
+from mixtapestudy.rate_limit import RateLimiter
+
+_http_client = None
+_http_client_pid = None
+
+UPSTREAM_DURATION = histogram(
+    "upstream_request_duration_seconds",
+    "Time upstreams took to answer, per upstream and endpoint",
+)
+UPSTREAM_REQUESTS_IN_FLIGHT = gauge(
+    "upstream_requests_in_flight", "Outbound requests waiting on each upstream"
+)
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    # Requests sent over a connection that was already open
+    hits: int
+    # Requests that had to open a new connection (TCP + TLS handshake)
+    misses: int
+
+
+class HttpClient:
+    """Keep-alive HTTP client for every outbound call made by the app.
+
+    Connections to Spotify and ListenBrainz are pooled per host and reused
+    across requests instead of being negotiated from scratch on every call.
+
+    Calls to a URL under one of the rate_limits prefixes wait for a token
+    first, and are retried after the Retry-After of a 429 response.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int,
+        pool_maxsize: int,
+        rate_limits: dict[str, RateLimiter] | None = None,
+        max_retries: int = 0,
+    ) -> None:
+        self._rate_limits = rate_limits or {}
+        self._max_retries = max_retries
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self._session = requests.Session()
+        self._session.headers["User-Agent"] = USER_AGENT
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        access_token: str | None = None,
+        endpoint: str = "other",
+        retry_reason: str | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> requests.Response:
+        """Send a request, recording it in the metrics and the request's ledger.
+
+        endpoint names the call, retry_reason says why it repeats an earlier one.
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        kwargs.setdefault("timeout", 30)
+        upstream = urlparse(url).hostname
+        ledger = current_ledger()
+
+        def send(retry_reason: str | None) -> requests.Response:
+            UPSTREAM_REQUESTS_IN_FLIGHT.increment(upstream=upstream)
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self._session.request(method, url, headers=headers, **kwargs)
+                return response
+            finally:
+                duration = time.perf_counter() - start
+                UPSTREAM_REQUESTS_IN_FLIGHT.decrement(upstream=upstream)
+                UPSTREAM_DURATION.observe(
+                    duration, upstream=upstream, endpoint=endpoint
+                )
+                if ledger:
+                    ledger.record(
+                        UpstreamCall(
+                            host=upstream,
+                            endpoint=endpoint,
+                            status=getattr(response, "status_code", None),
+                            duration=duration,
+                            retry_reason=retry_reason,
+                        )
+                    )
+
+        rate_limiter = next(
+            (rl for prefix, rl in self._rate_limits.items() if url.startswith(prefix)),
+            None,
+        )
+        if not rate_limiter:
+            return send(retry_reason)
+
+        for attempt in range(self._max_retries + 1):
+            rate_limiter.acquire()
+            response = send(retry_reason)
+            if response.status_code != HTTPStatus.TOO_MANY_REQUESTS:
+                break
+            rate_limiter.throttle(_retry_after(response))
+            retry_reason = "429"
+            if attempt < self._max_retries:
+                logger.info("Retrying {} {} after 429", method, url)
+        return response
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:  # noqa: ANN401
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:  # noqa: ANN401
+        return self.request("POST", url, **kwargs)
+
+    def pool_stats(self) -> PoolStats:
+        hits = 0
+        misses = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():  # noqa: SIM118 (the container can't be iterated)
+            pool = pools[key]
+            misses += pool.num_connections
+            hits += pool.num_requests - pool.num_connections
+        return PoolStats(hits=hits, misses=misses)
+
+
+def _retry_after(response: requests.Response) -> float:
+    try:
+        return float(response.headers.get("Retry-After", 1))
+    except ValueError:  # Spotify only sends seconds, but an HTTP date is allowed
+        return 1.0
+
+
+def get_http_client() -> HttpClient:
+    global _http_client, _http_client_pid  # noqa: PLW0603
+    # Sockets can't be shared between gunicorn workers, each process gets its own
+    if not _http_client or _http_client_pid != os.getpid():
+        config = get_config()
+        _http_client = HttpClient(
+            pool_connections=config.http_pool_connections,
+            pool_maxsize=config.http_pool_maxsize,
+            rate_limits={
+                SPOTIFY_BASE_URL: RateLimiter(
+                    "spotify",
+                    rate=config.spotify_rate_limit,
+                    burst=config.spotify_rate_limit_burst,
+                    max_wait=config.spotify_rate_limit_max_wait,
+                    batch=config.spotify_rate_limit_batch,
+                )
+            },
+            max_retries=config.spotify_max_retries,
+        )
+        _http_client_pid = os.getpid()
+    return _http_client
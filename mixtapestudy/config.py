@@ -1,10 +1,16 @@
+import logging
 import os
 import sys
 from enum import StrEnum
 
 from loguru import logger
 
-SPOTIFY_BASE_URL = "https://api.spotify.com/v1"
+# Pointed at stand-in servers by benchmark/app_throughput.py
+SPOTIFY_BASE_URL = os.getenv("SPOTIFY_BASE_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+LISTENBRAINZ_BASE_URL = os.getenv(
+    "LISTENBRAINZ_BASE_URL", "https://api.listenbrainz.org/1"
+)
 USER_AGENT = "https://mixtapestudy.com/v1 ( douglas@builtonbits.com )"
 
 
@@ -21,15 +27,78 @@ class InvalidConfigurationError(Exception):
 class RecommendationService(StrEnum):
     LISTENBRAINZ = "listenbrainz"
     SPOTIFY = "spotify"
+    # Nearest tracks in the FEATURE_STORE, see mixtapestudy.features
+    LOCAL = "local"
+
+
+def _int_from_env(variable_name: str, default: int) -> int:
+    value = int(os.getenv(variable_name, str(default)))
+    logger.debug("{}={}", variable_name.lower(), value)
+    return value
+
+
+def _log_level(variable_name: str, level_name: str) -> int:
+    level = logging.getLevelNamesMapping().get(level_name.strip().upper())
+    if level is None:
+        logger.error(
+            "Invalid level in {}: {}, valid levels: {}",
+            variable_name,
+            level_name,
+            ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        )
+        sys.exit(1)
+    return level
+
+
+def _log_levels_from_env(variable_name: str, default: str) -> dict[str, int]:
+    """Parse logger levels written as `name=LEVEL,name=LEVEL`."""
+    levels = {}
+    for setting in filter(None, os.getenv(variable_name, default).split(",")):
+        name, _, level_name = setting.partition("=")
+        levels[name.strip()] = _log_level(variable_name, level_name)
+    logger.debug("{}={}", variable_name.lower(), levels)
+    return levels
+
+
+class PreviewMode(StrEnum):
+    # Generate the preview inside the web request
+    SYNC = "sync"
+    # Queue it for `python -m mixtapestudy.worker` while the page polls for it
+    QUEUE = "queue"
+    # Generate it inside the web request, sending each song as soon as it's found
+    STREAM = "stream"
+
+
+class DatabasePoolMode(StrEnum):
+    # Keep a pool of connections in each process
+    QUEUE = "queue"
+    # Open a connection per session and leave pooling to pgbouncer
+    PGBOUNCER = "pgbouncer"
+
+
+class CacheBackend(StrEnum):
+    MEMORY = "memory"
+    POSTGRES = "postgres"
 
 
 class Config:
-    def __init__(self) -> None:
+    def __init__(self) -> None:  # noqa: C901, PLR0915
         self._log_file: str = os.environ.get(
             "LOG_FILE", "/home/app/log/mixtapestudy.log"
         )
         logger.debug("logfile={}", self._log_file)  # Ironically
 
+        # The defaults are for development, docker-compose.yml runs with
+        # LOG_LEVEL=INFO and LOG_LEVELS=sqlalchemy.engine=WARNING,urllib3=WARNING.
+        # Records below every level are dropped before loguru ever sees them
+        self._log_level: int = _log_level("LOG_LEVEL", os.getenv("LOG_LEVEL", "DEBUG"))
+        self._log_file_level: int = _log_level(
+            "LOG_FILE_LEVEL", os.getenv("LOG_FILE_LEVEL", "INFO")
+        )
+        self._log_levels: dict[str, int] = _log_levels_from_env(
+            "LOG_LEVELS", "sqlalchemy.engine=DEBUG,urllib3=DEBUG"
+        )
+
         self._oauth_redirect_base_url: str = os.environ.get(
             "OAUTH_REDIRECT_BASE_URL",
             "https://mixtapestudy.com",
@@ -56,6 +125,68 @@ class Config:
             raise MissingEnvironmentVariableError("SESSION_SECRET")
         logger.debug("SESSION_SECRET defined (not shown)")
 
+        database_pool_mode_str: str = os.getenv("DATABASE_POOL_MODE", "queue")
+        try:
+            self._database_pool_mode = DatabasePoolMode(database_pool_mode_str)
+        except ValueError:
+            logger.error(
+                "Invalid DATABASE_POOL_MODE, valid values: {}",
+                [dpm.value for dpm in DatabasePoolMode],
+            )
+            sys.exit(1)
+        logger.debug("database_pool_mode={}", self._database_pool_mode)
+
+        # Each process holds up to size + overflow connections, Postgres'
+        # max_connections has to cover that for every worker and script
+        self._database_pool_size: int = _int_from_env("DATABASE_POOL_SIZE", 5)
+        self._database_max_overflow: int = _int_from_env("DATABASE_MAX_OVERFLOW", 5)
+        # Seconds to wait for a free connection before giving up on the request
+        self._database_pool_timeout: int = _int_from_env("DATABASE_POOL_TIMEOUT", 10)
+        # Seconds before a connection is replaced, -1 to keep connections forever
+        self._database_pool_recycle: int = _int_from_env("DATABASE_POOL_RECYCLE", 1800)
+        # 1 to test each connection with SELECT 1 before handing it out
+        self._database_pool_pre_ping: bool = bool(
+            _int_from_env("DATABASE_POOL_PRE_PING", 1)
+        )
+
+        # Set by gunicorn.conf.py, /metrics adds up the metrics workers write
+        # there. Left empty it only shows the worker that answers
+        self._metrics_dir: str = os.getenv("METRICS_DIR", "")
+        logger.debug("metrics_dir={}", self._metrics_dir)
+        # Seconds between writes of this process's metrics to METRICS_DIR
+        self._metrics_write_interval: float = float(
+            os.getenv("METRICS_WRITE_INTERVAL", "5")
+        )
+
+        # Requests making more outbound calls than this, or waiting on upstreams
+        # for longer in total (seconds), are logged as over budget. A preview
+        # normally makes ~50: the radio, then one or two searches per track
+        self._upstream_call_budget: int = _int_from_env("UPSTREAM_CALL_BUDGET", 60)
+        self._upstream_time_budget: int = _int_from_env("UPSTREAM_TIME_BUDGET", 20)
+
+        # Hosts to keep a connection pool for, and sockets kept open per host
+        self._http_pool_connections: int = _int_from_env("HTTP_POOL_CONNECTIONS", 4)
+        self._http_pool_maxsize: int = _int_from_env("HTTP_POOL_MAXSIZE", 10)
+
+        # Requests per second shared by every worker, bursts up to the bucket size.
+        # Spotify publishes no fixed rate, it counts calls over a rolling 30
+        # seconds and answers 429 with a Retry-After once an app goes over. So
+        # by default (0) only those 429s hold every worker back, set a rate to
+        # stay under a limit Spotify has been seen to enforce
+        self._spotify_rate_limit: int = _int_from_env("SPOTIFY_RATE_LIMIT", 0)
+        self._spotify_rate_limit_burst: int = _int_from_env(
+            "SPOTIFY_RATE_LIMIT_BURST", 50
+        )
+        # Seconds a request may be held back before the user gets an error instead
+        self._spotify_rate_limit_max_wait: int = _int_from_env(
+            "SPOTIFY_RATE_LIMIT_MAX_WAIT", 10
+        )
+        # Tokens each process takes from the shared bucket at once
+        self._spotify_rate_limit_batch: int = _int_from_env(
+            "SPOTIFY_RATE_LIMIT_BATCH", 10
+        )
+        self._spotify_max_retries: int = _int_from_env("SPOTIFY_MAX_RETRIES", 2)
+
         recommendation_service_str: str = os.getenv("RECOMMENDATION_SERVICE", "spotify")
         try:
             self._recommendation_service = RecommendationService(
@@ -69,16 +200,143 @@ class Config:
             sys.exit(1)
         logger.debug("recommendation_service={}", self._recommendation_service)
 
+        # Keep this at or below HTTP_POOL_MAXSIZE so every search gets a pooled socket
+        self._radio_search_concurrency: int = _int_from_env(
+            "RADIO_SEARCH_CONCURRENCY", 8
+        )
+
+        # Seconds before a track Spotify couldn't find is searched for again
+        self._track_resolution_miss_ttl: int = _int_from_env(
+            "TRACK_RESOLUTION_MISS_TTL", 86400
+        )
+
+        # Seconds an artist lb-radio couldn't look up is left out of radio prompts
+        self._rejected_artist_ttl: int = _int_from_env("REJECTED_ARTIST_TTL", 604800)
+
+        self._radio_cache_ttl: int = _int_from_env("RADIO_CACHE_TTL", 3600)
+        self._radio_cache_max_entries: int = _int_from_env(
+            "RADIO_CACHE_MAX_ENTRIES", 1000
+        )
+
+        self._recommendations_cache_ttl: int = _int_from_env(
+            "RECOMMENDATIONS_CACHE_TTL", 600
+        )
+        self._recommendations_cache_max_entries: int = _int_from_env(
+            "RECOMMENDATIONS_CACHE_MAX_ENTRIES", 256
+        )
+
+        cache_backend_str: str = os.getenv("CACHE_BACKEND", "postgres")
+        try:
+            self._cache_backend = CacheBackend(cache_backend_str)
+        except ValueError:
+            logger.error(
+                "Invalid CACHE_BACKEND, valid values: {}",
+                [cb.value for cb in CacheBackend],
+            )
+            sys.exit(1)
+        logger.debug("cache_backend={}", self._cache_backend)
+
+        self._search_cache_ttl: int = _int_from_env("SEARCH_CACHE_TTL", 300)
+        self._search_cache_max_entries: int = _int_from_env(
+            "SEARCH_CACHE_MAX_ENTRIES", 1024
+        )
+
+        # Track metadata rarely changes, it's kept for a day
+        self._tracks_cache_ttl: int = _int_from_env("TRACKS_CACHE_TTL", 86400)
+        self._tracks_cache_max_entries: int = _int_from_env(
+            "TRACKS_CACHE_MAX_ENTRIES", 4096
+        )
+
+        preview_mode_str: str = os.getenv("PREVIEW_MODE", "sync")
+        try:
+            self._preview_mode = PreviewMode(preview_mode_str)
+        except ValueError:
+            logger.error(
+                "Invalid PREVIEW_MODE, valid values: {}",
+                [pm.value for pm in PreviewMode],
+            )
+            sys.exit(1)
+        logger.debug("preview_mode={}", self._preview_mode)
+
+        # Seconds before a running job is assumed lost with its worker and retried
+        self._preview_job_timeout: int = _int_from_env("PREVIEW_JOB_TIMEOUT", 300)
+        self._preview_job_retention: int = _int_from_env("PREVIEW_JOB_RETENTION", 86400)
+        self._preview_worker_poll_interval: int = _int_from_env(
+            "PREVIEW_WORKER_POLL_INTERVAL", 1
+        )
+        # Jobs each preview worker process runs at once, one thread per job
+        self._preview_worker_concurrency: int = _int_from_env(
+            "PREVIEW_WORKER_CONCURRENCY", 4
+        )
+
+        # The token refresher wakes every interval and refreshes tokens expiring
+        # within TOKEN_REFRESH_AHEAD seconds for users seen in the active window
+        self._token_refresh_interval: int = _int_from_env("TOKEN_REFRESH_INTERVAL", 60)
+        self._token_refresh_ahead: int = _int_from_env("TOKEN_REFRESH_AHEAD", 900)
+        self._token_refresh_active_window: int = _int_from_env(
+            "TOKEN_REFRESH_ACTIVE_WINDOW", 7200
+        )
+        self._token_refresh_batch_size: int = _int_from_env(
+            "TOKEN_REFRESH_BATCH_SIZE", 100
+        )
+        self._token_refresh_concurrency: int = _int_from_env(
+            "TOKEN_REFRESH_CONCURRENCY", 4
+        )
+        # Seconds before the refresher tries a user whose refresh failed again,
+        # usually the grant was revoked and only logging in again fixes it
+        self._token_refresh_retry_after: int = _int_from_env(
+            "TOKEN_REFRESH_RETRY_AFTER", 3600
+        )
+
+        # Seconds a worker reuses a user loaded by an earlier request
+        self._user_cache_ttl: int = _int_from_env("USER_CACHE_TTL", 30)
+        self._user_cache_max_entries: int = _int_from_env(
+            "USER_CACHE_MAX_ENTRIES", 1024
+        )
+
         if self._recommendation_service == RecommendationService.LISTENBRAINZ:
             self._listenbrainz_api_key: str = os.getenv("LISTENBRAINZ_API_KEY", "")
             if not self._listenbrainz_api_key:
                 raise MissingEnvironmentVariableError("LISTENBRAINZ_API_KEY")
             logger.debug("LISTENBRAINZ_API_KEY defined (not shown)")
 
+        # Exported by track_data/export_feature_store.py
+        self._feature_store: str = os.getenv("FEATURE_STORE", "")
+        # Index built by mixtapestudy.build_track_match_index, radio tracks are
+        # all searched for on Spotify without one
+        self._track_match_index: str = os.getenv("TRACK_MATCH_INDEX", "")
+        if not self._feature_store and (
+            self._recommendation_service == RecommendationService.LOCAL
+            or self._track_match_index
+        ):
+            raise MissingEnvironmentVariableError("FEATURE_STORE")
+        logger.debug("feature_store={}", self._feature_store)
+        logger.debug("track_match_index={}", self._track_match_index)
+
+        # Index built by mixtapestudy.build_feature_index, every vector in
+        # the FEATURE_STORE is searched without one
+        self._feature_index: str = os.getenv("FEATURE_INDEX", "")
+        logger.debug("feature_index={}", self._feature_index)
+        # Index partitions searched per seed, more find more of the nearest
+        # tracks and take longer (see benchmark/feature_index.py)
+        self._feature_index_probes: int = _int_from_env("FEATURE_INDEX_PROBES", 8)
+
     @property
     def log_file(self) -> str:
         return self._log_file
 
+    @property
+    def log_level(self) -> int:
+        return self._log_level
+
+    @property
+    def log_file_level(self) -> int:
+        return self._log_file_level
+
+    @property
+    def log_levels(self) -> dict[str, int]:
+        return self._log_levels
+
     @property
     def oauth_redirect_base_url(self) -> str:
         return self._oauth_redirect_base_url
@@ -99,16 +357,200 @@ class Config:
     def session_secret(self) -> str:
         return self._session_secret
 
+    @property
+    def database_pool_mode(self) -> DatabasePoolMode:
+        return self._database_pool_mode
+
+    @property
+    def database_pool_size(self) -> int:
+        return self._database_pool_size
+
+    @property
+    def database_max_overflow(self) -> int:
+        return self._database_max_overflow
+
+    @property
+    def database_pool_timeout(self) -> int:
+        return self._database_pool_timeout
+
+    @property
+    def database_pool_recycle(self) -> int:
+        return self._database_pool_recycle
+
+    @property
+    def database_pool_pre_ping(self) -> bool:
+        return self._database_pool_pre_ping
+
+    @property
+    def metrics_dir(self) -> str:
+        return self._metrics_dir
+
+    @property
+    def metrics_write_interval(self) -> float:
+        return self._metrics_write_interval
+
+    @property
+    def upstream_call_budget(self) -> int:
+        return self._upstream_call_budget
+
+    @property
+    def upstream_time_budget(self) -> int:
+        return self._upstream_time_budget
+
+    @property
+    def http_pool_connections(self) -> int:
+        return self._http_pool_connections
+
+    @property
+    def http_pool_maxsize(self) -> int:
+        return self._http_pool_maxsize
+
+    @property
+    def spotify_rate_limit(self) -> int:
+        return self._spotify_rate_limit
+
+    @property
+    def spotify_rate_limit_burst(self) -> int:
+        return self._spotify_rate_limit_burst
+
+    @property
+    def spotify_rate_limit_max_wait(self) -> int:
+        return self._spotify_rate_limit_max_wait
+
+    @property
+    def spotify_rate_limit_batch(self) -> int:
+        return self._spotify_rate_limit_batch
+
+    @property
+    def spotify_max_retries(self) -> int:
+        return self._spotify_max_retries
+
     @property
     def recommendation_service(self) -> RecommendationService:
         return self._recommendation_service
 
+    @property
+    def radio_search_concurrency(self) -> int:
+        return self._radio_search_concurrency
+
+    @property
+    def track_resolution_miss_ttl(self) -> int:
+        return self._track_resolution_miss_ttl
+
+    @property
+    def rejected_artist_ttl(self) -> int:
+        return self._rejected_artist_ttl
+
+    @property
+    def radio_cache_ttl(self) -> int:
+        return self._radio_cache_ttl
+
+    @property
+    def radio_cache_max_entries(self) -> int:
+        return self._radio_cache_max_entries
+
+    @property
+    def recommendations_cache_ttl(self) -> int:
+        return self._recommendations_cache_ttl
+
+    @property
+    def recommendations_cache_max_entries(self) -> int:
+        return self._recommendations_cache_max_entries
+
+    @property
+    def cache_backend(self) -> CacheBackend:
+        return self._cache_backend
+
+    @property
+    def search_cache_ttl(self) -> int:
+        return self._search_cache_ttl
+
+    @property
+    def search_cache_max_entries(self) -> int:
+        return self._search_cache_max_entries
+
+    @property
+    def tracks_cache_ttl(self) -> int:
+        return self._tracks_cache_ttl
+
+    @property
+    def tracks_cache_max_entries(self) -> int:
+        return self._tracks_cache_max_entries
+
+    @property
+    def preview_mode(self) -> PreviewMode:
+        return self._preview_mode
+
+    @property
+    def preview_job_timeout(self) -> int:
+        return self._preview_job_timeout
+
+    @property
+    def preview_job_retention(self) -> int:
+        return self._preview_job_retention
+
+    @property
+    def preview_worker_poll_interval(self) -> int:
+        return self._preview_worker_poll_interval
+
+    @property
+    def preview_worker_concurrency(self) -> int:
+        return self._preview_worker_concurrency
+
+    @property
+    def token_refresh_interval(self) -> int:
+        return self._token_refresh_interval
+
+    @property
+    def token_refresh_ahead(self) -> int:
+        return self._token_refresh_ahead
+
+    @property
+    def token_refresh_active_window(self) -> int:
+        return self._token_refresh_active_window
+
+    @property
+    def token_refresh_batch_size(self) -> int:
+        return self._token_refresh_batch_size
+
+    @property
+    def token_refresh_concurrency(self) -> int:
+        return self._token_refresh_concurrency
+
+    @property
+    def token_refresh_retry_after(self) -> int:
+        return self._token_refresh_retry_after
+
+    @property
+    def user_cache_ttl(self) -> int:
+        return self._user_cache_ttl
+
+    @property
+    def user_cache_max_entries(self) -> int:
+        return self._user_cache_max_entries
+
     @property
     def listenbrainz_api_key(self) -> str:
         if self._recommendation_service == RecommendationService.LISTENBRAINZ:
             return self._listenbrainz_api_key
         raise InvalidConfigurationError("RECOMMENDATION_SERVICE", "listenbrainz")
 
+    @property
+    def feature_store(self) -> str:
+        return self._feature_store
+
+    @property
+    def track_match_index(self) -> str:
+        return self._track_match_index
+
+    @property
+    def feature_index(self) -> str:
+        return self._feature_index
+
+    @property
+    def feature_index_probes(self) -> int:
+        return self._feature_index_probes
+
 
 _config: Config | None = None
 
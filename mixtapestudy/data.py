@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from datetime import datetime
 from uuid import UUID
 
+from mixtapestudy.models import JobStatus
+
 
 @dataclass(frozen=True)
 class UserData:
@@ -15,3 +17,15 @@ class UserData:
     token_scope: str
     token_expires: datetime
     refresh_token: str
+    last_seen: datetime | None
+    refresh_failed_at: datetime | None
+
+
+@dataclass(frozen=True)
+class PreviewJobData:
+    id: UUID
+    user_id: UUID
+    status: JobStatus
+    selected_songs: list[dict[str, str]]
+    playlist_songs: list[dict] | None
+    error_code: str | None
@@ -1,28 +1,136 @@
+import os
+import time
 import uuid
 from collections.abc import Generator
 from contextlib import contextmanager
 from datetime import UTC, datetime
 
-from sqlalchemy import DateTime, Engine, String, Text, Uuid, create_engine
+from sqlalchemy import (
+    JSON,
+    DateTime,
+    Engine,
+    Float,
+    ForeignKey,
+    Index,
+    String,
+    Text,
+    UniqueConstraint,
+    Uuid,
+    create_engine,
+    event,
+)
 from sqlalchemy.orm import DeclarativeBase, Session, mapped_column
+from sqlalchemy.pool import NullPool, Pool, PoolProxiedConnection, QueuePool
 
-from mixtapestudy.config import get_config
+from mixtapestudy.config import Config, DatabasePoolMode, get_config
+from mixtapestudy.metrics import counter, gauge
 
 _database_engine = None
+_database_engine_pid = None
+
+DATABASE_CHECKOUTS = counter("database_checkouts", "Connections handed out to sessions")
+DATABASE_CHECKOUT_WAIT_MS = counter(
+    "database_checkout_wait_ms",
+    "Milliseconds spent waiting for a connection, including connecting",
+)
+DATABASE_POOL_OVERFLOWS = counter(
+    "database_pool_overflows", "Connections opened beyond DATABASE_POOL_SIZE"
+)
+DATABASE_POOL_CHECKED_OUT = gauge(
+    "database_pool_checked_out", "Connections currently used by sessions"
+)
+DATABASE_POOL_OVERFLOW = gauge(
+    "database_pool_overflow", "Overflow connections currently open"
+)
 
 
 class UnexpectedDatabaseError(Exception):
     pass
 
 
+class _TimedCheckout(Pool):
+    def connect(self) -> PoolProxiedConnection:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DATABASE_CHECKOUTS.increment()
+            DATABASE_CHECKOUT_WAIT_MS.increment(
+                round((time.perf_counter() - start) * 1000)
+            )
+
+
+class _TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class _TimedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def _watch_pool(engine: Engine) -> None:
+    # engine.pool is looked up each time, dispose() replaces it
+    def record_checkout(*_: object) -> None:
+        DATABASE_POOL_CHECKED_OUT.set(engine.pool.checkedout())
+        DATABASE_POOL_OVERFLOW.set(max(engine.pool.overflow(), 0))
+
+    def record_checkin(*_: object) -> None:
+        # Fired before the pool takes the connection back
+        DATABASE_POOL_CHECKED_OUT.set(engine.pool.checkedout() - 1)
+
+    def record_connect(*_: object) -> None:
+        # The pool counts the new connection before opening it
+        if engine.pool.overflow() > 0:
+            DATABASE_POOL_OVERFLOWS.increment()
+
+    event.listen(engine, "connect", record_connect)
+    event.listen(engine, "checkout", record_checkout)
+    event.listen(engine, "checkin", record_checkin)
+
+
+def create_database_engine(config: Config) -> Engine:
+    if config.database_pool_mode == DatabasePoolMode.PGBOUNCER:
+        # pgbouncer pools server connections across every process, holding
+        # more here would only pin them. psycopg2 doesn't prepare statements
+        # server-side so transaction pooling works as is
+        return create_engine(config.database_url, poolclass=_TimedNullPool)
+
+    engine = create_engine(
+        config.database_url,
+        poolclass=_TimedQueuePool,
+        pool_size=config.database_pool_size,
+        max_overflow=config.database_max_overflow,
+        pool_timeout=config.database_pool_timeout,
+        pool_recycle=config.database_pool_recycle,
+        pool_pre_ping=config.database_pool_pre_ping,
+    )
+    _watch_pool(engine)
+    return engine
+
+
 def get_engine() -> Engine:
-    global _database_engine  # noqa: PLW0603
+    global _database_engine, _database_engine_pid  # noqa: PLW0603
     if not _database_engine:
-        config = get_config()
-        _database_engine = create_engine(config.database_url)
+        _database_engine = create_database_engine(get_config())
+    elif _database_engine_pid != os.getpid():
+        # Inherited from the parent across a fork, the pooled sockets belong
+        # to the parent. Drop them without closing so the parent keeps working
+        _database_engine.dispose(close=False)
+    _database_engine_pid = os.getpid()
     return _database_engine
 
 
+def make_connections_cooperative() -> None:
+    """Let other greenlets run while psycopg2 waits on Postgres.
+
+    Only for gevent workers, see gunicorn.conf.py. The connection pool is safe
+    to share between greenlets once gevent has patched threading.
+    """
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
+
+
 @contextmanager
 def get_session() -> Generator[Session, None, None]:
     with Session(get_engine()) as session:
@@ -67,6 +175,10 @@ class User(CommonColumns):
     token_scope = mapped_column(String(255), nullable=False)
     token_expires = mapped_column(DateTime(timezone=True), nullable=False)
     refresh_token = mapped_column(Text(), nullable=False)
+    # Last request made by the user, see mixtapestudy.token_refresher
+    last_seen = mapped_column(DateTime(timezone=True), nullable=True, index=True)
+    # Last background refresh that failed, cleared once the token is renewed
+    refresh_failed_at = mapped_column(DateTime(timezone=True), nullable=True)
 
     def __repr__(self) -> str:
         return (
@@ -78,6 +190,90 @@ class User(CommonColumns):
             f"{self.display_name=}, "
             f"{self.email=}, "
             f"{self.token_expires=}, "
-            f"{self.refresh_token=}"
+            f"{self.refresh_token=}, "
+            f"{self.last_seen=}, "
+            f"{self.refresh_failed_at=}"
             f")"
         )
+
+
+class TrackResolution(CommonColumns):
+    """Spotify track a ListenBrainz (title, creator) pair resolved to.
+
+    Misses are stored too (with no Spotify columns) and expire so unresolvable
+    tracks are eventually searched again.
+    """
+
+    __tablename__ = "track_resolution"
+    __table_args__ = (UniqueConstraint("title_key", "creator_key"),)
+
+    title_key = mapped_column(Text(), nullable=False)
+    creator_key = mapped_column(Text(), nullable=False)
+    match_tier = mapped_column(String(16), nullable=False)
+    spotify_uri = mapped_column(String(255), nullable=True)
+    spotify_id = mapped_column(String(255), nullable=True)
+    name = mapped_column(Text(), nullable=True)
+    artist_raw = mapped_column(JSON(), nullable=True)
+    expires = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class RejectedArtist(CommonColumns):
+    """Artist name ListenBrainz couldn't look up when generating lb-radio."""
+
+    __tablename__ = "rejected_artist"
+
+    artist_key = mapped_column(Text(), nullable=False, unique=True)
+    expires = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class CacheEntry(Base):
+    """Row of the shared cache, see mixtapestudy.cache.
+
+    The table is UNLOGGED, it skips the write-ahead log and is emptied if
+    Postgres crashes, which is fine for data that can be fetched again.
+    """
+
+    __tablename__ = "cache_entry"
+    __table_args__ = (
+        # Finds the newest entries of a namespace without sorting all of them
+        Index("ix_cache_entry_namespace_updated", "namespace", "updated"),
+        {"prefixes": ["UNLOGGED"]},
+    )
+
+    namespace = mapped_column(String(64), primary_key=True)
+    key = mapped_column(Text(), primary_key=True)
+    value = mapped_column(JSON(), nullable=False)
+    expires = mapped_column(DateTime(timezone=True), nullable=False)
+    updated = mapped_column(DateTime(timezone=True), nullable=False)
+
+
+class PreviewJob(CommonColumns):
+    """Playlist preview waiting for, or generated by, the preview worker."""
+
+    __tablename__ = "preview_job"
+
+    user_id = mapped_column(
+        Uuid(), ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    status = mapped_column(String(16), nullable=False, index=True)
+    selected_songs = mapped_column(JSON(), nullable=False)
+    # Song dicts once the job is done
+    playlist_songs = mapped_column(JSON(), nullable=True)
+    # Error code shown to the user when the job failed
+    error_code = mapped_column(String(16), nullable=True)
+    started = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by every worker calling an upstream API.
+
+    See mixtapestudy.rate_limit, UNLOGGED for the same reasons as cache_entry.
+    """
+
+    __tablename__ = "rate_limit_bucket"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}  # noqa: RUF012
+
+    name = mapped_column(String(64), primary_key=True)
+    tokens = mapped_column(Float(), nullable=False)
+    updated = mapped_column(DateTime(timezone=True), nullable=False)
+    blocked_until = mapped_column(DateTime(timezone=True), nullable=True)
@@ -6,6 +6,7 @@ from requests import HTTPError
 from werkzeug.exceptions import HTTPException, NotFound
 
 from mixtapestudy.errors import UserDatabaseRowMissingError, UserIDMissingError
+from mixtapestudy.rate_limit import RateLimitExceededError
 
 
 def handle_user_id_missing(_: UserIDMissingError) -> Response:
@@ -21,7 +22,12 @@ def handle_user_missing(_: UserDatabaseRowMissingError) -> Response:
     return redirect("/")
 
 
-def handle_generic_errors(error: Exception) -> (str, int):
+def _error_template(status: int, *, block: bool) -> str:
+    # The block alone is sent after a page that had already started streaming
+    return f"{status}_error_block.html.j2" if block else f"{status}_error.html.j2"
+
+
+def handle_generic_errors(error: Exception, *, block: bool = False) -> (str, int):
     error_code = uuid4()
     try:
         error.add_note(f"Error code: {error_code}")
@@ -30,12 +36,14 @@ def handle_generic_errors(error: Exception) -> (str, int):
         logger.exception("Unexpected exception while handling generic error")
     finally:
         return (  # noqa: B012
-            render_template("500_error.html.j2", error_code=str(error_code)[24:]),
+            render_template(
+                _error_template(500, block=block), error_code=str(error_code)[24:]
+            ),
             500,
         )
 
 
-def handle_http_request_error(error: HTTPError) -> (str, int):
+def handle_http_request_error(error: HTTPError, *, block: bool = False) -> (str, int):
     error_code = uuid4()
     try:
         error.add_note(f"Error code: {error_code}")
@@ -48,15 +56,48 @@ def handle_http_request_error(error: HTTPError) -> (str, int):
 
     except Exception as secondary_error:  # noqa: BLE001
         logger.exception("Error handling HTTPError")
-        return handle_generic_errors(secondary_error)
+        return handle_generic_errors(secondary_error, block=block)
 
     return render_template(
-        "400_error.html.j2",
+        _error_template(400, block=block),
         error_message=error.response.text,
         error_code=str(error_code)[24:],
     )
 
 
+def handle_rate_limit_exceeded(
+    error: RateLimitExceededError, *, block: bool = False
+) -> (str, int):
+    error_code = uuid4()
+    logger.warning("{} (error code: {})", error, error_code)
+    return (
+        render_template(
+            _error_template(400, block=block),
+            error_message="Spotify is receiving too many requests from "
+            "mixtapestudy.com right now, please try again in a minute.",
+            error_code=str(error_code)[24:],
+        ),
+        503,
+    )
+
+
+def render_error_block(error: Exception) -> str:
+    """Render what the error's handler would, without the rest of the page.
+
+    Errors raised while a response is streaming can't reach the handlers, the
+    status and the start of the page have been sent already.
+    """
+    if isinstance(error, RateLimitExceededError):
+        response = handle_rate_limit_exceeded(error, block=True)
+    elif isinstance(error, HTTPError):
+        response = handle_http_request_error(error, block=True)
+        # Without an error status it would go unnoticed, logged with its notes
+        logger.exception(error)
+    else:
+        response = handle_generic_errors(error, block=True)
+    return response[0] if isinstance(response, tuple) else response
+
+
 def handle_404_not_found(error: NotFound) -> (str, int):
     error_code = uuid4()
     try:
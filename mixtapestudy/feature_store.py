@@ -0,0 +1,157 @@
+"""Columnar copy of features.db that workers memory-map, see FeatureStore.
+
+Exported by track_data/export_feature_store.py. Every column is a .npy file
+holding one contiguous array, row i of each being the same track:
+
+- numeric features as float32 (NaN where unknown) or int8 (-1 where unknown)
+- spotify_id and isrc as fixed width ASCII (empty where unknown)
+- track_name and artist as one UTF-8 blob, sliced by <column>_offsets
+
+spotify_id and isrc are also stored sorted, with the row each came from, so
+tracks are found with a binary search instead of a dict of millions of
+strings. Opening the store only maps the files, so it takes milliseconds and
+every worker on the machine shares one copy in the page cache.
+"""
+
+import ast
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from mixtapestudy.models import Song
+
+FLOAT_COLUMNS = (
+    "acousticness",
+    "beats_per_minute",
+    "danceability",
+    "duration_ms",
+    "energy",
+    "instrumentalness",
+    "liveness",
+    "loudness",
+    "popularity",
+    "speechiness",
+    "tempo",
+    "valence",
+    "year",
+)
+INT8_COLUMNS = ("explicit", "key", "mode", "time_signature")
+ID_COLUMNS = ("spotify_id", "isrc")
+TEXT_COLUMNS = ("track_name", "artist")
+
+
+def split_artists(artist: str) -> list[str]:
+    """Artist names, stored as "['a', 'b']" or "a;b" depending on the dataset."""
+    if not artist:
+        return []
+    if artist.startswith("["):
+        try:
+            return [str(name) for name in ast.literal_eval(artist)]
+        except (ValueError, SyntaxError):
+            pass
+    return [name.strip() for name in artist.split(";") if name.strip()]
+
+
+def write_feature_store(path: str, columns: dict[str, np.ndarray | list]) -> None:
+    """Write a store from whole columns.
+
+    ID columns are lists of str or arrays of ASCII bytes. Text columns are lists
+    of str, or already encoded when columns holds <column>_offsets as well.
+    """
+    store_dir = Path(path)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    for name in FLOAT_COLUMNS:
+        np.save(store_dir / f"{name}.npy", np.asarray(columns[name], dtype=np.float32))
+    for name in INT8_COLUMNS:
+        np.save(store_dir / f"{name}.npy", np.asarray(columns[name], dtype=np.int8))
+    for name in ID_COLUMNS:
+        ids = columns[name]
+        if not isinstance(ids, np.ndarray):
+            # Sized to the longest ID, "S1" when there are none at all
+            ids = np.array([value.encode() for value in ids] or [b""])[: len(ids)]
+        order = np.argsort(ids, kind="stable")
+        np.save(store_dir / f"{name}.npy", ids)
+        np.save(store_dir / f"{name}_sorted.npy", ids[order])
+        np.save(store_dir / f"{name}_rows.npy", order.astype(np.int64))
+    for name in TEXT_COLUMNS:
+        if f"{name}_offsets" in columns:
+            blob, offsets = columns[name], columns[f"{name}_offsets"]
+        else:
+            encoded = [value.encode() for value in columns[name]]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            blob = np.frombuffer(b"".join(encoded), np.uint8)
+        np.save(store_dir / f"{name}.npy", blob)
+        np.save(store_dir / f"{name}_offsets.npy", offsets)
+
+
+@dataclass(frozen=True)
+class FeatureStore:
+    columns: dict[str, np.ndarray]
+
+    @classmethod
+    def open(cls, path: str) -> "FeatureStore":
+        return cls(
+            {
+                file.stem: np.load(file, mmap_mode="r")
+                for file in sorted(Path(path).glob("*.npy"))
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.columns["spotify_id"])
+
+    def features(self, names: tuple[str, ...], rows: np.ndarray) -> np.ndarray:
+        """Return the float features of the rows, one column per name."""
+        return np.stack([self.columns[name][rows] for name in names], axis=1)
+
+    def complete(
+        self, names: tuple[str, ...], rows: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Return the rows, or all rows, with an ID, a name and the named features."""
+        if rows is None:
+            rows = np.arange(len(self))
+        offsets = self.columns["track_name_offsets"]
+        complete = self.columns["spotify_id"][rows] != b""
+        complete &= offsets[rows + 1] > offsets[rows]
+        for name in names:
+            complete &= ~np.isnan(self.columns[name][rows])
+        return rows[complete]
+
+    def find(self, column: str, values: list[str]) -> np.ndarray:
+        """Return the first row with each of the values found in an ID column."""
+        sorted_ids = self.columns[f"{column}_sorted"]
+        # Longer values would be cut down to the width of the IDs and match
+        keys = np.array(
+            [
+                value.encode()
+                for value in values
+                if value and value.isascii() and len(value) <= sorted_ids.itemsize
+            ],
+            dtype=sorted_ids.dtype,
+        )
+        if not len(keys) or not len(sorted_ids):
+            return np.empty(0, dtype=np.int64)
+        # Where each key is, or would go if it isn't there
+        positions = np.minimum(np.searchsorted(sorted_ids, keys), len(sorted_ids) - 1)
+        found = positions[sorted_ids[positions] == keys]
+        return np.asarray(self.columns[f"{column}_rows"][found])
+
+    def id(self, column: str, row: int) -> str:
+        return self.columns[column][row].decode()
+
+    def text(self, column: str, row: int) -> str:
+        start, end = self.columns[f"{column}_offsets"][row : row + 2]
+        return self.columns[column][start:end].tobytes().decode()
+
+    def song(self, row: int) -> Song:
+        spotify_id = self.id("spotify_id", row)
+        artists = split_artists(self.text("artist", row))
+        return Song(
+            uri=f"spotify:track:{spotify_id}",
+            id=spotify_id,
+            name=self.text("track_name", row),
+            artist=", ".join(artists),
+            artist_raw=artists,
+        )
@@ -0,0 +1,269 @@
+"""Recommendations from the audio features in the FEATURE_STORE, without upstream calls.
+
+The store is exported from features.db by track_data/export_feature_store.py
+and memory-mapped, see mixtapestudy.feature_store. Features are scaled to
+z-scores so tempo doesn't outweigh everything else, and the tracks recommended
+are the ones nearest any of the seeds in that space.
+
+Without FEATURE_INDEX each worker loads every vector into memory and searches
+all of them. With it, the workers memory-map an index built offline by
+mixtapestudy.build_feature_index and only search the parts of it nearest the
+seeds, see FeatureIndex.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+from flask import g
+
+from mixtapestudy.config import get_config
+from mixtapestudy.feature_store import FeatureStore
+from mixtapestudy.models import Song
+from mixtapestudy.track_resolution import track_key
+
+FEATURES = (
+    "acousticness",
+    "danceability",
+    "energy",
+    "instrumentalness",
+    "liveness",
+    "loudness",
+    "speechiness",
+    "tempo",
+    "valence",
+)
+# The datasets overlap, so the same song is often in the store more than once
+_CANDIDATES_PER_RECOMMENDATION = 2
+
+_feature_stores = {}
+_feature_matrices = {}
+_feature_indexes = {}
+_feature_search_lock = Lock()
+
+
+def min_squared_distances(
+    vectors: np.ndarray, squared_norms: np.ndarray, seed_vectors: np.ndarray
+) -> np.ndarray:
+    """Squared distance from each of the vectors to the nearest of the seeds."""
+    # |a - b|^2 = |a|^2 - 2ab + |b|^2, one matrix product for all the seeds.
+    # One row per seed keeps the min() over seeds contiguous in memory
+    squared = (-2 * seed_vectors) @ vectors.T
+    squared += np.einsum("ij,ij->i", seed_vectors, seed_vectors)[:, np.newaxis]
+    distances = squared.min(axis=0)
+    distances += squared_norms
+    return distances
+
+
+def _nearest(
+    rows: np.ndarray, distances: np.ndarray, count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Rowids and distances of the count nearest, nearest first."""
+    count = min(count, len(distances))
+    if not count:
+        return rows[:0], distances[:0]
+    # Only the nearest few are sorted, not every row
+    nearest = np.argpartition(distances, count - 1)[:count]
+    # Ties go to the earliest row, whichever order the rows were searched in
+    nearest = nearest[np.lexsort((rows[nearest], distances[nearest]))]
+    return rows[nearest], distances[nearest]
+
+
+@dataclass(frozen=True)
+class FeatureMatrix:
+    # Row of the FEATURE_STORE each of the vectors is for
+    rows: np.ndarray
+    vectors: np.ndarray
+    squared_norms: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+
+    @classmethod
+    def from_features(cls, rows: np.ndarray, features: np.ndarray) -> "FeatureMatrix":
+        mean = np.zeros(features.shape[1])
+        std = np.ones(features.shape[1])
+        if len(features):
+            mean = features.mean(axis=0, dtype=np.float64)
+            std = features.std(axis=0, dtype=np.float64)
+            std[std == 0] = (
+                1  # A feature every track shares tells them apart by nothing
+            )
+        # Scaled in place, millions of rows don't need float64 copies
+        vectors = features.astype(np.float32)
+        vectors -= mean.astype(np.float32)
+        vectors /= std.astype(np.float32)
+        return cls(
+            rows=rows,
+            vectors=vectors,
+            squared_norms=np.einsum("ij,ij->i", vectors, vectors),
+            mean=mean,
+            std=std,
+        )
+
+    def scale(self, features: np.ndarray) -> np.ndarray:
+        return ((features - self.mean) / self.std).astype(np.float32)
+
+    def distances(self, seed_vectors: np.ndarray) -> np.ndarray:
+        return min_squared_distances(self.vectors, self.squared_norms, seed_vectors)
+
+    def nearest(
+        self,
+        seed_vectors: np.ndarray,
+        count: int,
+        excluded_rows: np.ndarray | list[int],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Exactly the count nearest rows to any seed, as rows and distances."""
+        distances = self.distances(seed_vectors)
+        distances[np.isin(self.rows, excluded_rows)] = np.inf
+        return _nearest(self.rows, distances, count)
+
+
+@dataclass(frozen=True)
+class FeatureIndex:
+    """Inverted file (IVF) index, vectors grouped by their nearest centroid.
+
+    Rows are stored sorted by partition, partition p being rows offsets[p] to
+    offsets[p + 1]. A query only computes distances for the rows of the
+    partitions whose centroids are nearest the seeds, probes of them per seed.
+    The true nearest rows are occasionally in partitions that weren't probed,
+    more probes find more of them and take longer.
+    """
+
+    centroids: np.ndarray
+    offsets: np.ndarray
+    rows: np.ndarray
+    vectors: np.ndarray
+    squared_norms: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    probes: int = 8
+
+    _FILES = ("centroids", "offsets", "rows", "vectors", "squared_norms")
+
+    @classmethod
+    def open(cls, path: str, probes: int) -> "FeatureIndex":
+        """Memory-map an index, rows are only read from disk when searched."""
+        arrays = {
+            name: np.load(Path(path) / f"{name}.npy", mmap_mode="r")
+            for name in cls._FILES
+        }
+        # Small and used by every query
+        mean, std = np.load(Path(path) / "scaling.npy")
+        arrays["centroids"] = np.array(arrays["centroids"])
+        arrays["offsets"] = np.array(arrays["offsets"])
+        return cls(**arrays, mean=mean, std=std, probes=probes)
+
+    def save(self, path: str) -> None:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        for name in self._FILES:
+            np.save(Path(path) / f"{name}.npy", getattr(self, name))
+        np.save(Path(path) / "scaling.npy", np.stack([self.mean, self.std]))
+
+    def scale(self, features: np.ndarray) -> np.ndarray:
+        return ((features - self.mean) / self.std).astype(np.float32)
+
+    def probed_partitions(self, seed_vectors: np.ndarray) -> np.ndarray:
+        """Partitions with one of the probes nearest centroids of any seed."""
+        probes = min(self.probes, len(self.centroids))
+        # Ranked the same as the distance, |seed|^2 is the same for each centroid
+        distances = (-2 * seed_vectors) @ self.centroids.T
+        distances += np.einsum("ij,ij->i", self.centroids, self.centroids)
+        return np.unique(np.argpartition(distances, probes - 1, axis=1)[:, :probes])
+
+    def nearest(
+        self,
+        seed_vectors: np.ndarray,
+        count: int,
+        excluded_rows: np.ndarray | list[int],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the count nearest rows found near any seed, nearest first."""
+        if not len(self.centroids):
+            return self.rows[:0], np.empty(0, dtype=np.float32)
+        ranges = [
+            (self.offsets[partition], self.offsets[partition + 1])
+            for partition in self.probed_partitions(seed_vectors)
+        ]
+        rows = np.concatenate([self.rows[start:end] for start, end in ranges])
+        distances = min_squared_distances(
+            np.concatenate([self.vectors[start:end] for start, end in ranges]),
+            np.concatenate([self.squared_norms[start:end] for start, end in ranges]),
+            seed_vectors,
+        )
+        distances[np.isin(rows, excluded_rows)] = np.inf
+        return _nearest(rows, distances, count)
+
+
+def get_feature_store(path: str) -> FeatureStore:
+    with _feature_search_lock:
+        if path not in _feature_stores:
+            _feature_stores[path] = FeatureStore.open(path)
+    return _feature_stores[path]
+
+
+def load_feature_matrix(feature_store: FeatureStore) -> FeatureMatrix:
+    rows = feature_store.complete(FEATURES)
+    return FeatureMatrix.from_features(rows, feature_store.features(FEATURES, rows))
+
+
+def get_feature_matrix(path: str) -> FeatureMatrix:
+    # Loading takes a while, requests arriving meanwhile wait for the one load
+    with _feature_search_lock:
+        if path not in _feature_matrices:
+            _feature_matrices[path] = load_feature_matrix(FeatureStore.open(path))
+    return _feature_matrices[path]
+
+
+def get_feature_index(path: str, probes: int) -> FeatureIndex:
+    with _feature_search_lock:
+        if (path, probes) not in _feature_indexes:
+            _feature_indexes[path, probes] = FeatureIndex.open(path, probes)
+    return _feature_indexes[path, probes]
+
+
+def get_feature_search() -> FeatureMatrix | FeatureIndex:
+    """Return the index when FEATURE_INDEX is set, all vectors in memory if not."""
+    config = get_config()
+    if config.feature_index:
+        return get_feature_index(config.feature_index, config.feature_index_probes)
+    return get_feature_matrix(config.feature_store)
+
+
+def get_feature_recommendations(seed_ids: list[str], limit: int) -> list[Song]:
+    """Return up to limit songs sounding like the seeds, nearest first.
+
+    Seeds the store doesn't have features for are ignored, nothing is
+    recommended if it has none of them.
+    """
+    feature_search = get_feature_search()
+    feature_store = get_feature_store(get_config().feature_store)
+    seed_rows = feature_store.complete(
+        FEATURES, feature_store.find("spotify_id", seed_ids)
+    )
+    g.logger.debug("  seeds with features: {} of {}", len(seed_rows), len(seed_ids))
+    if not len(seed_rows):
+        return []
+
+    nearest_rows, distances = feature_search.nearest(
+        feature_search.scale(feature_store.features(FEATURES, seed_rows)),
+        limit * _CANDIDATES_PER_RECOMMENDATION,
+        excluded_rows=seed_rows,
+    )
+
+    seen = {
+        track_key(
+            feature_store.text("track_name", row), feature_store.text("artist", row)
+        )
+        for row in seed_rows
+    }
+    songs = []
+    for row, distance in zip(nearest_rows, distances, strict=True):
+        song = feature_store.song(row)
+        key = track_key(song.name, feature_store.text("artist", row))
+        if key in seen or distance == np.inf:  # Seeds are infinitely far
+            continue
+        seen.add(key)
+        songs.append(song)
+        if len(songs) == limit:
+            break
+    return songs
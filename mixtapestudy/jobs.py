@@ -0,0 +1,109 @@
+"""Queue of playlist previews kept in the preview_job table.
+
+Web workers enqueue a job and return straight away, the preview worker
+(mixtapestudy.worker) claims jobs with SELECT ... FOR UPDATE SKIP LOCKED so
+any number of worker processes can share the queue.
+"""
+
+from dataclasses import asdict
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import delete, or_, select
+
+from mixtapestudy.config import get_config
+from mixtapestudy.data import PreviewJobData
+from mixtapestudy.database import PreviewJob, get_session
+from mixtapestudy.models import JobStatus, Song
+
+
+def _job_data(job: PreviewJob) -> PreviewJobData:
+    return PreviewJobData(
+        id=job.id,
+        user_id=job.user_id,
+        status=JobStatus(job.status),
+        selected_songs=job.selected_songs,
+        playlist_songs=job.playlist_songs,
+        error_code=job.error_code,
+    )
+
+
+def enqueue_preview_job(user_id: UUID, selected_songs: list[dict[str, str]]) -> UUID:
+    now = datetime.now(tz=UTC)
+    with get_session() as db_session:
+        job = PreviewJob(
+            user_id=user_id,
+            status=JobStatus.QUEUED,
+            selected_songs=selected_songs,
+            created=now,
+            updated=now,
+        )
+        db_session.add(job)
+        db_session.flush()
+        return job.id
+
+
+def get_preview_job(job_id: UUID, user_id: UUID) -> PreviewJobData | None:
+    """Return the job if it exists and belongs to the user."""
+    with get_session() as db_session:
+        job = db_session.get(PreviewJob, job_id)
+        if not job or job.user_id != user_id:
+            return None
+        return _job_data(job)
+
+
+def claim_preview_job() -> PreviewJobData | None:
+    """Mark the oldest waiting job as running and return it.
+
+    Jobs left running past PREVIEW_JOB_TIMEOUT are claimed again, their worker
+    most likely died with them.
+    """
+    now = datetime.now(tz=UTC)
+    lost_before = now - timedelta(seconds=get_config().preview_job_timeout)
+    with get_session() as db_session:
+        job = db_session.scalars(
+            select(PreviewJob)
+            .where(
+                or_(
+                    PreviewJob.status == JobStatus.QUEUED,
+                    (PreviewJob.status == JobStatus.RUNNING)
+                    & (PreviewJob.started < lost_before),
+                )
+            )
+            .order_by(PreviewJob.created)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).one_or_none()
+        if not job:
+            return None
+
+        job.status = JobStatus.RUNNING
+        job.started = now
+        job.updated = now
+        return _job_data(job)
+
+
+def finish_preview_job(job_id: UUID, playlist_songs: list[Song]) -> None:
+    with get_session() as db_session:
+        job = db_session.get(PreviewJob, job_id)
+        job.status = JobStatus.DONE
+        job.playlist_songs = [asdict(song) for song in playlist_songs]
+        job.updated = datetime.now(tz=UTC)
+
+
+def fail_preview_job(job_id: UUID, error_code: str) -> None:
+    with get_session() as db_session:
+        job = db_session.get(PreviewJob, job_id)
+        job.status = JobStatus.FAILED
+        job.error_code = error_code
+        job.updated = datetime.now(tz=UTC)
+
+
+def delete_old_preview_jobs() -> None:
+    retention = timedelta(seconds=get_config().preview_job_retention)
+    with get_session() as db_session:
+        db_session.execute(
+            delete(PreviewJob).where(
+                PreviewJob.created < datetime.now(tz=UTC) - retention
+            )
+        )
@@ -0,0 +1,106 @@
+"""Ledger of the outbound calls made while answering one request.
+
+HttpClient records each call in the ledger of the request it's made for, and
+the summary is logged once the request is done, so a preview that fans out to
+dozens of searches shows up as one line. Threads started for the request need
+a copy of its context (contextvars.copy_context) to record into its ledger.
+"""
+
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from threading import Lock
+
+from flask import g
+
+from mixtapestudy.config import get_config
+from mixtapestudy.metrics import counter
+
+UPSTREAM_BUDGET_EXCEEDED = counter(
+    "upstream_budget_exceeded",
+    "Requests over UPSTREAM_CALL_BUDGET or UPSTREAM_TIME_BUDGET",
+)
+
+
+@dataclass(frozen=True)
+class UpstreamCall:
+    host: str
+    endpoint: str
+    # None when no response came back at all
+    status: int | None
+    duration: float
+    # Why the call repeats an earlier one, None for first attempts
+    retry_reason: str | None = None
+
+
+class CallLedger:
+    def __init__(self) -> None:
+        self.calls = []
+        self._lock = Lock()
+
+    def record(self, call: UpstreamCall) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    @property
+    def total_duration(self) -> float:
+        """Time spent waiting on upstreams, calls made side by side add up."""
+        return sum(call.duration for call in self.calls)
+
+    def summary(self) -> str:
+        """e.g. `3 calls, 0.42s | api.spotify.com search: 2 calls, 0.30s, 200 x2`."""
+        by_endpoint = {}
+        for call in self.calls:
+            by_endpoint.setdefault((call.host, call.endpoint), []).append(call)
+
+        parts = [f"{len(self.calls)} calls, {self.total_duration:.2f}s"]
+        for (host, endpoint), calls in sorted(by_endpoint.items()):
+            statuses = Counter(call.status or "no response" for call in calls)
+            parts.append(
+                f"{host} {endpoint}: {len(calls)} calls, "
+                f"{sum(call.duration for call in calls):.2f}s, "
+                + " ".join(f"{status} x{n}" for status, n in statuses.items())
+            )
+
+        retry_reasons = Counter(
+            call.retry_reason for call in self.calls if call.retry_reason
+        )
+        if retry_reasons:
+            parts.append(
+                "retries: "
+                + ", ".join(f"{reason} x{n}" for reason, n in retry_reasons.items())
+            )
+        return " | ".join(parts)
+
+
+_current_ledger = ContextVar("call_ledger", default=None)
+
+
+def start_ledger() -> None:
+    _current_ledger.set(CallLedger())
+
+
+def current_ledger() -> CallLedger | None:
+    return _current_ledger.get()
+
+
+def finish_ledger(name: str) -> None:
+    """Log the calls made since start_ledger, flagging it when over budget."""
+    ledger = _current_ledger.get()
+    _current_ledger.set(None)
+    if not ledger or not ledger.calls:
+        return
+
+    g.logger.info("Upstream calls for {}: {}", name, ledger.summary())
+
+    config = get_config()
+    over_budget = []
+    if len(ledger.calls) > config.upstream_call_budget:
+        over_budget.append(f"{len(ledger.calls)} calls > {config.upstream_call_budget}")
+    if ledger.total_duration > config.upstream_time_budget:
+        over_budget.append(
+            f"{ledger.total_duration:.2f}s > {config.upstream_time_budget}s"
+        )
+    if over_budget:
+        UPSTREAM_BUDGET_EXCEEDED.increment()
+        g.logger.warning("{} over upstream budget: {}", name, ", ".join(over_budget))
@@ -0,0 +1,316 @@
+"""Counters, gauges and histograms kept in memory by each process.
+
+Gunicorn workers each have their own. Under gunicorn every worker writes its
+metrics to METRICS_DIR/<host>-<pid>.json every few seconds (see gunicorn.conf.py),
+as do the preview worker and token refresher, and /metrics adds up the files of
+every process in the Prometheus text format. Containers share METRICS_DIR
+through a volume, see docker-compose.yml.
+"""
+
+import json
+import math
+import os
+import socket
+import time
+from collections.abc import Generator
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from threading import Lock, Thread
+
+PREFIX = "mixtapestudy"
+# Seconds, up to the 30s it takes to give up on an upstream
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seconds without a write before a process on another host is taken to be gone,
+# its PID can't be checked from here
+STALE_AFTER = 60
+
+Labels = tuple[tuple[str, str], ...]
+
+_metrics = {}
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    """Monotonic count of something that happened in this worker."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = Lock()
+
+    def increment(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def samples(self) -> dict[Labels, int]:
+        return {(): self._value}
+
+
+class Gauge:
+    """Last observed level of something in this worker.
+
+    Workers' values are added up. Levels that aren't per worker are shown as
+    the highest with aggregate="max", or as the most recently set with
+    aggregate="latest" when every worker reads the same shared level.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, aggregate: str = "sum") -> None:
+        self.name = name
+        self.description = description
+        self.aggregate = aggregate
+        self._values = {}
+        self._updated = {}
+        self._lock = Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        self._values[key] = value
+        self._updated[key] = time.time()
+
+    def increment(self, amount: float = 1.0, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+            self._updated[key] = time.time()
+
+    def decrement(self, amount: float = 1.0, **labels: str) -> None:
+        self.increment(-amount, **labels)
+
+    @property
+    def value(self) -> float:
+        return self._values.get((), 0.0)
+
+    def samples(self) -> dict[Labels, float]:
+        return dict(self._values)
+
+    def updated(self) -> dict[Labels, float]:
+        """Return when each level was last set, as a Unix time."""
+        return dict(self._updated)
+
+
+class Histogram:
+    """Distribution of durations observed in this worker, in seconds."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # Per label set: [observations in each bucket..., above them all, sum]
+        self._observations = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        bucket = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            observations = self._observations.setdefault(
+                key, [0] * (len(self.buckets) + 1) + [0.0]
+            )
+            observations[bucket] += 1
+            observations[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Generator[None, None, None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> dict[Labels, list[float]]:
+        with self._lock:
+            return {key: list(obs) for key, obs in self._observations.items()}
+
+
+def counter(name: str, description: str) -> Counter:
+    if name not in _metrics:
+        _metrics[name] = Counter(name, description)
+    return _metrics[name]
+
+
+def gauge(name: str, description: str, aggregate: str = "sum") -> Gauge:
+    if name not in _metrics:
+        _metrics[name] = Gauge(name, description, aggregate)
+    return _metrics[name]
+
+
+def histogram(name: str, description: str) -> Histogram:
+    if name not in _metrics:
+        _metrics[name] = Histogram(name, description)
+    return _metrics[name]
+
+
+def _export() -> dict:
+    return {
+        metric.name: {
+            "kind": metric.kind,
+            "description": metric.description,
+            "aggregate": getattr(metric, "aggregate", "sum"),
+            "buckets": getattr(metric, "buckets", None),
+            "samples": [[dict(key), value] for key, value in metric.samples().items()],
+            "updated": [
+                [dict(key), updated]
+                for key, updated in getattr(metric, "updated", dict)().items()
+            ],
+        }
+        for metric in list(_metrics.values())
+    }
+
+
+def write_metrics(metrics_dir: str) -> None:
+    """Write this process's metrics where the other workers can read them."""
+    path = Path(metrics_dir) / f"{_process_name()}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_suffix(".tmp")
+    partial_path.write_text(json.dumps(_export()))
+    partial_path.replace(path)  # Readers never see half a file
+
+
+def start_metrics_writer(metrics_dir: str, interval: float) -> None:
+    def write_forever() -> None:
+        while True:
+            time.sleep(interval)
+            write_metrics(metrics_dir)
+
+    Thread(target=write_forever, name="metrics-writer", daemon=True).start()
+
+
+def clear_metrics_dir(metrics_dir: str) -> None:
+    """Forget the workers of a previous run, called as gunicorn starts.
+
+    Only this host's, processes in other containers are still writing theirs.
+    """
+    for path in Path(metrics_dir).glob(f"{socket.gethostname()}-*.json"):
+        path.unlink(missing_ok=True)
+
+
+def _process_name(host: str | None = None, pid: int | None = None) -> str:
+    return f"{host or socket.gethostname()}-{pid or os.getpid()}"
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_file_running(path: Path) -> bool:
+    host, _, pid = path.stem.rpartition("-")
+    if host == socket.gethostname():
+        return _is_running(int(pid))
+    return time.time() - path.stat().st_mtime < STALE_AFTER
+
+
+def _read_exports(metrics_dir: str) -> list[tuple[bool, dict]]:
+    """Every process's metrics, with whether the process is still running."""
+    exports = [(True, _export())]
+    if not metrics_dir:
+        return exports
+    for path in Path(metrics_dir).glob("*.json"):
+        if path.stem == _process_name():
+            continue  # Already have this worker's latest
+        # The worker may have just exited and had its file cleaned up
+        with suppress(FileNotFoundError):
+            exports.append((_is_file_running(path), json.loads(path.read_text())))
+    return exports
+
+
+def _merge(exports: list[tuple[bool, dict]]) -> dict[str, dict]:
+    merged = {}
+    for running, export in exports:
+        for name, metric in export.items():
+            if metric["kind"] == "gauge" and not running:
+                continue  # Levels of a worker that's gone no longer exist
+            into = merged.setdefault(name, {**metric, "samples": {}, "updated": {}})
+            updated = {
+                _labels(labels): updated_at
+                for labels, updated_at in metric.get("updated", [])
+            }
+            for labels, value in metric["samples"]:
+                key = _labels(labels)
+                if key not in into["samples"]:
+                    into["samples"][key] = value
+                    into["updated"][key] = updated.get(key, 0)
+                elif metric["kind"] == "histogram":
+                    into["samples"][key] = [
+                        a + b for a, b in zip(into["samples"][key], value, strict=True)
+                    ]
+                elif metric["aggregate"] == "latest":
+                    if updated.get(key, 0) > into["updated"][key]:
+                        into["samples"][key] = value
+                        into["updated"][key] = updated[key]
+                elif metric["aggregate"] == "max":
+                    into["samples"][key] = max(into["samples"][key], value)
+                else:
+                    into["samples"][key] += value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Labels, **extra: str) -> str:
+    labels = [*key, *extra.items()]
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else f"{bound:g}"
+
+
+def render_metrics(metrics_dir: str) -> str:
+    """Every worker's metrics added up, in the Prometheus text format.
+
+    Only this process's metrics when metrics_dir is empty.
+    """
+    lines = []
+    for name, metric in sorted(_merge(_read_exports(metrics_dir)).items()):
+        full_name = f"{PREFIX}_{name}"
+        if metric["kind"] == "counter":
+            full_name += "_total"
+        lines.append(f"# HELP {full_name} {metric['description']}")
+        lines.append(f"# TYPE {full_name} {metric['kind']}")
+        for key, value in sorted(metric["samples"].items()):
+            if metric["kind"] != "histogram":
+                lines.append(f"{full_name}{_format_labels(key)} {value}")
+                continue
+
+            cumulative = 0
+            for bound, count in zip(
+                [*metric["buckets"], math.inf], value[:-1], strict=True
+            ):
+                cumulative += count
+                labels = _format_labels(key, le=_format_bound(bound))
+                lines.append(f"{full_name}_bucket{labels} {cumulative}")
+            lines.append(f"{full_name}_sum{_format_labels(key)} {value[-1]}")
+            lines.append(f"{full_name}_count{_format_labels(key)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from enum import StrEnum
 
 
 @dataclass(frozen=True)
@@ -10,3 +11,20 @@ class Song:
     artist: str
     # JSON String, list of names
     artist_raw: list[str]
+
+
+class MatchTier(StrEnum):
+    # Matched the strict "track:... artist:..." search
+    STRICT = "strict"
+    # Matched the loose "title creator" fallback search
+    LOOSE = "loose"
+    # Matched a track in the TRACK_MATCH_INDEX, without searching
+    LOCAL = "local"
+    MISS = "miss"
+
+
+class JobStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
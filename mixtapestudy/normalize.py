@@ -0,0 +1,6 @@
+import unicodedata
+
+
+def normalize_text(value: str) -> str:
+    """Fold case, Unicode forms and whitespace so near-identical text compares equal."""
+    return " ".join(unicodedata.normalize("NFKC", value).casefold().split())
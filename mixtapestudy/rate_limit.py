@@ -0,0 +1,152 @@
+"""Token bucket rate limiting shared by every gunicorn worker.
+
+Spotify throttles per client ID, not per process, so the bucket lives in a
+rate_limit_bucket row that workers lock while taking tokens. Each request
+takes one token, tokens refill at a steady rate up to the burst size, and a
+429 blocks the whole bucket until its Retry-After has passed.
+
+Locking the row for every request would queue all outbound calls on it, so a
+process reserves a batch of tokens at a time and hands them out to its
+threads. Reserved tokens lapse after RESERVATION_TTL, they can't be saved up
+for a burst on top of a refilled bucket, and a 429 another worker got reaches
+this one by then at the latest.
+
+A rate of 0 turns the steady limit off, only 429s hold the workers back.
+"""
+
+import time
+from datetime import UTC, datetime, timedelta
+from threading import Lock
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from mixtapestudy.database import RateLimitBucket, get_session
+from mixtapestudy.metrics import counter, gauge
+
+RESERVATION_TTL = timedelta(seconds=1)
+
+
+class RateLimitExceededError(Exception):
+    def __init__(self, name: str, wait: float) -> None:
+        super().__init__(f"{name} rate limited for another {wait:.1f}s")
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        max_wait: float,
+        batch: int = 1,
+    ) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.batch = batch
+        # Tokens this process took from the bucket and hasn't used yet
+        self._reserved = 0
+        self._reserved_until = datetime.min.replace(tzinfo=UTC)
+        self._reserve_lock = Lock()
+        # Every worker reads the one bucket, the newest reading is the level
+        self._tokens = gauge(
+            f"{name}_rate_limit_tokens", f"{name} tokens available", aggregate="latest"
+        )
+        self._waits = counter(
+            f"{name}_rate_limit_waits", f"{name} requests delayed for a token"
+        )
+        self._throttles = counter(
+            f"{name}_rate_limit_throttles", f"{name} 429 responses received"
+        )
+
+    def acquire(self) -> None:
+        """Block until a token is available, or raise if that takes too long."""
+        waited = 0.0
+        while (wait := self._take_reserved()) > 0:
+            if waited + wait > self.max_wait:
+                raise RateLimitExceededError(self.name, wait)
+            if not waited:
+                self._waits.increment()
+            logger.debug("Waiting {:.2f}s for a {} token", wait, self.name)
+            time.sleep(wait)
+            waited += wait
+
+    def throttle(self, retry_after: float) -> None:
+        """Hold every worker back after the upstream answered 429."""
+        self._throttles.increment()
+        blocked_until = datetime.now(tz=UTC) + timedelta(seconds=retry_after)
+        logger.warning("{} throttled until {}", self.name, blocked_until)
+        with self._reserve_lock:
+            self._reserved = 0
+        with get_session() as db_session:
+            bucket = self._lock_bucket(db_session)
+            if not bucket.blocked_until or bucket.blocked_until < blocked_until:
+                bucket.blocked_until = blocked_until
+                # Refilling starts once the block is over, a full bucket the
+                # moment it ends would go straight into another 429
+                bucket.tokens = 0
+                bucket.updated = blocked_until
+
+    def _lock_bucket(self, db_session: Session) -> RateLimitBucket:
+        lock_bucket = (
+            select(RateLimitBucket)
+            .where(RateLimitBucket.name == self.name)
+            .with_for_update()
+        )
+        bucket = db_session.scalars(lock_bucket).one_or_none()
+        if bucket:
+            return bucket
+        # Only the first call creates the row, another worker may beat us to it
+        db_session.execute(
+            insert(RateLimitBucket)
+            .values(name=self.name, tokens=self.burst, updated=datetime.now(tz=UTC))
+            .on_conflict_do_nothing(index_elements=[RateLimitBucket.name])
+        )
+        return db_session.scalars(lock_bucket).one()
+
+    def _take_reserved(self) -> float:
+        """Take a reserved token, returning 0 or the seconds to wait for one."""
+        now = datetime.now(tz=UTC)
+        with self._reserve_lock:
+            if not self._reserved or self._reserved_until <= now:
+                self._reserved, wait = self._reserve_tokens(now)
+                if wait:
+                    return wait
+                self._reserved_until = now + RESERVATION_TTL
+            self._reserved -= 1
+            return 0.0
+
+    def _reserve_tokens(self, now: datetime) -> tuple[int, float]:
+        """Take up to a batch of tokens, returning them and the seconds to wait."""
+        if not self.rate:
+            # Nothing to take, only a block needs checking and that needs no lock
+            with get_session() as db_session:
+                blocked_until = db_session.scalar(
+                    select(RateLimitBucket.blocked_until).where(
+                        RateLimitBucket.name == self.name
+                    )
+                )
+            if blocked_until and blocked_until > now:
+                return 0, (blocked_until - now).total_seconds()
+            return self.batch, 0.0
+
+        with get_session() as db_session:
+            bucket = self._lock_bucket(db_session)
+            if bucket.blocked_until and bucket.blocked_until > now:
+                return 0, (bucket.blocked_until - now).total_seconds()
+
+            elapsed = max((now - bucket.updated).total_seconds(), 0)
+            tokens = min(self.burst, bucket.tokens + elapsed * self.rate)
+            reserved = min(self.batch, int(tokens))
+            wait = 0.0 if reserved else (1 - tokens) / self.rate
+
+            bucket.tokens = tokens - reserved
+            bucket.updated = now
+            bucket.blocked_until = None
+
+        self._tokens.set(tokens - reserved)
+        return reserved, wait
@@ -0,0 +1,40 @@
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from mixtapestudy.config import get_config
+from mixtapestudy.database import RejectedArtist, get_session
+from mixtapestudy.normalize import normalize_text
+
+
+def get_rejected_artists(artists: list[str]) -> set[str]:
+    """Return the artists from the list that lb-radio recently couldn't look up."""
+    keys = {normalize_text(artist): artist for artist in artists}
+    if not keys:
+        return set()
+
+    with get_session() as db_session:
+        rejected_keys = db_session.scalars(
+            select(RejectedArtist.artist_key).where(
+                RejectedArtist.artist_key.in_(keys),
+                RejectedArtist.expires > datetime.now(tz=UTC),
+            )
+        ).all()
+
+    return {keys[key] for key in rejected_keys}
+
+
+def add_rejected_artist(artist: str) -> None:
+    now = datetime.now(tz=UTC)
+    expires = now + timedelta(seconds=get_config().rejected_artist_ttl)
+    statement = insert(RejectedArtist).values(
+        artist_key=normalize_text(artist), expires=expires
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[RejectedArtist.artist_key],
+        set_={"expires": expires, "updated": now},
+    )
+
+    with get_session() as db_session:
+        db_session.execute(statement)
@@ -1,17 +1,18 @@
 import secrets
 import string
 from datetime import UTC, datetime, timedelta
-from urllib.parse import ParseResult, urlencode
+from urllib.parse import urlencode
 
-import requests
 from flask import Blueprint, g, redirect, request, session
 from requests import HTTPError
 from requests.auth import HTTPBasicAuth
 from sqlalchemy import select, update
 from werkzeug.wrappers.response import Response
 
-from mixtapestudy.config import SPOTIFY_BASE_URL, get_config
+from mixtapestudy.client import get_http_client
+from mixtapestudy.config import SPOTIFY_ACCOUNTS_URL, SPOTIFY_BASE_URL, get_config
 from mixtapestudy.database import User, get_session
+from mixtapestudy.routes.util import forget_user
 
 auth = Blueprint("auth", __name__)
 
@@ -35,14 +36,7 @@ def login() -> Response:
     }
     session.clear()
     g.logger.debug("OAuth query params: {}", params)
-    return_url = ParseResult(
-        scheme="https",
-        netloc="accounts.spotify.com",
-        path="authorize",
-        params="",
-        query=urlencode(params),
-        fragment="",
-    ).geturl()
+    return_url = f"{SPOTIFY_ACCOUNTS_URL}/authorize?{urlencode(params)}"
 
     g.logger.debug("  login redirect = {}", return_url)
     return redirect(return_url)
@@ -70,17 +64,9 @@ def oauth_callback() -> Response:
         session["logged_out"] = True
         return redirect("/")
 
-    token_url = ParseResult(
-        scheme="https",
-        netloc="accounts.spotify.com",
-        path="api/token",
-        params="",
-        query="",
-        fragment="",
-    ).geturl()
-
-    token_response = requests.post(
-        url=token_url,
+    token_response = get_http_client().post(
+        url=f"{SPOTIFY_ACCOUNTS_URL}/api/token",
+        endpoint="token",
         auth=HTTPBasicAuth(config.spotify_client_id, config.spotify_client_secret),
         data={
             "code": code,
@@ -90,7 +76,6 @@ def oauth_callback() -> Response:
         headers={
             "content-type": "application/x-www-form-urlencoded",
         },
-        timeout=30,
     )
     try:
         token_response.raise_for_status()
@@ -109,12 +94,10 @@ def oauth_callback() -> Response:
     expires_in = int(token_response.json().get("expires_in"))
     refresh_token = token_response.json().get("refresh_token")
 
-    me_response = requests.get(
+    me_response = get_http_client().get(
         url=f"{SPOTIFY_BASE_URL}/me",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-        },
-        timeout=30,
+        access_token=access_token,
+        endpoint="me",
     )
     me_response.raise_for_status()
 
@@ -139,6 +122,7 @@ def oauth_callback() -> Response:
                     token_expires=datetime.now(tz=UTC) + timedelta(seconds=expires_in),
                     token_scope=scope,
                     refresh_token=refresh_token,
+                    refresh_failed_at=None,
                 ),
             )
             session["id"] = existing_user.id
@@ -156,6 +140,7 @@ def oauth_callback() -> Response:
             db_session.flush()
             session["id"] = new_user.id
 
+    forget_user(session["id"])  # Its cached tokens were just replaced
     session["spotify_id"] = user_id
     session["display_name"] = display_name
 
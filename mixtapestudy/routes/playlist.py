@@ -1,42 +1,93 @@
 import json
 import re
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import asdict
 from datetime import datetime, timezone
+from http import HTTPStatus
 from http.client import BAD_REQUEST
 from urllib.parse import ParseResult
+from uuid import UUID
 
 import requests
-from flask import Blueprint, Response, g, redirect, render_template, request, session
+from flask import (
+    Blueprint,
+    Response,
+    g,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_template,
+)
+from werkzeug.exceptions import NotFound
 
+from mixtapestudy.cache import get_cache
+from mixtapestudy.client import get_http_client
 from mixtapestudy.config import (
+    LISTENBRAINZ_BASE_URL,
     SPOTIFY_BASE_URL,
+    PreviewMode,
     RecommendationService,
     get_config,
 )
-from mixtapestudy.database import User, get_session
-from mixtapestudy.models import Song
+from mixtapestudy.error_handlers import render_error_block
+from mixtapestudy.features import get_feature_recommendations, get_feature_store
+from mixtapestudy.jobs import enqueue_preview_job, get_preview_job
+from mixtapestudy.metrics import counter
+from mixtapestudy.models import JobStatus, MatchTier, Song
+from mixtapestudy.normalize import normalize_text
+from mixtapestudy.rejected_artists import add_rejected_artist, get_rejected_artists
 from mixtapestudy.routes.util import get_user
+from mixtapestudy.track_match import get_track_match_index
+from mixtapestudy.track_resolution import (
+    TrackKey,
+    get_track_resolutions,
+    save_track_resolutions,
+    track_key,
+)
+from mixtapestudy.tracks import get_tracks
 
 playlist = Blueprint("playlist", __name__)
 
+RADIO_MODE = "easy"
+# Songs recommended on top of the seeds, by Spotify or from the FEATURE_STORE
+RECOMMENDATION_LIMIT = 72
+# What select_song keeps in the session for each seed
+SEED_FIELDS = ("uri", "id", "name", "artist", "artist_raw")
 
-def _get_spotify_recommendations(
-    selected_songs: dict[str, str], access_token: str
-) -> list[Song]:
-    g.logger.debug("  selected_songs={}", selected_songs)
+RADIO_RETRIES = counter(
+    "lb_radio_retries", "lb-radio requests retried after an artist was rejected"
+)
+RADIO_RETRIES_AVOIDED = counter(
+    "lb_radio_retries_avoided",
+    "lb-radio retries skipped by removing previously rejected artists up front",
+)
+LOCAL_MATCHES = counter(
+    "radio_track_local_matches", "Radio tracks matched in the TRACK_MATCH_INDEX"
+)
+LOCAL_MISSES = counter(
+    "radio_track_local_misses",
+    "Radio tracks the TRACK_MATCH_INDEX had no match for, searched on Spotify",
+)
 
-    playlist_response = requests.get(
-        url=f"{SPOTIFY_BASE_URL}/recommendations",
-        params={
-            "seed_tracks": ",".join([song["id"] for song in selected_songs]),
-            "limit": 72,
-        },
-        headers={"Authorization": f"Bearer {access_token}"},
-        timeout=30,
-    )
-    playlist_response.raise_for_status()
 
-    playlist_songs = [
-        Song(
+def _get_seed_songs(selected_songs: dict[str, str], access_token: str) -> list[Song]:
+    """Return the selected songs with the details the search form posted.
+
+    Only seeds missing one of those details are looked up on Spotify, all of
+    them in a single request (usually served from the cache).
+    """
+    incomplete_ids = [
+        song["id"]
+        for song in selected_songs
+        if not all(song.get(field) for field in SEED_FIELDS)
+    ]
+    spotify_songs = get_tracks(incomplete_ids, access_token)
+    return [
+        spotify_songs.get(song["id"])
+        or Song(
             uri=song["uri"],
             id=song["id"],
             name=song["name"],
@@ -45,20 +96,68 @@ def _get_spotify_recommendations(
         )
         for song in selected_songs
     ]
-    playlist_songs += [
-        Song(
-            uri=song["uri"],
-            id=song["id"],
-            name=song["name"],
-            artist=", ".join([artist["name"] for artist in song["artists"]]),
-            artist_raw=[artist["name"] for artist in song["artists"]],
+
+
+def _get_spotify_recommendations(
+    selected_songs: dict[str, str], access_token: str
+) -> list[Song]:
+    g.logger.debug("  selected_songs={}", selected_songs)
+
+    config = get_config()
+    recommendations_cache = get_cache(
+        "spotify_recommendations",
+        config.recommendations_cache_ttl,
+        config.recommendations_cache_max_entries,
+    )
+    seed_tracks = [song["id"] for song in selected_songs]
+    # Seed order doesn't change the recommendations, only the set does
+    cache_key = ",".join(sorted(seed_tracks))
+
+    cached_songs = recommendations_cache.get(cache_key)
+    if cached_songs is not None:
+        recommended_songs = [Song(**song) for song in cached_songs]
+    else:
+        playlist_response = get_http_client().get(
+            url=f"{SPOTIFY_BASE_URL}/recommendations",
+            params={
+                "seed_tracks": ",".join(seed_tracks),
+                "limit": RECOMMENDATION_LIMIT,
+            },
+            access_token=access_token,
+            endpoint="recommendations",
         )
-        for song in playlist_response.json()["tracks"]
-    ]
+        playlist_response.raise_for_status()
+
+        recommended_songs = [
+            Song(
+                uri=song["uri"],
+                id=song["id"],
+                name=song["name"],
+                artist=", ".join([artist["name"] for artist in song["artists"]]),
+                artist_raw=[artist["name"] for artist in song["artists"]],
+            )
+            for song in playlist_response.json()["tracks"]
+        ]
+        recommendations_cache.set(
+            cache_key, [asdict(song) for song in recommended_songs]
+        )
+    g.logger.debug("  recommendations cache: {}", recommendations_cache.stats())
+
+    playlist_songs = _get_seed_songs(selected_songs, access_token)
+    playlist_songs += recommended_songs
 
     return playlist_songs
 
 
+def _get_local_recommendations(
+    selected_songs: dict[str, str], access_token: str
+) -> list[Song]:
+    recommended_songs = get_feature_recommendations(
+        [song["id"] for song in selected_songs], RECOMMENDATION_LIMIT
+    )
+    return _get_seed_songs(selected_songs, access_token) + recommended_songs
+
+
 def _get_good_radio_response(
     listenbrainz_api_key: str, selected_songs: dict[str, str]
 ) -> Response:
@@ -68,17 +167,30 @@ def _get_good_radio_response(
     for song in selected_songs:
         artists += json.loads(song["artist_raw"])
 
+    # Each artist lb-radio already rejected would otherwise cost a failed request
+    rejected_artists = get_rejected_artists(artists)
+    known_good_artists = [
+        artist for artist in artists if artist not in rejected_artists
+    ]
+    # If they were all rejected, let lb-radio confirm it and report the error
+    if known_good_artists:
+        g.logger.debug("  skipping rejected artists: {}", rejected_artists)
+        RADIO_RETRIES_AVOIDED.increment(len(rejected_artists))
+        artists = known_good_artists
+
     radio_response = None
+    retry_reason = None
 
     for _ in range(30):
         g.logger.debug("  artists: {}", artists)
         prompt_string = " ".join([f"artist:({artist})" for artist in artists])
 
-        radio_response = requests.get(
-            url="https://api.listenbrainz.org/1/explore/lb-radio",
-            params={"mode": "easy", "prompt": prompt_string},
-            headers={"Authorization": f"Bearer {listenbrainz_api_key}"},
-            timeout=30,
+        radio_response = get_http_client().get(
+            url=f"{LISTENBRAINZ_BASE_URL}/explore/lb-radio",
+            params={"mode": RADIO_MODE, "prompt": prompt_string},
+            access_token=listenbrainz_api_key,
+            endpoint="lb-radio",
+            retry_reason=retry_reason,
         )
         try:
             radio_response.raise_for_status()
@@ -96,6 +208,9 @@ def _get_good_radio_response(
 
             if artist_name_search:
                 bad_artist = artist_name_search.group(1)
+                add_rejected_artist(bad_artist)
+                RADIO_RETRIES.increment()
+                retry_reason = "rejected artist"
                 artists = [artist for artist in artists if artist != bad_artist]
 
             if not artists:
@@ -104,98 +219,276 @@ def _get_good_radio_response(
     if radio_response:
         radio_response.raise_for_status()
 
-    return radio_response
+    g.logger.debug(
+        "  lb-radio retries: {}, retries avoided: {}",
+        RADIO_RETRIES.value,
+        RADIO_RETRIES_AVOIDED.value,
+    )
 
+    return radio_response
 
-def _get_listenbrainz_radio(
-    selected_songs: dict[str, str], listenbrainz_api_key: str, spotify_access_token: str
-) -> list[Song]:
-    radio_response = _get_good_radio_response(listenbrainz_api_key, selected_songs)
 
-    spotify_tracks = []
+_MATCH_ICONS = {
+    MatchTier.LOCAL: "[L]",
+    MatchTier.STRICT: "[X]",
+    MatchTier.LOOSE: "[/]",
+    MatchTier.MISS: "[ ]",
+}
 
-    for track in radio_response.json()["payload"]["jspf"]["playlist"]["track"]:
-        query_string = f'track:{track["title"]} artist:{track["creator"]}'
-        track_found_icon = "[ ]"
 
-        # https://developer.spotify.com/documentation/web-api/reference/search
-        spotify_search = requests.get(
-            url="https://api.spotify.com/v1/search",
+def _get_radio_playlist(
+    listenbrainz_api_key: str, selected_songs: dict[str, str]
+) -> dict:
+    """Return the lb-radio JSPF response, cached per artist set across workers."""
+    config = get_config()
+    radio_cache = get_cache(
+        "lb_radio", config.radio_cache_ttl, config.radio_cache_max_entries
+    )
+    artists = {
+        normalize_text(artist)
+        for song in selected_songs
+        for artist in json.loads(song["artist_raw"])
+    }
+    cache_key = f"{RADIO_MODE}:{json.dumps(sorted(artists))}"
+
+    radio_json = radio_cache.get(cache_key)
+    if radio_json:
+        g.logger.debug("  lb-radio cache hit: {}", cache_key)
+        return radio_json
+
+    g.logger.debug("  lb-radio cache miss: {}", cache_key)
+    radio_json = _get_good_radio_response(listenbrainz_api_key, selected_songs).json()
+    radio_cache.set(cache_key, radio_json)
+    return radio_json
+
+
+def _search_spotify_track(
+    track: dict[str, str], spotify_access_token: str
+) -> tuple[MatchTier, str, Song | None]:
+    """Find the Spotify track for a radio track, returning (tier, query, song)."""
+    query_string = f"track:{track['title']} artist:{track['creator']}"
+    match_tier = MatchTier.STRICT
+
+    # https://developer.spotify.com/documentation/web-api/reference/search
+    spotify_search = get_http_client().get(
+        url=f"{SPOTIFY_BASE_URL}/search",
+        params={"type": "track", "q": query_string},
+        access_token=spotify_access_token,
+        endpoint="search",
+    )
+    spotify_search.raise_for_status()
+    spotify_json = spotify_search.json()
+
+    if not (spotify_json["tracks"] and spotify_json["tracks"]["items"]):
+        query_string = f"{track['title']} {track['creator']}"
+        match_tier = MatchTier.LOOSE
+        spotify_search = get_http_client().get(
+            url=f"{SPOTIFY_BASE_URL}/search",
             params={"type": "track", "q": query_string},
-            headers={"Authorization": f"Bearer {spotify_access_token}"},
-            timeout=30,
+            access_token=spotify_access_token,
+            endpoint="search",
+            retry_reason="no strict match",
         )
         spotify_search.raise_for_status()
-
         spotify_json = spotify_search.json()
 
-        if spotify_json["tracks"] and spotify_json["tracks"]["items"]:
-            spotify_tracks.append(spotify_json["tracks"]["items"][0])
-            track_found_icon = "[X]"
-        else:
-            query_string = f'{track["title"]} {track["creator"]}'
-            spotify_search = requests.get(
-                url="https://api.spotify.com/v1/search",
-                params={"type": "track", "q": query_string},
-                headers={"Authorization": f"Bearer {spotify_access_token}"},
-                timeout=30,
-            )
-            spotify_search.raise_for_status()
-
-            spotify_json = spotify_search.json()
-            if spotify_json["tracks"] and spotify_json["tracks"]["items"]:
-                track_found_icon = "[/]"
-                spotify_tracks.append(spotify_json["tracks"]["items"][0])
-
-        g.logger.debug("{} {}", track_found_icon, query_string)
-
-    playlist_songs = [
-        Song(
-            uri=song["uri"],
-            id=song["id"],
-            name=song["name"],
-            artist=song["artist"],
-            artist_raw=song["artist_raw"],
-        )
-        for song in selected_songs
-    ]
+    if not (spotify_json["tracks"] and spotify_json["tracks"]["items"]):
+        return MatchTier.MISS, query_string, None
 
-    # This is slightly sub-optimal since we loop through tracks above,
-    # but it's a small list and this is much easier to think about
-    # if everything's taken care of above
-    playlist_songs += [
+    song = spotify_json["tracks"]["items"][0]
+    return (
+        match_tier,
+        query_string,
         Song(
             uri=song["uri"],
             id=song["id"],
             name=song["name"],
             artist=", ".join([artist["name"] for artist in song["artists"]]),
             artist_raw=[artist["name"] for artist in song["artists"]],
+        ),
+    )
+
+
+def _match_local_tracks(tracks: dict[TrackKey, dict[str, str]]) -> dict[TrackKey, Song]:
+    """Return the songs found for radio tracks in the TRACK_MATCH_INDEX, if set."""
+    config = get_config()
+    if not config.track_match_index:
+        return {}
+
+    feature_store = get_feature_store(config.feature_store)
+    track_match_index = get_track_match_index(config.track_match_index)
+    local_matches = {}
+    for key, track in tracks.items():
+        song = track_match_index.find(feature_store, track["title"], track["creator"])
+        if song:
+            local_matches[key] = song
+
+    LOCAL_MATCHES.increment(len(local_matches))
+    LOCAL_MISSES.increment(len(tracks) - len(local_matches))
+    g.logger.debug("  local matches: {} of {}", len(local_matches), len(tracks))
+    return local_matches
+
+
+def _iter_listenbrainz_radio(
+    selected_songs: dict[str, str], listenbrainz_api_key: str, spotify_access_token: str
+) -> Iterator[Song]:
+    """Yield the seeds, then each radio track as soon as it's been resolved."""
+    yield from _get_seed_songs(selected_songs, spotify_access_token)
+
+    radio_json = _get_radio_playlist(listenbrainz_api_key, selected_songs)
+    radio_tracks = radio_json["payload"]["jspf"]["playlist"]["track"]
+
+    track_keys = [track_key(track["title"], track["creator"]) for track in radio_tracks]
+    # Tracks in the store need neither the cache nor a search
+    local_matches = _match_local_tracks(
+        dict(zip(track_keys, radio_tracks, strict=True))
+    )
+    cached_resolutions = get_track_resolutions(set(track_keys) - set(local_matches))
+
+    # Each distinct (title, creator) pair is searched for at most once
+    unresolved_tracks = {
+        key: track
+        for key, track in zip(track_keys, radio_tracks, strict=True)
+        if key not in local_matches and key not in cached_resolutions
+    }
+    search_results = {}
+
+    # Searches run side by side so a preview takes as long as the slowest lookup
+    # rather than the sum of them, map() still returns results in radio order.
+    # Each gets a copy of the request's context to record in its call ledger.
+    try:
+        with ThreadPoolExecutor(
+            max_workers=get_config().radio_search_concurrency
+        ) as executor:
+            pending_results = zip(
+                unresolved_tracks,
+                executor.map(
+                    lambda track, context: context.run(
+                        _search_spotify_track, track, spotify_access_token
+                    ),
+                    unresolved_tracks.values(),
+                    [copy_context() for _ in unresolved_tracks],
+                ),
+                strict=True,
+            )
+
+            for key, track in zip(track_keys, radio_tracks, strict=True):
+                if key in local_matches:
+                    song = local_matches[key]
+                    g.logger.debug(
+                        "{} {} {}",
+                        _MATCH_ICONS[MatchTier.LOCAL],
+                        track["title"],
+                        track["creator"],
+                    )
+                elif key in cached_resolutions:
+                    match_tier, song = cached_resolutions[key]
+                    g.logger.debug(
+                        "{} {} {} (cached)",
+                        _MATCH_ICONS[match_tier],
+                        track["title"],
+                        track["creator"],
+                    )
+                else:
+                    # Unresolved keys come back in the order they first appear
+                    if key not in search_results:
+                        pending_key, search_result = next(pending_results)
+                        search_results[pending_key] = search_result
+                    match_tier, query_string, song = search_results[key]
+                    g.logger.debug("{} {}", _MATCH_ICONS[match_tier], query_string)
+
+                if song:
+                    yield song
+    finally:
+        # Keep what was resolved even if the client went away mid stream
+        save_track_resolutions(
+            {key: (tier, song) for key, (tier, _, song) in search_results.items()}
         )
-        for song in spotify_tracks
-    ]
-    g.logger.debug(playlist_songs)
 
+
+def iter_playlist_songs(
+    selected_songs: list[dict[str, str]], access_token: str
+) -> Iterator[Song]:
+    config = get_config()
+    match config.recommendation_service:
+        case RecommendationService.SPOTIFY:
+            yield from _get_spotify_recommendations(selected_songs, access_token)
+        case RecommendationService.LISTENBRAINZ:
+            yield from _iter_listenbrainz_radio(
+                selected_songs, config.listenbrainz_api_key, access_token
+            )
+        case RecommendationService.LOCAL:
+            yield from _get_local_recommendations(selected_songs, access_token)
+
+
+def generate_playlist_songs(
+    selected_songs: list[dict[str, str]], access_token: str
+) -> list[Song]:
+    playlist_songs = list(iter_playlist_songs(selected_songs, access_token))
+    g.logger.debug(playlist_songs)
     return playlist_songs
 
 
+def _catch_stream_error(songs: Iterator[Song], stream_error: dict) -> Iterator[Song]:
+    """Yield the songs, ending the page with an error block if one fails."""
+    try:
+        yield from songs
+    except Exception as error:  # noqa: BLE001 (the 200 status has been sent)
+        stream_error["block"] = render_error_block(error)
+
+
 @playlist.route("/playlist/preview", methods=["POST"])
-def generate_playlist() -> str:
+def generate_playlist() -> str | Response:
     config = get_config()
     selected_songs = session.get("selected_songs")
     g.logger.debug(" selected_songs={}", selected_songs)
 
     user = get_user()
-    access_token = user.access_token
 
-    match config.recommendation_service:
-        case RecommendationService.SPOTIFY:
-            playlist_songs = _get_spotify_recommendations(selected_songs, access_token)
-        case RecommendationService.LISTENBRAINZ:
-            playlist_songs = _get_listenbrainz_radio(
-                selected_songs, config.listenbrainz_api_key, access_token
+    match config.preview_mode:
+        case PreviewMode.SYNC:
+            playlist_songs = generate_playlist_songs(selected_songs, user.access_token)
+            return render_template("playlist.html.j2", playlist_songs=playlist_songs)
+        case PreviewMode.STREAM:
+            stream_error = {}
+            songs = _catch_stream_error(
+                iter_playlist_songs(selected_songs, user.access_token), stream_error
+            )
+            return Response(
+                stream_template(
+                    "playlist.html.j2",
+                    playlist_songs=songs,
+                    streaming=True,
+                    stream_error=stream_error,
+                ),
+                # Otherwise nginx holds the page back until it's complete
+                headers={"X-Accel-Buffering": "no"},
             )
+        case PreviewMode.QUEUE:
+            job_id = enqueue_preview_job(user.id, selected_songs)
+            g.logger.debug("  queued preview job: {}", job_id)
+            return redirect(f"/playlist/preview/{job_id}", code=HTTPStatus.SEE_OTHER)
+
 
-    return render_template("playlist.html.j2", playlist_songs=playlist_songs)
+@playlist.route("/playlist/preview/<uuid:job_id>")
+def get_playlist_preview(job_id: UUID) -> str | tuple[str, int]:
+    user = get_user()
+    job = get_preview_job(job_id, user.id)
+    if not job:
+        raise NotFound
+
+    match job.status:
+        case JobStatus.DONE:
+            playlist_songs = [Song(**song) for song in job.playlist_songs]
+            return render_template("playlist.html.j2", playlist_songs=playlist_songs)
+        case JobStatus.FAILED:
+            return (
+                render_template("500_error.html.j2", error_code=job.error_code),
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+            )
+        case _:
+            # The pending page refreshes itself until the job is finished
+            return render_template("playlist_pending.html.j2")
 
 
 @playlist.route("/playlist/save", methods=["POST"])
@@ -209,31 +502,28 @@ def save_playlist() -> str | Response:
     playlist_name = request.form.get("playlist_name")
     playlist_uris = [song["uri"] for song in playlist_songs]
 
-    with get_session() as db_session:
-        user = db_session.get(User, user.id)
-        g.logger.debug("User from database: {}", user)
-        spotify_id = user.spotify_id
-        access_token = user.access_token
+    spotify_id = user.spotify_id
+    access_token = user.access_token
 
-    create_playlist_response = requests.post(
+    create_playlist_response = get_http_client().post(
         f"{SPOTIFY_BASE_URL}/users/{spotify_id}/playlists",
-        headers={"Authorization": f"Bearer {access_token}"},
+        access_token=access_token,
+        endpoint="create-playlist",
         json={
             "name": f"{playlist_name} ({datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S})",
             "description": "Generated by mixtapestudy.com",
             "public": True,
             "collaborative": False,
         },
-        timeout=30,
     )
     create_playlist_response.raise_for_status()
     playlist_id = create_playlist_response.json()["id"]
 
-    add_songs_response = requests.post(
+    add_songs_response = get_http_client().post(
         f"{SPOTIFY_BASE_URL}/playlists/{playlist_id}/tracks",
-        headers={"Authorization": f"Bearer {access_token}"},
+        access_token=access_token,
+        endpoint="add-tracks",
         json={"uris": playlist_uris},
-        timeout=30,
     )
     add_songs_response.raise_for_status()
 
@@ -8,6 +8,9 @@ from flask import (
     session,
 )
 
+from mixtapestudy.config import get_config
+from mixtapestudy.metrics import render_metrics
+
 root = Blueprint("root", __name__)
 
 
@@ -33,3 +36,12 @@ def info() -> Response:
 @root.route("/flask-health-check")
 def flask_health_check() -> str:
     return "success"
+
+
+@root.route("/metrics")
+def metrics() -> Response:
+    # nginx only lets this through from inside the network
+    return Response(
+        render_metrics(get_config().metrics_dir),
+        mimetype="text/plain; version=0.0.4",
+    )
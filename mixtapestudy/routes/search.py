@@ -1,35 +1,33 @@
-import requests
 from flask import Blueprint, g, redirect, render_template, request, session
 from werkzeug.wrappers.response import Response
 
-from mixtapestudy.config import SPOTIFY_BASE_URL
-from mixtapestudy.database import User, get_session
+from mixtapestudy.cache import get_local_cache
+from mixtapestudy.client import get_http_client
+from mixtapestudy.config import SPOTIFY_BASE_URL, get_config
 from mixtapestudy.models import Song
+from mixtapestudy.normalize import normalize_text
 from mixtapestudy.routes.util import get_user
 
 search = Blueprint("search", __name__)
 
 
-@search.route("/search")
-def get_search_page() -> str:
-    user = get_user()
-
-    g.logger.debug("User ID from session: {}", user.id)
-
-    search_term = request.args.get("search_term")
-    search_results = []
-
-    if search_term:
-        with get_session() as db_session:
-            user = db_session.get(User, user.id)
-            g.logger.debug("User from database: {}", user)
-            access_token = user.access_token
+def _search_tracks(search_term: str, access_token: str) -> list[Song]:
+    config = get_config()
+    # Catalog results are the same for everybody so the cache is shared by users.
+    # It stays in this worker so the redirects back from /search/select and
+    # /search/remove don't cost a database round trip
+    search_cache = get_local_cache(
+        "spotify_search", config.search_cache_ttl, config.search_cache_max_entries
+    )
+    cache_key = normalize_text(search_term)
 
-        search_response = requests.get(
+    search_results = search_cache.get(cache_key)
+    if search_results is None:
+        search_response = get_http_client().get(
             url=f"{SPOTIFY_BASE_URL}/search",
             params={"q": search_term, "type": "track", "limit": 8},
-            headers={"Authorization": f"Bearer {access_token}"},
-            timeout=30,
+            access_token=access_token,
+            endpoint="search",
         )
         search_response.raise_for_status()
 
@@ -44,6 +42,23 @@ def get_search_page() -> str:
             )
             for song in rjson["tracks"]["items"]
         ]
+        search_cache.set(cache_key, search_results)
+
+    g.logger.debug("  search cache: {}", search_cache.stats())
+    return search_results
+
+
+@search.route("/search")
+def get_search_page() -> str:
+    user = get_user()
+
+    g.logger.debug("User ID from session: {}", user.id)
+
+    search_term = request.args.get("search_term")
+    search_results = []
+
+    if search_term:
+        search_results = _search_tracks(search_term, user.access_token)
 
     selected_songs = session.get(
         "selected_songs", [{"id": None}, {"id": None}, {"id": None}]
@@ -1,21 +1,36 @@
 from datetime import UTC, datetime, timedelta
+from uuid import UUID
 
-import requests
 from flask import g, session
 from requests import HTTPError
 from requests.auth import HTTPBasicAuth
 from sqlalchemy.orm import Session
 
-from mixtapestudy.config import get_config
+from mixtapestudy.cache import get_local_cache
+from mixtapestudy.client import get_http_client
+from mixtapestudy.config import SPOTIFY_ACCOUNTS_URL, get_config
 from mixtapestudy.data import UserData
 from mixtapestudy.database import UnexpectedDatabaseError, User, get_session
 from mixtapestudy.errors import UserDatabaseRowMissingError, UserIDMissingError
+from mixtapestudy.metrics import counter
+
+# Requests refresh the token themselves when it expires within this margin
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+TOKEN_REFRESHES = counter(
+    "token_refreshes", "Spotify access tokens refreshed inline by a request"
+)
+TOKEN_REFRESHES_COALESCED = counter(
+    "token_refreshes_coalesced",
+    "Token refreshes skipped because a concurrent request had just done it",
+)
 
 
 def _refresh_token(user: User, session: Session) -> None:
     config = get_config()
-    refresh_response = requests.post(
-        "https://accounts.spotify.com/api/token",
+    refresh_response = get_http_client().post(
+        f"{SPOTIFY_ACCOUNTS_URL}/api/token",
+        endpoint="token",
         auth=HTTPBasicAuth(config.spotify_client_id, config.spotify_client_secret),
         headers={
             "Content-Type": "application/x-www-form-urlencoded",
@@ -24,7 +39,6 @@ def _refresh_token(user: User, session: Session) -> None:
             "grant_type": "refresh_token",
             "refresh_token": user.refresh_token,
         },
-        timeout=30,
     )
     try:
         refresh_response.raise_for_status()
@@ -44,9 +58,67 @@ def _refresh_token(user: User, session: Session) -> None:
     expires_in = int(refresh_response.json()["expires_in"])
     user.token_expires = datetime.now(tz=UTC) + timedelta(seconds=expires_in)
     user.scope = refresh_response.json()["scope"]
+    user.refresh_failed_at = None
     session.merge(user)
 
 
+def refresh_token_before(
+    user: User, db_session: Session, refresh_before: datetime
+) -> bool:
+    """Refresh the user's token if it expires before refresh_before.
+
+    Concurrent callers for the same user queue on the row lock, the first
+    refreshes and the rest find its new token once they get the row. Returns
+    whether this call did the refresh.
+    """
+    if user.token_expires >= refresh_before:
+        return False
+
+    db_session.refresh(user, with_for_update=True)
+    if user.token_expires >= refresh_before:
+        TOKEN_REFRESHES_COALESCED.increment()
+        g.logger.debug(
+            "  token refreshes coalesced: {}", TOKEN_REFRESHES_COALESCED.value
+        )
+        return False
+
+    _refresh_token(user, db_session)
+    return True
+
+
+def load_user(user_id: UUID) -> UserData:
+    """Return a user from the database, refreshing their Spotify token if needed.
+
+    Used directly by code running outside a request, like the preview worker.
+    """
+    with get_session() as db_session:
+        user = db_session.get(User, user_id)
+        if not user:
+            raise UserDatabaseRowMissingError
+
+        five_minutes_from_now = datetime.now(tz=UTC) + TOKEN_REFRESH_MARGIN
+        g.logger.debug("  token_expires: {}", user.token_expires)
+        g.logger.debug("  five_minutes_from_now: {}", five_minutes_from_now)
+        g.logger.debug(
+            "  token_expires - five_minutes_from_now = {}",
+            user.token_expires - five_minutes_from_now,
+        )
+        if refresh_token_before(user, db_session, five_minutes_from_now):
+            TOKEN_REFRESHES.increment()
+            g.logger.debug("  inline token refreshes: {}", TOKEN_REFRESHES.value)
+
+        # Marks the user active for the background token refresher, written at
+        # most once a minute so requests don't all update the row
+        now = datetime.now(tz=UTC)
+        if not user.last_seen or user.last_seen < now - timedelta(minutes=1):
+            user.last_seen = now
+
+        user_dict = {
+            column.name: getattr(user, column.name) for column in User.__mapper__.c
+        }
+        return UserData(**user_dict)
+
+
 def get_user() -> UserData:
     """Return a user from the database from the session.
 
@@ -62,27 +134,34 @@ def get_user() -> UserData:
     if not user_id:
         raise UserIDMissingError
 
-    try:
-        with get_session() as db_session:
-            user = db_session.get(User, user_id)
-            if not user:
-                session.clear()
-                raise UserDatabaseRowMissingError
-
-            five_minutes_from_now = datetime.now(tz=UTC) + timedelta(minutes=5)
-            g.logger.debug("  token_expires: {}", user.token_expires)
-            g.logger.debug("  five_minutes_from_now: {}", five_minutes_from_now)
-            g.logger.debug(
-                "  token_expires - five_minutes_from_now = {}",
-                user.token_expires - five_minutes_from_now,
-            )
-            if user.token_expires < five_minutes_from_now:
-                _refresh_token(user, db_session)
-
-            user_dict = {
-                column.name: getattr(user, column.name) for column in User.__mapper__.c
-            }
-            return UserData(**user_dict)
-    except UnexpectedDatabaseError as error:
-        session.clear()
-        raise UserDatabaseRowMissingError from error
+    # Loaded once per request
+    user = g.get("user")
+    if user and user.id == user_id:
+        return user
+
+    # and shared with this worker's next few requests, unless the token is due
+    # to be refreshed (an unexpired token stays valid even after a refresh)
+    config = get_config()
+    user_cache = get_local_cache(
+        "user", config.user_cache_ttl, config.user_cache_max_entries
+    )
+    user = user_cache.get(str(user_id))
+    if not user or user.token_expires < datetime.now(tz=UTC) + TOKEN_REFRESH_MARGIN:
+        try:
+            user = load_user(user_id)
+        except UnexpectedDatabaseError as error:
+            session.clear()
+            raise UserDatabaseRowMissingError from error
+        user_cache.set(str(user_id), user)
+    g.logger.debug("  user cache: {}", user_cache.stats())
+
+    g.user = user
+    return user
+
+
+def forget_user(user_id: UUID) -> None:
+    """Drop the user from this worker's cache after changing their row."""
+    config = get_config()
+    get_local_cache(
+        "user", config.user_cache_ttl, config.user_cache_max_entries
+    ).delete(str(user_id))
@@ -0,0 +1,126 @@
+"""Token refresher, run with `python -m mixtapestudy.token_refresher`.
+
+Refreshes the Spotify tokens of active users before they expire so requests
+almost never have to wait on accounts.spotify.com themselves.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from flask import Flask, g
+from loguru import logger
+from sqlalchemy import or_, select, update
+
+from mixtapestudy.app import create_app
+from mixtapestudy.config import get_config
+from mixtapestudy.database import UnexpectedDatabaseError, User, get_session
+from mixtapestudy.metrics import counter, start_metrics_writer
+from mixtapestudy.routes.util import refresh_token_before
+
+BACKGROUND_TOKEN_REFRESHES = counter(
+    "background_token_refreshes", "Spotify access tokens refreshed ahead of time"
+)
+BACKGROUND_TOKEN_REFRESH_FAILURES = counter(
+    "background_token_refresh_failures", "Background token refreshes that failed"
+)
+
+
+def _refresh_user(app: Flask, user_id: UUID, refresh_before: datetime) -> None:
+    with app.app_context():
+        g.logger = logger.bind(user=str(user_id)[24:])
+        try:
+            with get_session() as db_session:
+                user = db_session.get(User, user_id)
+                refreshed = user and refresh_token_before(
+                    user, db_session, refresh_before
+                )
+        except UnexpectedDatabaseError:
+            # Likely a revoked token, the user's next request will find out.
+            # Until then they're left out of batches, see TOKEN_REFRESH_RETRY_AFTER
+            BACKGROUND_TOKEN_REFRESH_FAILURES.increment()
+            g.logger.exception("Background token refresh failed")
+            with get_session() as db_session:
+                db_session.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(refresh_failed_at=datetime.now(tz=UTC))
+                )
+            return
+
+        if refreshed:
+            BACKGROUND_TOKEN_REFRESHES.increment()
+
+
+def _next_batch(refresh_before: datetime) -> list[UUID]:
+    config = get_config()
+    now = datetime.now(tz=UTC)
+    active_since = now - timedelta(seconds=config.token_refresh_active_window)
+    retry_since = now - timedelta(seconds=config.token_refresh_retry_after)
+
+    with get_session() as db_session:
+        return db_session.scalars(
+            select(User.id)
+            .where(
+                User.last_seen > active_since,
+                User.token_expires < refresh_before,
+                or_(
+                    User.refresh_failed_at.is_(None),
+                    User.refresh_failed_at < retry_since,
+                ),
+            )
+            .order_by(User.token_expires)
+            .limit(config.token_refresh_batch_size)
+        ).all()
+
+
+def refresh_expiring_tokens(app: Flask) -> int:
+    """Refresh every expiring token a batch at a time, returning how many users.
+
+    Each user refreshed or marked failed drops out of the query, so batches are
+    taken until it comes back empty.
+    """
+    config = get_config()
+    refresh_before = datetime.now(tz=UTC) + timedelta(
+        seconds=config.token_refresh_ahead
+    )
+
+    attempted = set()
+    while user_ids := [
+        user_id for user_id in _next_batch(refresh_before) if user_id not in attempted
+    ]:
+        attempted.update(user_ids)
+        with ThreadPoolExecutor(
+            max_workers=config.token_refresh_concurrency
+        ) as executor:
+            list(
+                executor.map(
+                    lambda user_id: _refresh_user(app, user_id, refresh_before),
+                    user_ids,
+                )
+            )
+
+        logger.info(
+            "Refreshed tokens for {} users, background refreshes: {}, failures: {}",
+            len(user_ids),
+            BACKGROUND_TOKEN_REFRESHES.value,
+            BACKGROUND_TOKEN_REFRESH_FAILURES.value,
+        )
+    return len(attempted)
+
+
+def run_refresher() -> None:
+    app = create_app()
+    config = get_config()
+    if config.metrics_dir:
+        start_metrics_writer(config.metrics_dir, config.metrics_write_interval)
+    interval = config.token_refresh_interval
+    logger.info("Token refresher started")
+    while True:
+        refresh_expiring_tokens(app)
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    run_refresher()
@@ -0,0 +1,111 @@
+"""Resolve radio tracks to songs in the FEATURE_STORE instead of searching Spotify.
+
+Titles and artists are reduced to match keys, see radio_match_keys(), which
+ignore case, accents, punctuation, featured artists and version suffixes like
+"(Remastered 2011)" or "- Live". TRACK_MATCH_INDEX is the hash of every
+key of every track in the store, sorted with the row it came from, built by
+mixtapestudy.build_track_match_index and memory-mapped like the store itself.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from hashlib import blake2b
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+from mixtapestudy.feature_store import FeatureStore, split_artists
+from mixtapestudy.models import Song
+from mixtapestudy.normalize import normalize_text
+
+MatchKey = tuple[str, str]
+
+# Bracketed or dashed on the end of a title, like a remaster year or a live venue
+_TITLE_EXTRAS = re.compile(r"\s*[(\[].*?[)\]]|\s+-\s+.*$")
+# Between the artists of "A feat. B", "A & B", "A x B" or "A, B"
+_CREATOR_SEPARATORS = re.compile(
+    r"\s+(?:feat\.?|ft\.?|featuring|x|vs\.?|&)\s+|\s*[,;/]\s*"
+)
+_WORDS = re.compile(r"\w+")
+
+_track_match_indexes = {}
+_track_match_index_lock = Lock()
+
+
+def _words(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", normalize_text(text))
+    unaccented = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(_WORDS.findall(unaccented))
+
+
+def _title_key(title: str) -> str:
+    # A title that is all extras, "(Untitled)", is kept whole
+    return _words(_TITLE_EXTRAS.sub("", title)) or _words(title)
+
+
+def radio_match_keys(title: str, creator: str) -> list[MatchKey]:
+    """Keys for the whole credit of a radio track, then just its first artist."""
+    title_key = _title_key(title)
+    first_artist = _CREATOR_SEPARATORS.split(normalize_text(creator), maxsplit=1)[0]
+    keys = [(title_key, _words(artist)) for artist in (creator, first_artist)]
+    return [key for key in dict.fromkeys(keys) if all(key)]
+
+
+def store_match_keys(title: str, artists: list[str]) -> set[MatchKey]:
+    """Keys for every artist of a store track, then just its first artist."""
+    if not artists:
+        return set()
+    title_key = _title_key(title)
+    keys = {(title_key, _words(" ".join(artists))), (title_key, _words(artists[0]))}
+    return {key for key in keys if all(key)}
+
+
+def key_hash(key: MatchKey) -> np.uint64:
+    # Titles and artists are words separated by spaces, never \x1f
+    digest = blake2b("\x1f".join(key).encode(), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, "little"))
+
+
+@dataclass(frozen=True)
+class TrackMatchIndex:
+    # Sorted key hashes and the store row each is for, the first of any
+    # duplicates since the datasets overlap
+    hashes: np.ndarray
+    rows: np.ndarray
+
+    @classmethod
+    def open(cls, path: str) -> "TrackMatchIndex":
+        return cls(
+            hashes=np.load(Path(path) / "hashes.npy", mmap_mode="r"),
+            rows=np.load(Path(path) / "rows.npy", mmap_mode="r"),
+        )
+
+    def save(self, path: str) -> None:
+        Path(path).mkdir(parents=True, exist_ok=True)
+        np.save(Path(path) / "hashes.npy", self.hashes)
+        np.save(Path(path) / "rows.npy", self.rows)
+
+    def find(
+        self, feature_store: FeatureStore, title: str, creator: str
+    ) -> Song | None:
+        """Return the store's song for a radio track, None if it has no match."""
+        for key in radio_match_keys(title, creator):
+            hashed = key_hash(key)
+            position = np.searchsorted(self.hashes, hashed)
+            if position == len(self.hashes) or self.hashes[position] != hashed:
+                continue
+            row = int(self.rows[position])
+            # Different keys can share a hash, the track must have this one
+            artists = split_artists(feature_store.text("artist", row))
+            if key in store_match_keys(feature_store.text("track_name", row), artists):
+                return feature_store.song(row)
+        return None
+
+
+def get_track_match_index(path: str) -> TrackMatchIndex:
+    with _track_match_index_lock:
+        if path not in _track_match_indexes:
+            _track_match_indexes[path] = TrackMatchIndex.open(path)
+    return _track_match_indexes[path]
@@ -0,0 +1,91 @@
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from mixtapestudy.config import get_config
+from mixtapestudy.database import TrackResolution, get_session
+from mixtapestudy.models import MatchTier, Song
+from mixtapestudy.normalize import normalize_text
+
+TrackKey = tuple[str, str]
+Resolution = tuple[MatchTier, Song | None]
+
+
+def track_key(title: str, creator: str) -> TrackKey:
+    return normalize_text(title), normalize_text(creator)
+
+
+def get_track_resolutions(keys: set[TrackKey]) -> dict[TrackKey, Resolution]:
+    """Return the cached resolution for every key that has a live entry."""
+    if not keys:
+        return {}
+
+    with get_session() as db_session:
+        rows = db_session.scalars(
+            select(TrackResolution).where(
+                tuple_(TrackResolution.title_key, TrackResolution.creator_key).in_(
+                    keys
+                ),
+                or_(
+                    TrackResolution.expires.is_(None),
+                    TrackResolution.expires > datetime.now(tz=UTC),
+                ),
+            )
+        ).all()
+
+        return {
+            (row.title_key, row.creator_key): (
+                MatchTier(row.match_tier),
+                Song(
+                    uri=row.spotify_uri,
+                    id=row.spotify_id,
+                    name=row.name,
+                    artist=", ".join(row.artist_raw),
+                    artist_raw=row.artist_raw,
+                )
+                if row.spotify_id
+                else None,
+            )
+            for row in rows
+        }
+
+
+def save_track_resolutions(resolutions: dict[TrackKey, Resolution]) -> None:
+    """Store search outcomes, misses expire after TRACK_RESOLUTION_MISS_TTL."""
+    if not resolutions:
+        return
+
+    now = datetime.now(tz=UTC)
+    miss_expires = now + timedelta(seconds=get_config().track_resolution_miss_ttl)
+    statement = insert(TrackResolution).values(
+        [
+            {
+                "title_key": title_key,
+                "creator_key": creator_key,
+                "match_tier": match_tier.value,
+                "spotify_uri": song.uri if song else None,
+                "spotify_id": song.id if song else None,
+                "name": song.name if song else None,
+                "artist_raw": song.artist_raw if song else None,
+                "expires": None if song else miss_expires,
+            }
+            for (title_key, creator_key), (match_tier, song) in resolutions.items()
+        ]
+    )
+    # Another worker may have resolved the same track in the meantime
+    statement = statement.on_conflict_do_update(
+        index_elements=[TrackResolution.title_key, TrackResolution.creator_key],
+        set_={
+            "match_tier": statement.excluded.match_tier,
+            "spotify_uri": statement.excluded.spotify_uri,
+            "spotify_id": statement.excluded.spotify_id,
+            "name": statement.excluded.name,
+            "artist_raw": statement.excluded.artist_raw,
+            "expires": statement.excluded.expires,
+            "updated": now,
+        },
+    )
+
+    with get_session() as db_session:
+        db_session.execute(statement)
@@ -0,0 +1,62 @@
+from dataclasses import asdict
+
+from mixtapestudy.cache import get_cache
+from mixtapestudy.client import get_http_client
+from mixtapestudy.config import SPOTIFY_BASE_URL, get_config
+from mixtapestudy.models import Song
+
+# Most IDs Spotify accepts in one request to /tracks
+TRACKS_BATCH_SIZE = 50
+
+
+def get_tracks(track_ids: list[str], access_token: str) -> dict[str, Song]:
+    """Look up Spotify tracks by ID, returning them keyed by the requested ID.
+
+    IDs are looked up once however often they're repeated, in the cache with
+    one query, and only the ones missing from it are fetched, 50 per request.
+    IDs Spotify doesn't recognise are left out of the result.
+    """
+    config = get_config()
+    tracks_cache = get_cache(
+        "spotify_tracks", config.tracks_cache_ttl, config.tracks_cache_max_entries
+    )
+
+    track_ids = list(dict.fromkeys(track_ids))
+    cached_songs = tracks_cache.get_many(track_ids)
+    songs = {track_id: Song(**song) for track_id, song in cached_songs.items()}
+    uncached_ids = [track_id for track_id in track_ids if track_id not in songs]
+
+    for i in range(0, len(uncached_ids), TRACKS_BATCH_SIZE):
+        batch_ids = uncached_ids[i : i + TRACKS_BATCH_SIZE]
+        # https://developer.spotify.com/documentation/web-api/reference/get-several-tracks
+        tracks_response = get_http_client().get(
+            url=f"{SPOTIFY_BASE_URL}/tracks",
+            params={"ids": ",".join(batch_ids)},
+            access_token=access_token,
+            endpoint="tracks",
+        )
+        tracks_response.raise_for_status()
+
+        # Tracks come back in request order, null where the ID wasn't found
+        for track_id, track in zip(
+            batch_ids, tracks_response.json()["tracks"], strict=True
+        ):
+            if not track:
+                continue
+            songs[track_id] = Song(
+                uri=track["uri"],
+                id=track["id"],
+                name=track["name"],
+                artist=", ".join([artist["name"] for artist in track["artists"]]),
+                artist_raw=[artist["name"] for artist in track["artists"]],
+            )
+        tracks_cache.set_many(
+            {
+                track_id: asdict(songs[track_id])
+                for track_id in batch_ids
+                if track_id in songs
+            }
+        )
+
+    # In the order requested, cached or not
+    return {track_id: songs[track_id] for track_id in track_ids if track_id in songs}
@@ -0,0 +1,90 @@
+"""Preview worker, run with `python -m mixtapestudy.worker`.
+
+Generates the playlist previews queued by /playlist/preview when
+PREVIEW_MODE=queue, so the slow upstream fan-out doesn't hold a web worker.
+Each process runs PREVIEW_WORKER_CONCURRENCY jobs at once, run more replicas
+for more.
+"""
+
+from threading import Event, Thread
+from uuid import uuid4
+
+from flask import Flask, g
+from loguru import logger
+
+from mixtapestudy.app import create_app
+from mixtapestudy.config import get_config
+from mixtapestudy.jobs import (
+    claim_preview_job,
+    delete_old_preview_jobs,
+    fail_preview_job,
+    finish_preview_job,
+)
+from mixtapestudy.ledger import finish_ledger, start_ledger
+from mixtapestudy.metrics import start_metrics_writer
+from mixtapestudy.routes.playlist import generate_playlist_songs
+from mixtapestudy.routes.util import load_user
+
+
+def run_next_job() -> bool:
+    """Run the next queued job, returning False when there wasn't one."""
+    job = claim_preview_job()
+    if not job:
+        return False
+
+    g.logger = logger.bind(user=str(job.user_id)[24:])
+    g.logger.info("Generating preview for job: {}", job.id)
+    start_ledger()
+    try:
+        user = load_user(job.user_id)
+        playlist_songs = generate_playlist_songs(job.selected_songs, user.access_token)
+    except Exception as error:  # noqa: BLE001 (any failure fails the job)
+        # Same short code handle_generic_errors shows, so users can report it
+        error_code = str(uuid4())[24:]
+        error.add_note(f"Error code: {error_code}")
+        g.logger.exception(error)
+        fail_preview_job(job.id, error_code)
+    else:
+        finish_preview_job(job.id, playlist_songs)
+    finally:
+        finish_ledger("preview job")
+    return True
+
+
+def _work(app: Flask, stop: Event) -> None:
+    poll_interval = get_config().preview_worker_poll_interval
+    with app.app_context():
+        while not stop.is_set():
+            g.logger = logger.bind()
+            if not run_next_job():
+                delete_old_preview_jobs()
+                stop.wait(poll_interval)
+
+
+def start_workers(app: Flask, concurrency: int, stop: Event) -> list[Thread]:
+    """Start threads running jobs until stop is set.
+
+    Each claims its own job, claims skip jobs another thread has locked.
+    """
+    threads = [
+        Thread(target=_work, args=(app, stop), name=f"preview-worker-{i}")
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_worker() -> None:
+    app = create_app()
+    config = get_config()
+    if config.metrics_dir:
+        start_metrics_writer(config.metrics_dir, config.metrics_write_interval)
+    concurrency = config.preview_worker_concurrency
+    logger.info("Preview worker started, {} jobs at a time", concurrency)
+    for thread in start_workers(app, concurrency, Event()):
+        thread.join()
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -2,8 +2,10 @@ import subprocess
 from base64 import b64encode
 from collections.abc import Generator
 from datetime import datetime, timezone
+from pathlib import Path
 from uuid import UUID
 
+import numpy as np
 import pytest
 from flask import Flask, g
 from flask.testing import FlaskClient
@@ -15,7 +17,21 @@ from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
 from mixtapestudy.app import create_app
-from mixtapestudy.database import User, get_session
+from mixtapestudy.cache import clear_caches
+from mixtapestudy.database import (
+    CacheEntry,
+    RateLimitBucket,
+    RejectedArtist,
+    TrackResolution,
+    User,
+    get_session,
+)
+from mixtapestudy.feature_store import (
+    FLOAT_COLUMNS,
+    INT8_COLUMNS,
+    write_feature_store,
+)
+from mixtapestudy.features import FEATURES
 
 FAKE_USER_ID = UUID("00000000-0000-4000-0000-000000000000")
 FAKE_LISTENBRAINZ_API_KEY = "00000000-0000-4000-0000-000000000001"
@@ -71,10 +87,20 @@ def stack() -> Generator[None, None, None]:
 
 
 @pytest.fixture(autouse=True)
-def reset_database() -> None:
+def reset_database(set_env: None) -> None:  # noqa: ARG001 (needed for teardown)
     yield
     with get_session() as db_session:
         db_session.execute(delete(User))
+        db_session.execute(delete(TrackResolution))
+        db_session.execute(delete(RejectedArtist))
+        db_session.execute(delete(CacheEntry))
+        db_session.execute(delete(RateLimitBucket))
+
+
+@pytest.fixture(autouse=True)
+def reset_caches() -> None:
+    yield
+    clear_caches()
 
 
 @pytest.fixture
@@ -142,3 +168,71 @@ def mock_token_refresh(requests_mock: Mocker) -> adapter._Matcher:
             "scope": "fake-scope fake-scope",
         },
     )
+
+
+def _write_feature_store(
+    path: str, rows: list[tuple[str, str, str, float, float]]
+) -> str:
+    """Write (spotify_id, name, artist, energy, tempo) rows, other features 0.5."""
+    columns = {column: np.full(len(rows), np.nan) for column in FLOAT_COLUMNS}
+    columns.update({column: np.full(len(rows), -1) for column in INT8_COLUMNS})
+    for feature in FEATURES:
+        columns[feature] = np.full(len(rows), 0.5)
+    spotify_ids, names, artists, columns["energy"], columns["tempo"] = zip(
+        *rows, strict=True
+    )
+    columns.update(
+        spotify_id=spotify_ids,
+        isrc=[""] * len(rows),
+        track_name=names,
+        artist=artists,
+    )
+    write_feature_store(path, columns)
+    return path
+
+
+@pytest.fixture
+def feature_store(tmp_path: Path) -> str:
+    """FEATURE_STORE with selected-song-0 and tracks at known distances from it.
+
+    Tracks differ only in energy and tempo, nearest to selected-song-0 first.
+    """
+    return _write_feature_store(
+        str(tmp_path / "feature_store"),
+        [
+            ("selected-song-0", "selected-name-0", "['selected-artist-0']", 0.1, 100),
+            ("near-song", "near name", "['near artist', 'other artist']", 0.12, 102),
+            # The same song from another dataset
+            (
+                "near-song-again",
+                "Near Name",
+                "['near artist', 'other artist']",
+                0.12,
+                102,
+            ),
+            ("middle-song", "middle name", "middle artist;other artist", 0.5, 140),
+            ("far-song", "far name", "", 0.9, 180),
+            ("no-features-song", "no features name", "['nobody']", np.nan, np.nan),
+        ],
+    )
+
+
+@pytest.fixture
+def radio_feature_store(tmp_path: Path) -> str:
+    """FEATURE_STORE with lb-radio's "song 0" to "song 3", as datasets write them."""
+    return _write_feature_store(
+        str(tmp_path / "radio_feature_store"),
+        [
+            ("local-song-0", "Song 0 - Remastered 2011", "['Artist Name 0']", 0.5, 120),
+            (
+                "local-song-1",
+                "song 1 (feat. someone)",
+                "artist name 1;someone",
+                0.5,
+                120,
+            ),
+            ("local-song-2", "Song 2", "['Ártist Name 2']", 0.5, 120),
+            # Same title, another artist
+            ("local-song-3", "song 3", "['somebody else']", 0.5, 120),
+        ],
+    )
@@ -0,0 +1,47 @@
+import logging
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from mixtapestudy.app import InterceptHandler, configure_logging
+
+
+@pytest.fixture(autouse=True)
+def restore_logging(app: Flask) -> Generator[None, None, None]:  # noqa: ARG001
+    yield
+    logging.getLogger("mixtapestudy.test").setLevel(logging.NOTSET)
+    configure_logging(logging.DEBUG, {})
+
+
+def test_records_below_sink_levels_skip_frame_lookup() -> None:
+    configure_logging(logging.INFO, {"mixtapestudy.test": logging.DEBUG})
+    test_logger = logging.getLogger("mixtapestudy.test")
+
+    with patch.object(InterceptHandler, "emit") as emit:
+        test_logger.debug("Dropped by the handler")
+        logging.getLogger("mixtapestudy.other").debug("Never created")
+        emit.assert_not_called()
+
+        test_logger.info("Logged")
+        emit.assert_called_once()
+
+
+def test_logger_levels_from_config(tmp_path: Path) -> None:
+    log_file = tmp_path / "mixtapestudy.log"
+    configure_logging(
+        logging.DEBUG, {"mixtapestudy.test": logging.WARNING}, str(log_file)
+    )
+
+    test_logger = logging.getLogger("mixtapestudy.test")
+    test_logger.info("Below the logger level")
+    test_logger.warning("At the logger level")
+    logging.getLogger("mixtapestudy.other").debug("Below the file level")
+    configure_logging(logging.DEBUG, {})  # Drains the queued file sink
+
+    log_text = log_file.read_text()
+    assert "At the logger level" in log_text
+    assert "Below the logger level" not in log_text
+    assert "Below the file level" not in log_text
@@ -0,0 +1,177 @@
+from unittest.mock import patch
+
+import pytest
+from freezegun import freeze_time
+from sqlalchemy import text
+
+from mixtapestudy.cache import (
+    CacheStats,
+    LRUCache,
+    PostgresCache,
+    get_cache,
+    get_local_cache,
+)
+from mixtapestudy.config import CacheBackend
+from mixtapestudy.database import get_session
+
+
+def test_postgres_cache_round_trip() -> None:
+    cache = PostgresCache("test", ttl=60, max_entries=10)
+    cache.set("key", {"tracks": ["a", "b"]})
+
+    assert cache.get("key") == {"tracks": ["a", "b"]}
+    assert cache.get("missing-key") is None
+    assert PostgresCache("other", ttl=60, max_entries=10).get("key") is None
+
+
+def test_postgres_cache_many() -> None:
+    cache = PostgresCache("test_many", ttl=60, max_entries=10)
+    cache.set_many({"key-0": 0, "key-1": [1]})
+    cache.set_many({"key-1": 1, "key-2": 2})
+
+    assert cache.get_many(["key-2", "missing-key", "key-0", "key-1"]) == {
+        "key-2": 2,
+        "key-0": 0,
+        "key-1": 1,
+    }
+    assert cache.get_many([]) == {}
+    assert cache.stats() == CacheStats(hits=3, misses=1, evictions=0)
+
+
+def test_postgres_cache_expires() -> None:
+    cache = PostgresCache("test", ttl=60, max_entries=10)
+    cache.set("key", "value")
+    cache.set("long-key", "value", ttl=120)
+
+    with freeze_time("2020-01-01 00:01:01"):
+        assert cache.get("key") is None
+        assert cache.get("long-key") == "value"
+
+
+def test_postgres_cache_evicts_oldest() -> None:
+    cache = PostgresCache("test", ttl=60, max_entries=2)
+    for i in range(3):
+        with freeze_time(f"2020-01-01 00:00:0{i}"):
+            cache.set(f"key-{i}", i)
+
+    assert cache.get("key-0") is None
+    assert cache.get("key-1") == 1
+    assert cache.get("key-2") == 2  # noqa: PLR2004
+
+
+def test_postgres_cache_evicts_least_recently_used() -> None:
+    cache = PostgresCache("test", ttl=600, max_entries=2)
+    cache.set("key-0", 0)
+    with freeze_time("2020-01-01 00:01:00"):
+        cache.set("key-1", 1)
+    with freeze_time("2020-01-01 00:02:00"):
+        cache.get("key-0")
+    with freeze_time("2020-01-01 00:03:00"):
+        cache.set("key-2", 2)
+
+        assert cache.get("key-0") == 0
+        assert cache.get("key-1") is None
+
+
+def test_postgres_cache_hits_not_written() -> None:
+    cache = PostgresCache("test", ttl=600, max_entries=10)
+    cache.set("key", "value")
+
+    def row_version() -> str:
+        with get_session() as db_session:
+            return db_session.execute(
+                text(
+                    "SELECT xmin FROM cache_entry "
+                    "WHERE namespace = 'test' AND key = 'key'"
+                )
+            ).scalar_one()
+
+    version = row_version()
+    # Within TOUCH_INTERVAL of the write, reading doesn't mark it used again
+    with freeze_time("2020-01-01 00:00:30"):
+        assert cache.get("key") == "value"
+        assert cache.get_many(["key"]) == {"key": "value"}
+
+    assert row_version() == version
+
+
+def test_postgres_cache_evicts_only_when_full() -> None:
+    cache = PostgresCache("test_full", ttl=60, max_entries=2)
+    cache.set("key-0", 0)
+    cache.set("key-1", 1)
+    cache.set("key-1", 1)
+    assert cache.stats().evictions == 0
+
+    with freeze_time("2020-01-01 00:00:01"):
+        cache.set("key-2", 2)
+    assert cache.stats().evictions == 1
+
+
+def test_lru_cache_many() -> None:
+    cache = LRUCache("test_lru_many", ttl=60, max_entries=10)
+    cache.set_many({"key-0": 0, "key-1": 1})
+
+    assert cache.get_many(["key-1", "missing-key", "key-0"]) == {
+        "key-1": 1,
+        "key-0": 0,
+    }
+    assert cache.stats() == CacheStats(hits=2, misses=1, evictions=0)
+
+
+def test_lru_cache_round_trip() -> None:
+    cache = LRUCache("test_round_trip", ttl=60, max_entries=10)
+    cache.set("key", ["a", "b"])
+
+    assert cache.get("key") == ["a", "b"]
+    assert cache.get("missing-key") is None
+    assert cache.stats() == CacheStats(hits=1, misses=1, evictions=0)
+    assert cache.stats().hit_ratio == 0.5  # noqa: PLR2004
+
+
+def test_lru_cache_expires() -> None:
+    cache = LRUCache("test_expires", ttl=60, max_entries=10)
+    cache.set("key", "value")
+    cache.set("long-key", "value", ttl=120)
+
+    with freeze_time("2020-01-01 00:01:01"):
+        assert cache.get("key") is None
+        assert cache.get("long-key") == "value"
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache("test_evicts", ttl=60, max_entries=2)
+    cache.set("key-0", 0)
+    cache.set("key-1", 1)
+    cache.get("key-0")
+    cache.set("key-2", 2)
+
+    assert cache.get("key-0") == 0
+    assert cache.get("key-1") is None
+    assert cache.get("key-2") == 2  # noqa: PLR2004
+    assert cache.stats().evictions == 1
+
+
+@pytest.mark.parametrize(
+    ("cache_backend", "cache_class"),
+    [(CacheBackend.POSTGRES, PostgresCache), (CacheBackend.MEMORY, LRUCache)],
+)
+def test_get_cache_backend(cache_backend: CacheBackend, cache_class: type) -> None:
+    with patch("mixtapestudy.cache.get_config") as fake_get_config:
+        fake_get_config.return_value.cache_backend = cache_backend
+        cache = get_cache(f"test_{cache_backend}", ttl=60, max_entries=10)
+
+    assert isinstance(cache, cache_class)
+    assert get_cache(f"test_{cache_backend}", ttl=60, max_entries=10) is cache
+
+    cache.set("key", [{"name": "song"}])
+    assert cache.get("key") == [{"name": "song"}]
+
+
+def test_local_cache_separate_from_shared() -> None:
+    with patch("mixtapestudy.cache.get_config") as fake_get_config:
+        fake_get_config.return_value.cache_backend = CacheBackend.POSTGRES
+        shared = get_cache("test_separate", ttl=60, max_entries=10)
+
+    local = get_local_cache("test_separate", ttl=60, max_entries=10)
+    assert isinstance(shared, PostgresCache)
+    assert isinstance(local, LRUCache)
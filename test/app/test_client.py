@@ -0,0 +1,84 @@
+from unittest.mock import patch
+
+from freezegun import freeze_time
+from requests_mock import Mocker
+
+from mixtapestudy.client import (
+    UPSTREAM_DURATION,
+    UPSTREAM_REQUESTS_IN_FLIGHT,
+    HttpClient,
+    PoolStats,
+    get_http_client,
+)
+from mixtapestudy.config import SPOTIFY_BASE_URL, USER_AGENT
+from mixtapestudy.rate_limit import RateLimiter
+from test.app.conftest import FAKE_ACCESS_TOKEN
+
+
+def test_default_headers(requests_mock: Mocker) -> None:
+    mock_me = requests_mock.get(f"{SPOTIFY_BASE_URL}/me", json={})
+
+    get_http_client().get(f"{SPOTIFY_BASE_URL}/me", access_token=FAKE_ACCESS_TOKEN)
+
+    assert mock_me.last_request.headers["User-Agent"] == USER_AGENT
+    assert mock_me.last_request.headers["Authorization"] == (
+        f"Bearer {FAKE_ACCESS_TOKEN}"
+    )
+
+
+def test_upstream_metrics(requests_mock: Mocker) -> None:
+    requests_mock.get(f"{SPOTIFY_BASE_URL}/search", json={})
+    labels = (("endpoint", "search"), ("upstream", "api.spotify.com"))
+    before = UPSTREAM_DURATION.samples().get(labels, [0] * 14)
+
+    HttpClient(pool_connections=1, pool_maxsize=1).get(
+        f"{SPOTIFY_BASE_URL}/search", endpoint="search"
+    )
+
+    after = UPSTREAM_DURATION.samples()[labels]
+    assert sum(after[:-1]) == sum(before[:-1]) + 1
+    assert (
+        UPSTREAM_REQUESTS_IN_FLIGHT.samples()[(("upstream", "api.spotify.com"),)] == 0
+    )
+
+
+def test_client_reused_within_process() -> None:
+    assert get_http_client() is get_http_client()
+
+
+def test_client_rebuilt_after_fork() -> None:
+    client = get_http_client()
+    with patch("mixtapestudy.client.os.getpid", return_value=-1):
+        assert get_http_client() is not client
+
+
+def test_pool_stats_empty() -> None:
+    client = HttpClient(pool_connections=1, pool_maxsize=1)
+    assert client.pool_stats() == PoolStats(hits=0, misses=0)
+
+
+def test_retry_after_429(requests_mock: Mocker) -> None:
+    mock_me = requests_mock.get(
+        f"{SPOTIFY_BASE_URL}/me",
+        [
+            {"status_code": 429, "headers": {"Retry-After": "2"}},
+            {"status_code": 200, "json": {"id": "fake-spotify-id"}},
+        ],
+    )
+    client = HttpClient(
+        pool_connections=1,
+        pool_maxsize=1,
+        rate_limits={
+            SPOTIFY_BASE_URL: RateLimiter("test", rate=10, burst=10, max_wait=5)
+        },
+        max_retries=1,
+    )
+
+    with (
+        freeze_time("2020-01-01") as frozen_time,
+        patch("mixtapestudy.rate_limit.time.sleep", side_effect=frozen_time.tick),
+    ):
+        response = client.get(f"{SPOTIFY_BASE_URL}/me")
+
+    assert response.json() == {"id": "fake-spotify-id"}
+    assert mock_me.call_count == 2  # noqa: PLR2004
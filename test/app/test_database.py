@@ -0,0 +1,77 @@
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+from mixtapestudy import database
+from mixtapestudy.config import Config
+from mixtapestudy.database import (
+    DATABASE_CHECKOUTS,
+    DATABASE_POOL_CHECKED_OUT,
+    DATABASE_POOL_OVERFLOWS,
+    create_database_engine,
+    get_engine,
+    get_session,
+)
+
+
+def test_pool_configured_from_env(
+    app: Flask,  # noqa: ARG001
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "2")
+    monkeypatch.setenv("DATABASE_MAX_OVERFLOW", "1")
+    monkeypatch.setenv("DATABASE_POOL_TIMEOUT", "0")
+    engine = create_database_engine(Config())
+
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 2  # noqa: PLR2004
+
+    overflows = DATABASE_POOL_OVERFLOWS.value
+    connections = [engine.connect() for _ in range(3)]
+    assert DATABASE_POOL_CHECKED_OUT.value == 3  # noqa: PLR2004
+    assert DATABASE_POOL_OVERFLOWS.value == overflows + 1
+
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    for connection in connections:
+        connection.close()
+    assert DATABASE_POOL_CHECKED_OUT.value == 0
+    engine.dispose()
+
+
+def test_pgbouncer_mode_leaves_pooling_to_pgbouncer(
+    app: Flask,  # noqa: ARG001
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("DATABASE_POOL_MODE", "pgbouncer")
+    engine = create_database_engine(Config())
+
+    assert isinstance(engine.pool, NullPool)
+    checkouts = DATABASE_CHECKOUTS.value
+    with engine.connect() as connection:
+        assert connection.scalar(text("SELECT 1")) == 1
+    assert DATABASE_CHECKOUTS.value == checkouts + 1
+    engine.dispose()
+
+
+def test_engine_reset_after_fork() -> None:
+    engine = get_engine()
+    with get_session() as db_session:
+        db_session.execute(text("SELECT 1"))
+    inherited_pool = engine.pool
+
+    with patch("mixtapestudy.database.os.getpid", return_value=-1):
+        assert get_engine() is engine
+        assert engine.pool is not inherited_pool
+        assert database._database_engine_pid == -1  # noqa: SLF001
+
+        with get_session() as db_session:
+            assert db_session.scalar(text("SELECT 1")) == 1
+
+    # Back in the "parent", which also starts over with a fresh pool
+    assert get_engine() is engine
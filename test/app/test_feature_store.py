@@ -0,0 +1,35 @@
+import numpy as np
+
+from mixtapestudy.feature_store import FeatureStore
+from mixtapestudy.features import FEATURES
+
+
+def test_feature_store_memory_mapped(feature_store: str) -> None:
+    store = FeatureStore.open(feature_store)
+
+    assert len(store) == 6  # noqa: PLR2004
+    assert isinstance(store.columns["tempo"], np.memmap)
+    assert store.columns["tempo"].dtype == np.float32
+    assert store.columns["key"].dtype == np.int8
+    assert store.id("spotify_id", 3) == "middle-song"
+    assert store.text("artist", 3) == "middle artist;other artist"
+    assert store.text("artist", 4) == ""
+
+
+def test_feature_store_find(feature_store: str) -> None:
+    store = FeatureStore.open(feature_store)
+
+    rows = store.find(
+        "spotify_id",
+        ["far-song", "unknown", "selected-song-0", "", "selected-song-0-but-longer"],
+    )
+
+    assert sorted(rows) == [0, 4]
+    assert not len(store.find("isrc", ["USRC17607839"]))
+
+
+def test_feature_store_complete(feature_store: str) -> None:
+    store = FeatureStore.open(feature_store)
+
+    np.testing.assert_array_equal(store.complete(FEATURES), [0, 1, 2, 3, 4])
+    np.testing.assert_array_equal(store.complete(FEATURES, np.array([5, 1])), [1])
@@ -0,0 +1,150 @@
+from collections.abc import Generator
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from flask.testing import FlaskClient
+
+from mixtapestudy.build_feature_index import build_feature_index
+from mixtapestudy.features import (
+    FeatureIndex,
+    FeatureMatrix,
+    get_feature_matrix,
+    get_feature_recommendations,
+)
+from mixtapestudy.models import Song
+
+
+@pytest.fixture
+def features_config(feature_store: str) -> Generator[MagicMock, None, None]:
+    with patch("mixtapestudy.features.get_config") as fake_get_config:
+        fake_get_config.return_value.feature_store = feature_store
+        fake_get_config.return_value.feature_index = ""
+        yield fake_get_config.return_value
+
+
+def test_feature_matrix_scaled() -> None:
+    feature_matrix = FeatureMatrix.from_features(
+        np.array([1, 2, 3]), np.array([[0.0, 100.0], [0.5, 150.0], [1.0, 200.0]])
+    )
+
+    # Tempo counts no more than a feature between 0 and 1
+    np.testing.assert_allclose(
+        feature_matrix.vectors[:, 0], feature_matrix.vectors[:, 1]
+    )
+    np.testing.assert_allclose(
+        feature_matrix.distances(feature_matrix.scale(np.array([[0.0, 100.0]]))),
+        [0, 3, 12],
+        atol=1e-6,
+    )
+
+
+def test_feature_matrix_skips_incomplete_rows(feature_store: str) -> None:
+    feature_matrix = get_feature_matrix(feature_store)
+
+    assert len(feature_matrix.rows) == 5  # noqa: PLR2004
+
+
+def test_recommendations_nearest_first(
+    client_without_session: FlaskClient,  # noqa: ARG001
+    features_config: MagicMock,  # noqa: ARG001
+) -> None:
+    songs = get_feature_recommendations(["selected-song-0", "unknown-song"], limit=10)
+
+    # Without the seed itself or the near song a second time
+    assert songs == [
+        Song(
+            uri="spotify:track:near-song",
+            id="near-song",
+            name="near name",
+            artist="near artist, other artist",
+            artist_raw=["near artist", "other artist"],
+        ),
+        Song(
+            uri="spotify:track:middle-song",
+            id="middle-song",
+            name="middle name",
+            artist="middle artist, other artist",
+            artist_raw=["middle artist", "other artist"],
+        ),
+        Song(
+            uri="spotify:track:far-song",
+            id="far-song",
+            name="far name",
+            artist="",
+            artist_raw=[],
+        ),
+    ]
+
+
+def test_recommendations_limited(
+    client_without_session: FlaskClient,  # noqa: ARG001
+    features_config: MagicMock,  # noqa: ARG001
+) -> None:
+    songs = get_feature_recommendations(["selected-song-0"], limit=1)
+
+    assert [song.id for song in songs] == ["near-song"]
+
+
+def test_recommendations_without_known_seeds(
+    client_without_session: FlaskClient,  # noqa: ARG001
+    features_config: MagicMock,  # noqa: ARG001
+) -> None:
+    assert get_feature_recommendations(["unknown-song"], limit=10) == []
+
+
+def _clustered_feature_matrix() -> FeatureMatrix:
+    rng = np.random.default_rng(0)
+    centers = rng.random((20, 9))
+    features = centers[rng.integers(0, 20, 2000)] + rng.normal(0, 0.02, (2000, 9))
+    return FeatureMatrix.from_features(np.arange(2000), features)
+
+
+def test_feature_index_partitions(tmp_path: Path) -> None:
+    feature_matrix = _clustered_feature_matrix()
+    build_feature_index(feature_matrix, partitions=20).save(str(tmp_path))
+    feature_index = FeatureIndex.open(str(tmp_path), probes=1)
+
+    assert isinstance(feature_index.vectors, np.memmap)
+    assert feature_index.offsets[-1] == len(feature_matrix.vectors)
+    assert sorted(feature_index.rows) == list(feature_matrix.rows)
+    # Every vector is in the partition of its nearest centroid
+    for partition in range(20):
+        start, end = feature_index.offsets[partition : partition + 2]
+        np.testing.assert_array_equal(
+            feature_index.probed_partitions(feature_index.vectors[start:end]),
+            [partition] if end > start else [],
+        )
+
+
+def test_feature_index_matches_exact_search(tmp_path: Path) -> None:
+    feature_matrix = _clustered_feature_matrix()
+    build_feature_index(feature_matrix, partitions=20).save(str(tmp_path))
+    seed_vectors = feature_matrix.vectors[[0, 1, 2]]
+
+    exact_rows, exact_distances = feature_matrix.nearest(seed_vectors, 50, [0, 1, 2])
+    # Probing every partition searches every vector
+    rows, distances = FeatureIndex.open(str(tmp_path), probes=20).nearest(
+        seed_vectors, 50, [0, 1, 2]
+    )
+
+    assert set(rows) == set(exact_rows)
+    np.testing.assert_allclose(distances, exact_distances, atol=1e-5)
+    assert not {0, 1, 2} & set(rows)
+
+
+def test_recommendations_from_feature_index(
+    client_without_session: FlaskClient,  # noqa: ARG001
+    features_config: MagicMock,
+    feature_store: str,
+    tmp_path: Path,
+) -> None:
+    index_dir = str(tmp_path / "index")
+    build_feature_index(get_feature_matrix(feature_store), partitions=2).save(index_dir)
+    features_config.feature_index = index_dir
+    features_config.feature_index_probes = 2
+
+    songs = get_feature_recommendations(["selected-song-0"], limit=10)
+
+    assert [song.id for song in songs] == ["near-song", "middle-song", "far-song"]
@@ -0,0 +1,116 @@
+from collections.abc import Generator
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask, g
+from freezegun import freeze_time
+from requests_mock import Mocker
+
+from mixtapestudy.client import HttpClient
+from mixtapestudy.config import SPOTIFY_BASE_URL
+from mixtapestudy.ledger import (
+    UPSTREAM_BUDGET_EXCEEDED,
+    CallLedger,
+    UpstreamCall,
+    current_ledger,
+    finish_ledger,
+    start_ledger,
+)
+from mixtapestudy.rate_limit import RateLimiter
+
+
+@pytest.fixture
+def fake_logger(app: Flask) -> Generator[MagicMock, None, None]:
+    with app.app_context():
+        g.logger = MagicMock()
+        yield g.logger
+
+
+@pytest.fixture
+def budget_config() -> Generator[MagicMock, None, None]:
+    with patch("mixtapestudy.ledger.get_config") as fake_get_config:
+        fake_config = fake_get_config.return_value
+        fake_config.upstream_call_budget = 2
+        fake_config.upstream_time_budget = 1
+        yield fake_config
+
+
+def test_ledger_summary() -> None:
+    ledger = CallLedger()
+    ledger.record(UpstreamCall("api.listenbrainz.org", "lb-radio", 400, 0.5))
+    ledger.record(
+        UpstreamCall("api.listenbrainz.org", "lb-radio", 200, 0.25, "rejected artist")
+    )
+    ledger.record(UpstreamCall("api.spotify.com", "search", None, 0.125))
+
+    assert ledger.summary() == (
+        "3 calls, 0.88s"
+        " | api.listenbrainz.org lb-radio: 2 calls, 0.75s, 400 x1 200 x1"
+        " | api.spotify.com search: 1 calls, 0.12s, no response x1"
+        " | retries: rejected artist x1"
+    )
+
+
+def test_client_records_retries(requests_mock: Mocker) -> None:
+    requests_mock.get(
+        f"{SPOTIFY_BASE_URL}/me",
+        [{"status_code": 429, "headers": {"Retry-After": "1"}}, {"json": {}}],
+    )
+    client = HttpClient(
+        pool_connections=1,
+        pool_maxsize=1,
+        rate_limits={
+            SPOTIFY_BASE_URL: RateLimiter("test", rate=10, burst=10, max_wait=5)
+        },
+        max_retries=1,
+    )
+
+    start_ledger()
+    with (
+        freeze_time("2020-01-01") as frozen_time,
+        patch("mixtapestudy.rate_limit.time.sleep", side_effect=frozen_time.tick),
+    ):
+        client.get(f"{SPOTIFY_BASE_URL}/me", endpoint="me")
+
+    calls = current_ledger().calls
+    assert [(call.endpoint, call.status, call.retry_reason) for call in calls] == [
+        ("me", 429, None),
+        ("me", 200, "429"),
+    ]
+
+
+def test_finish_ledger_within_budget(
+    fake_logger: MagicMock,
+    budget_config: MagicMock,  # noqa: ARG001
+) -> None:
+    start_ledger()
+    current_ledger().record(UpstreamCall("api.spotify.com", "search", 200, 0.5))
+    finish_ledger("search.get_search_page")
+
+    fake_logger.info.assert_called_once()
+    fake_logger.warning.assert_not_called()
+    assert current_ledger() is None
+
+
+@pytest.mark.parametrize(
+    ("durations", "reason"),
+    [([0.1, 0.1, 0.1], "3 calls > 2"), ([1.5], "1.50s > 1s")],
+)
+def test_finish_ledger_over_budget(
+    fake_logger: MagicMock,
+    budget_config: MagicMock,  # noqa: ARG001
+    durations: list[float],
+    reason: str,
+) -> None:
+    exceeded = UPSTREAM_BUDGET_EXCEEDED.value
+    start_ledger()
+    for duration in durations:
+        current_ledger().record(
+            UpstreamCall("api.spotify.com", "search", 200, duration)
+        )
+    finish_ledger("playlist.generate_playlist")
+
+    fake_logger.warning.assert_called_once_with(
+        "{} over upstream budget: {}", "playlist.generate_playlist", reason
+    )
+    assert UPSTREAM_BUDGET_EXCEEDED.value == exceeded + 1
@@ -0,0 +1,172 @@
+import json
+import os
+import socket
+import subprocess
+import time
+from pathlib import Path
+
+import pytest
+from freezegun import freeze_time
+
+from mixtapestudy import metrics
+from mixtapestudy.metrics import (
+    clear_metrics_dir,
+    counter,
+    gauge,
+    histogram,
+    render_metrics,
+    write_metrics,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(metrics, "_metrics", {})
+
+
+def _export_path(
+    metrics_dir: Path, host: str | None = None, pid: int | None = None
+) -> Path:
+    return metrics_dir / f"{host or socket.gethostname()}-{pid or os.getpid()}.json"
+
+
+def _finished_pid() -> int:
+    process = subprocess.Popen(["true"])  # noqa: S607
+    process.wait()
+    return process.pid
+
+
+def test_render_exposition_format() -> None:
+    counter("searches", "Searches").increment(3)
+    gauge("in_flight", "In flight").set(2, upstream='api."spotify".com')
+    duration = histogram("duration_seconds", "Duration")
+    duration.observe(0.003, route="search.get_search_page")
+    duration.observe(0.2, route="search.get_search_page")
+    duration.observe(60, route="search.get_search_page")
+
+    assert render_metrics("").splitlines() == [
+        "# HELP mixtapestudy_duration_seconds Duration",
+        "# TYPE mixtapestudy_duration_seconds histogram",
+        *[
+            'mixtapestudy_duration_seconds_bucket{route="search.get_search_page",'
+            f'le="{le}"}} {count}'
+            for le, count in [
+                ("0.005", 1),
+                ("0.01", 1),
+                ("0.025", 1),
+                ("0.05", 1),
+                ("0.1", 1),
+                ("0.25", 2),
+                ("0.5", 2),
+                ("1", 2),
+                ("2.5", 2),
+                ("5", 2),
+                ("10", 2),
+                ("30", 2),
+                ("+Inf", 3),
+            ]
+        ],
+        'mixtapestudy_duration_seconds_sum{route="search.get_search_page"} 60.203',
+        'mixtapestudy_duration_seconds_count{route="search.get_search_page"} 3',
+        "# HELP mixtapestudy_in_flight In flight",
+        "# TYPE mixtapestudy_in_flight gauge",
+        'mixtapestudy_in_flight{upstream="api.\\"spotify\\".com"} 2',
+        "# HELP mixtapestudy_searches_total Searches",
+        "# TYPE mixtapestudy_searches_total counter",
+        "mixtapestudy_searches_total 3",
+    ]
+
+
+def test_aggregate_across_workers(tmp_path: Path) -> None:
+    searches = counter("searches", "Searches")
+    in_flight = gauge("in_flight", "In flight")
+    tokens = gauge("tokens", "Tokens", aggregate="max")
+    duration = histogram("duration_seconds", "Duration")
+
+    # Another worker, still running
+    searches.increment(2)
+    in_flight.set(1)
+    tokens.set(5)
+    duration.observe(0.3)
+    write_metrics(str(tmp_path))
+    _export_path(tmp_path).rename(_export_path(tmp_path, pid=os.getppid()))
+
+    # A worker that has exited, its gauges went with it
+    write_metrics(str(tmp_path))
+    _export_path(tmp_path).rename(_export_path(tmp_path, pid=_finished_pid()))
+
+    # This worker
+    searches.increment(1)
+    in_flight.set(4)
+    tokens.set(3)
+    duration.observe(0.02)
+
+    rendered = render_metrics(str(tmp_path)).splitlines()
+    assert "mixtapestudy_searches_total 7" in rendered
+    assert "mixtapestudy_in_flight 5" in rendered
+    assert "mixtapestudy_tokens 5" in rendered
+    assert 'mixtapestudy_duration_seconds_bucket{le="0.025"} 1' in rendered
+    assert 'mixtapestudy_duration_seconds_bucket{le="0.5"} 4' in rendered
+    assert "mixtapestudy_duration_seconds_count 4" in rendered
+
+
+def test_latest_gauge_across_workers(tmp_path: Path) -> None:
+    tokens = gauge("tokens", "Tokens", aggregate="latest")
+
+    # Another worker read the shared level a while ago, before it was used up
+    with freeze_time("2020-01-01 00:00:00"):
+        tokens.set(50)
+        write_metrics(str(tmp_path))
+    _export_path(tmp_path).rename(_export_path(tmp_path, pid=os.getppid()))
+
+    with freeze_time("2020-01-01 00:00:05"):
+        tokens.set(3)
+
+    assert "mixtapestudy_tokens 3" in render_metrics(str(tmp_path)).splitlines()
+
+
+def test_write_metrics_replaces_file(tmp_path: Path) -> None:
+    searches = counter("searches", "Searches")
+    write_metrics(str(tmp_path))
+    searches.increment()
+    write_metrics(str(tmp_path))
+
+    written = json.loads(_export_path(tmp_path).read_text())
+    assert written["searches"]["samples"] == [[{}, 1]]
+    assert list(tmp_path.iterdir()) == [_export_path(tmp_path)]
+
+
+def test_aggregate_across_hosts(tmp_path: Path) -> None:
+    searches = counter("searches", "Searches")
+    in_flight = gauge("in_flight", "In flight")
+
+    # A process in another container, its PID means nothing here
+    searches.increment(2)
+    in_flight.set(1)
+    write_metrics(str(tmp_path))
+    _export_path(tmp_path).rename(_export_path(tmp_path, "preview-worker", 1))
+    os.utime(_export_path(tmp_path, "preview-worker", 1), (time.time(), time.time()))
+
+    # One in a container that stopped writing a while ago
+    write_metrics(str(tmp_path))
+    stale_path = _export_path(tmp_path, "token-refresher", 1)
+    _export_path(tmp_path).rename(stale_path)
+    os.utime(stale_path, (0, 0))
+
+    # This worker
+    searches.increment(1)
+    in_flight.set(4)
+
+    rendered = render_metrics(str(tmp_path)).splitlines()
+    assert "mixtapestudy_searches_total 7" in rendered
+    assert "mixtapestudy_in_flight 5" in rendered
+
+
+def test_clear_metrics_dir_keeps_other_hosts(tmp_path: Path) -> None:
+    write_metrics(str(tmp_path))
+    _export_path(tmp_path).rename(_export_path(tmp_path, "preview-worker", 1))
+    write_metrics(str(tmp_path))
+
+    clear_metrics_dir(str(tmp_path))
+
+    assert list(tmp_path.iterdir()) == [_export_path(tmp_path, "preview-worker", 1)]
@@ -1,20 +1,88 @@
 import json
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
 from http import HTTPStatus
-from unittest.mock import patch
+from pathlib import Path
+from threading import Event, Lock
+from unittest.mock import MagicMock, patch
 from urllib.parse import urlencode
+from uuid import UUID, uuid4
 
 import pytest
 from bs4 import BeautifulSoup
 from flask.testing import FlaskClient
+from loguru import logger
 from requests_mock import Mocker, adapter
+from requests_mock.request import _RequestObjectProxy
+from requests_mock.response import _Context as Context
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
 from werkzeug.test import TestResponse
 
-from mixtapestudy.config import SPOTIFY_BASE_URL, RecommendationService
-from test.app.conftest import FAKE_ACCESS_TOKEN, FAKE_LISTENBRAINZ_API_KEY
+from mixtapestudy.build_track_match_index import build_track_match_index
+from mixtapestudy.config import SPOTIFY_BASE_URL, PreviewMode, RecommendationService
+from mixtapestudy.database import (
+    CacheEntry,
+    RejectedArtist,
+    TrackResolution,
+    get_session,
+)
+from mixtapestudy.feature_store import FeatureStore
+from mixtapestudy.jobs import enqueue_preview_job, get_preview_job
+from mixtapestudy.models import JobStatus, MatchTier
+from mixtapestudy.routes.playlist import (
+    LOCAL_MATCHES,
+    LOCAL_MISSES,
+    RADIO_RETRIES_AVOIDED,
+)
+from mixtapestudy.worker import run_next_job, start_workers
+from test.app.conftest import (
+    FAKE_ACCESS_TOKEN,
+    FAKE_LISTENBRAINZ_API_KEY,
+    FAKE_USER_ID,
+)
 
 # TODO: Tests for edge cases
 
 
+@pytest.fixture
+def listenbrainz_config() -> Generator[MagicMock, None, None]:
+    with patch("mixtapestudy.routes.playlist.get_config") as fake_get_config:
+        fake_config = fake_get_config.return_value
+        fake_config.recommendation_service = RecommendationService.LISTENBRAINZ
+        fake_config.listenbrainz_api_key = FAKE_LISTENBRAINZ_API_KEY
+        fake_config.radio_search_concurrency = 8
+        fake_config.radio_cache_ttl = 3600
+        fake_config.radio_cache_max_entries = 100
+        fake_config.track_match_index = ""
+        fake_config.preview_mode = PreviewMode.SYNC
+        yield fake_config
+
+
+@pytest.fixture(autouse=True)
+def mock_tracks_request(requests_mock: Mocker) -> adapter._Matcher:
+    def tracks_json(request: _RequestObjectProxy, _: Context) -> dict:
+        # selected-song-0 -> selected-name-0 by selected-artist-0
+        return {
+            "tracks": [
+                {
+                    "uri": f"spotify:track:{track_id}",
+                    "id": track_id,
+                    "name": track_id.replace("-song-", "-name-"),
+                    "artists": [{"name": track_id.replace("-song-", "-artist-")}],
+                }
+                for track_id in request.qs["ids"][0].split(",")
+            ]
+        }
+
+    return requests_mock.get(
+        f"{SPOTIFY_BASE_URL}/tracks",
+        request_headers={"Authorization": f"Bearer {FAKE_ACCESS_TOKEN}"},
+        json=tracks_json,
+    )
+
+
 @pytest.fixture
 def mock_recommendation_request(requests_mock: Mocker) -> adapter._Matcher:
     params = urlencode(
@@ -180,6 +248,7 @@ def test_load_without_session(client_without_session: FlaskClient) -> None:
 def test_load_page_recommendation_service_spotify(
     client: FlaskClient,
     mock_recommendation_request: adapter._Matcher,
+    mock_tracks_request: adapter._Matcher,
 ) -> None:
     with client.session_transaction() as tsession:
         tsession["selected_songs"] = [
@@ -196,6 +265,8 @@ def test_load_page_recommendation_service_spotify(
     playlist_page_response = client.post("/playlist/preview")
 
     assert mock_recommendation_request.called
+    # The session already has everything about the seeds
+    assert not mock_tracks_request.called
 
     soup = BeautifulSoup(playlist_page_response.text, "html.parser")
     table_rows = soup.find_all("tr")
@@ -224,6 +295,114 @@ def test_load_page_recommendation_service_spotify(
     assert not soup.find(id="error-header")
 
 
+def test_load_page_incomplete_seeds_looked_up(
+    client: FlaskClient,
+    mock_recommendation_request: adapter._Matcher,
+    mock_tracks_request: adapter._Matcher,
+) -> None:
+    with client.session_transaction() as tsession:
+        tsession["selected_songs"] = [
+            {
+                "uri": f"spotify:track:selected-song-{i}",
+                "id": f"selected-song-{i}",
+                "name": f"selected-name-{i}",
+                "artist": f"selected-artist-{i}",
+                "artist_raw": f'["selected-artist-{i}"]',
+            }
+            for i in range(2)
+        ] + [{"id": "selected-song-2", "name": None}]
+
+    playlist_page_response = client.post("/playlist/preview")
+
+    assert mock_recommendation_request.called
+    assert mock_tracks_request.call_count == 1
+    assert mock_tracks_request.last_request.qs["ids"] == ["selected-song-2"]
+
+    soup = BeautifulSoup(playlist_page_response.text, "html.parser")
+    table_rows = soup.find_all("tr")
+    assert [c.string for c in table_rows[3].find_all("td")] == [
+        "selected-name-2",
+        "selected-artist-2",
+    ]
+
+
+def test_load_page_recommendation_service_spotify_cached(
+    client: FlaskClient,
+    mock_recommendation_request: adapter._Matcher,
+) -> None:
+    selected_songs = [
+        {
+            "uri": f"spotify:track:selected-song-{i}",
+            "id": f"selected-song-{i}",
+            "name": f"selected-name-{i}",
+            "artist": f"selected-artist-{i}",
+            "artist_raw": f'["selected-artist-{i}"]',
+        }
+        for i in range(3)
+    ]
+    with client.session_transaction() as tsession:
+        tsession["selected_songs"] = selected_songs
+    client.post("/playlist/preview")
+
+    # The same seeds in a different order are served from the cache
+    with client.session_transaction() as tsession:
+        tsession["selected_songs"] = list(reversed(selected_songs))
+    playlist_page_response = client.post("/playlist/preview")
+
+    assert mock_recommendation_request.call_count == 1
+
+    soup = BeautifulSoup(playlist_page_response.text, "html.parser")
+    table_rows = soup.find_all("tr")
+    assert len(table_rows) == 75 + 1
+    assert [c.string for c in table_rows[1].find_all("td")] == [
+        "selected-name-2",
+        "selected-artist-2",
+    ]
+    assert [c.string for c in table_rows[-1].find_all("td")] == [
+        "name-71",
+        "artist-71-0, artist-71-1, artist-71-2",
+    ]
+
+
+def test_load_page_recommendation_service_local(
+    client: FlaskClient, feature_store: str
+) -> None:
+    with (
+        patch("mixtapestudy.routes.playlist.get_config") as fake_get_config,
+        patch("mixtapestudy.features.get_config", fake_get_config),
+    ):
+        fake_config = fake_get_config.return_value
+        fake_config.recommendation_service = RecommendationService.LOCAL
+        fake_config.feature_store = feature_store
+        fake_config.feature_index = ""
+        fake_config.preview_mode = PreviewMode.SYNC
+        with client.session_transaction() as tsession:
+            tsession["selected_songs"] = [
+                {
+                    "uri": f"spotify:track:selected-song-{i}",
+                    "id": f"selected-song-{i}",
+                    "name": f"selected-name-{i}",
+                    "artist": f"selected-artist-{i}",
+                    "artist_raw": f'["selected-artist-{i}"]',
+                }
+                for i in range(3)
+            ]
+
+        playlist_page_response = client.post("/playlist/preview")
+
+    # Recommended from the FEATURE_STORE without asking Spotify
+    soup = BeautifulSoup(playlist_page_response.text, "html.parser")
+    table_rows = soup.find_all("tr")[1:]  # Without the header
+    assert [[c.string for c in row.find_all("td")] for row in table_rows] == [
+        ["selected-name-0", "selected-artist-0"],
+        ["selected-name-1", "selected-artist-1"],
+        ["selected-name-2", "selected-artist-2"],
+        ["near name", "near artist, other artist"],
+        ["middle name", "middle artist, other artist"],
+        ["far name", None],
+    ]
+
+
 def _validate_playlist_page(
     mock_spotify_search: adapter._Matcher,
     playlist_page_response: TestResponse,
@@ -259,6 +438,7 @@ def _validate_playlist_page(
 
 def test_load_page_recommendation_service_listenbrainz(
     client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
     mock_listenbrainz_radio_request: adapter._Matcher,
     mock_spotify_search: list[adapter._Matcher],
 ) -> None:
@@ -274,12 +454,7 @@ def test_load_page_recommendation_service_listenbrainz(
             for i in range(3)
         ]
 
-    with patch("mixtapestudy.routes.playlist.get_config") as fake_get_config:
-        fake_get_config.return_value.recommendation_service = (
-            RecommendationService.LISTENBRAINZ
-        )
-        fake_get_config.return_value.listenbrainz_api_key = FAKE_LISTENBRAINZ_API_KEY
-        playlist_page_response = client.post("/playlist/preview")
+    playlist_page_response = client.post("/playlist/preview")
 
     assert mock_listenbrainz_radio_request.called
 
@@ -288,6 +463,7 @@ def test_load_page_recommendation_service_listenbrainz(
 
 def test_load_page_recommendation_service_listenbrainz_bad_artist(
     client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
     mock_listenbrainz_radio_request: adapter._Matcher,
     mock_listenbrainz_radio_requests_bad_artists: list[adapter._Matcher],
     mock_spotify_search: list[adapter._Matcher],
@@ -310,12 +486,7 @@ def test_load_page_recommendation_service_listenbrainz_bad_artist(
             for i in range(3)
         ]
 
-    with patch("mixtapestudy.routes.playlist.get_config") as fake_get_config:
-        fake_get_config.return_value.recommendation_service = (
-            RecommendationService.LISTENBRAINZ
-        )
-        fake_get_config.return_value.listenbrainz_api_key = FAKE_LISTENBRAINZ_API_KEY
-        playlist_page_response = client.post("/playlist/preview")
+    playlist_page_response = client.post("/playlist/preview")
 
     assert mock_listenbrainz_radio_request.called
     for mock in mock_listenbrainz_radio_requests_bad_artists:
@@ -324,6 +495,90 @@ def test_load_page_recommendation_service_listenbrainz_bad_artist(
     _validate_playlist_page(mock_spotify_search, playlist_page_response)
 
 
+def test_preview_upstream_calls_logged(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    mock_spotify_search: list[adapter._Matcher],  # noqa: ARG001
+) -> None:
+    messages = []
+    sink_id = logger.add(messages.append, level="INFO", format="{message}")
+    try:
+        _post_listenbrainz_preview(client)
+    finally:
+        logger.remove(sink_id)
+
+    # Searches made on the executor's threads are counted too
+    [summary] = [m for m in messages if m.startswith("Upstream calls for")]
+    assert summary.startswith("Upstream calls for playlist.generate_playlist: 49 calls")
+    assert "api.listenbrainz.org lb-radio: 1 calls" in summary
+    assert "api.spotify.com search: 48 calls" in summary
+    assert "retries: no strict match x16" in summary
+
+
+def test_concurrent_previews_not_rate_limited(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    mock_spotify_search: list[adapter._Matcher],  # noqa: ARG001
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # Spotify's rate limit as configured by default, not one from another test
+    monkeypatch.setattr("mixtapestudy.client._http_client", None)
+
+    def preview() -> int:
+        preview_client = client.application.test_client()
+        with preview_client.session_transaction() as tsession:
+            tsession["id"] = FAKE_USER_ID
+            tsession["spotify_id"] = "fake-spotify-id"
+        return _post_listenbrainz_preview(preview_client).status_code
+
+    # Each one cold, so ~48 searches
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        status_codes = [executor.submit(preview) for _ in range(3)]
+
+    assert [future.result() for future in status_codes] == [HTTPStatus.OK] * 3
+
+
+def test_listenbrainz_tracks_matched_locally(  # noqa: PLR0913
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    mock_spotify_search: list[adapter._Matcher],  # noqa: ARG001
+    radio_feature_store: str,
+    tmp_path: Path,
+) -> None:
+    index_dir = str(tmp_path / "track_match_index")
+    build_track_match_index(FeatureStore.open(radio_feature_store)).save(index_dir)
+    listenbrainz_config.feature_store = radio_feature_store
+    listenbrainz_config.track_match_index = index_dir
+    local_matches = LOCAL_MATCHES.value
+    local_misses = LOCAL_MISSES.value
+
+    messages = []
+    sink_id = logger.add(messages.append, level="INFO", format="{message}")
+    try:
+        playlist_page_response = _post_listenbrainz_preview(client)
+    finally:
+        logger.remove(sink_id)
+
+    # song 0 to song 2 aren't searched for, song 3 by another artist still is
+    [summary] = [m for m in messages if m.startswith("Upstream calls for")]
+    assert "api.spotify.com search: 43 calls" in summary
+    assert LOCAL_MATCHES.value - local_matches == 3  # noqa: PLR2004
+    assert LOCAL_MISSES.value - local_misses == 29  # noqa: PLR2004
+
+    soup = BeautifulSoup(playlist_page_response.text, "html.parser")
+    rows = [[c.string for c in row.find_all("td")] for row in soup.find_all("tr")]
+    assert rows[4:8] == [
+        ["Song 0 - Remastered 2011", "Artist Name 0"],
+        ["song 1 (feat. someone)", "artist name 1, someone"],
+        ["Song 2", "Ártist Name 2"],
+        ["name-3", "artist name 3"],
+    ]
+    assert len(rows) == 35 + 1
+
+
 def test_save_playlist(
     client: FlaskClient,
     mock_create_playlist: adapter._Matcher,
@@ -364,3 +619,295 @@ def test_save_playlist(
     assert mock_add_songs_to_playlist.last_request.json() == {
         "uris": [song["uri"] for song in payload]
     }
+
+
+def _post_listenbrainz_preview(client: FlaskClient) -> TestResponse:
+    with client.session_transaction() as tsession:
+        tsession["selected_songs"] = [
+            {
+                "uri": f"spotify:track:selected-song-{i}",
+                "id": f"selected-song-{i}",
+                "name": f"selected-name-{i}",
+                "artist": f"selected-artist-{i}",
+                "artist_raw": f'["selected-artist-{i}"]',
+            }
+            for i in range(3)
+        ]
+
+    return client.post("/playlist/preview")
+
+
+def _add_misses(db_session: Session, expires: datetime) -> None:
+    for i in range(32):
+        db_session.add(
+            TrackResolution(
+                title_key=f"song {i}",
+                creator_key=f"artist name {i}",
+                match_tier=MatchTier.MISS.value,
+                expires=expires,
+            )
+        )
+    db_session.commit()
+
+
+def test_listenbrainz_track_resolutions_cached(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    _post_listenbrainz_preview(client)
+    playlist_page_response = _post_listenbrainz_preview(client)
+
+    for mock in mock_spotify_search:
+        assert mock.call_count == 1
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+    with get_session() as db_session:
+        match_tiers = db_session.scalars(select(TrackResolution.match_tier)).all()
+    assert sorted(match_tiers) == ["loose"] * 16 + ["strict"] * 16
+
+
+def test_listenbrainz_track_resolution_misses_cached(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    with get_session() as db_session:
+        _add_misses(db_session, datetime.now(tz=UTC) + timedelta(hours=1))
+
+    playlist_page_response = _post_listenbrainz_preview(client)
+
+    for mock in mock_spotify_search:
+        assert not mock.called
+    soup = BeautifulSoup(playlist_page_response.text, "html.parser")
+    assert len(soup.find_all("tr")) == 3 + 1  # Only the selected songs
+
+
+def test_listenbrainz_track_resolution_misses_expire(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    with get_session() as db_session:
+        _add_misses(db_session, datetime.now(tz=UTC) - timedelta(seconds=1))
+
+    playlist_page_response = _post_listenbrainz_preview(client)
+
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+
+def test_listenbrainz_rejected_artists_skipped(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,
+    mock_listenbrainz_radio_requests_bad_artists: list[adapter._Matcher],
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    retries_avoided = RADIO_RETRIES_AVOIDED.value
+    with client.session_transaction() as tsession:
+        tsession["selected_songs"] = [
+            {
+                "uri": f"spotify:track:selected-song-{i}",
+                "id": f"selected-song-{i}",
+                "name": f"selected-name-{i}",
+                "artist": f"selected-artist-{i}",
+                "artist_raw": f'["selected-artist-{i}","selected-artist-{i + 3}"]',
+            }
+            for i in range(3)
+        ]
+
+    client.post("/playlist/preview")
+    with get_session() as db_session:
+        db_session.execute(delete(CacheEntry))  # Force a fresh lb-radio request
+    playlist_page_response = client.post("/playlist/preview")
+
+    # Only the first preview has to discover the artists lb-radio can't look up
+    for mock in mock_listenbrainz_radio_requests_bad_artists:
+        assert mock.call_count == 1
+    assert mock_listenbrainz_radio_request.call_count == 2  # noqa: PLR2004
+    assert RADIO_RETRIES_AVOIDED.value == retries_avoided + 3
+
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+
+def test_listenbrainz_rejected_artists_expire(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    with get_session() as db_session:
+        db_session.add(
+            RejectedArtist(
+                artist_key="selected-artist-0",
+                expires=datetime.now(tz=UTC) - timedelta(seconds=1),
+            )
+        )
+
+    playlist_page_response = _post_listenbrainz_preview(client)
+
+    assert mock_listenbrainz_radio_request.called
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+
+def test_listenbrainz_radio_response_cached(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,  # noqa: ARG001
+    mock_listenbrainz_radio_request: adapter._Matcher,
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    _post_listenbrainz_preview(client)
+    playlist_page_response = _post_listenbrainz_preview(client)
+
+    assert mock_listenbrainz_radio_request.call_count == 1
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+
+def test_preview_queued(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,
+    mock_listenbrainz_radio_request: adapter._Matcher,
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    listenbrainz_config.preview_mode = PreviewMode.QUEUE
+
+    queued_response = _post_listenbrainz_preview(client)
+    assert queued_response.status_code == HTTPStatus.SEE_OTHER
+    assert not mock_listenbrainz_radio_request.called
+
+    pending_response = client.get(queued_response.location)
+    soup = BeautifulSoup(pending_response.text, "html.parser")
+    assert soup.find(id="playlist-pending")
+
+    assert run_next_job()
+    assert not run_next_job()
+
+    playlist_page_response = client.get(queued_response.location)
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+
+def test_preview_job_failed(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,
+    requests_mock: Mocker,
+) -> None:
+    listenbrainz_config.preview_mode = PreviewMode.QUEUE
+    requests_mock.get(
+        "https://api.listenbrainz.org/1/explore/lb-radio", status_code=500
+    )
+
+    queued_response = _post_listenbrainz_preview(client)
+    assert run_next_job()
+
+    assert (
+        get_preview_job(
+            UUID(queued_response.location.rsplit("/", 1)[1]), FAKE_USER_ID
+        ).status
+        == JobStatus.FAILED
+    )
+    error_response = client.get(queued_response.location)
+    assert error_response.status_code == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert "ERROR CODE" in error_response.text
+
+
+def test_preview_jobs_run_concurrently(client: FlaskClient) -> None:
+    job_ids = [enqueue_preview_job(FAKE_USER_ID, []) for _ in range(2)]
+    started = []
+    started_lock = Lock()
+    all_started = Event()
+
+    # Only returns once both jobs are being generated at the same time
+    def generate_together(*_: object) -> list:
+        with started_lock:
+            started.append(True)
+            if len(started) == len(job_ids):
+                all_started.set()
+        assert all_started.wait(5)
+        return []
+
+    stop = Event()
+    with patch("mixtapestudy.worker.generate_playlist_songs", generate_together):
+        threads = start_workers(client.application, 2, stop)
+        try:
+            assert all_started.wait(5)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    assert [get_preview_job(job_id, FAKE_USER_ID).status for job_id in job_ids] == [
+        JobStatus.DONE,
+        JobStatus.DONE,
+    ]
+
+
+def test_preview_job_only_visible_to_owner(client: FlaskClient) -> None:
+    job_id = enqueue_preview_job(FAKE_USER_ID, [])
+
+    assert get_preview_job(job_id, FAKE_USER_ID)
+    assert not get_preview_job(job_id, uuid4())
+    assert (
+        client.get(f"/playlist/preview/{uuid4()}").status_code == HTTPStatus.NOT_FOUND
+    )
+
+
+def test_preview_streamed(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,
+    mock_listenbrainz_radio_request: adapter._Matcher,
+    mock_spotify_search: list[adapter._Matcher],
+) -> None:
+    listenbrainz_config.preview_mode = PreviewMode.STREAM
+
+    playlist_page_response = _post_listenbrainz_preview(client)
+    assert playlist_page_response.is_streamed
+    assert playlist_page_response.headers["X-Accel-Buffering"] == "no"
+
+    # The seeds are sent before any radio track has been looked up
+    page = ""
+    chunks = playlist_page_response.iter_encoded()
+    while "selected-name-2" not in page:
+        page += next(chunks).decode()
+    assert not mock_listenbrainz_radio_request.called
+    assert not any(mock.called for mock in mock_spotify_search)
+
+    page += b"".join(chunks).decode()
+    playlist_page_response.set_data(page)
+    _validate_playlist_page(mock_spotify_search, playlist_page_response)
+
+    soup = BeautifulSoup(page, "html.parser")
+    playlist_songs = json.loads(soup.find("input", {"name": "playlist_songs"})["value"])
+    assert len(playlist_songs) == 35  # noqa: PLR2004
+
+
+def test_preview_streamed_upstream_error(
+    client: FlaskClient,
+    listenbrainz_config: MagicMock,
+    mock_listenbrainz_radio_request: adapter._Matcher,  # noqa: ARG001
+    requests_mock: Mocker,
+) -> None:
+    listenbrainz_config.preview_mode = PreviewMode.STREAM
+    requests_mock.get(
+        f"{SPOTIFY_BASE_URL}/search", status_code=500, text="Spotify is down"
+    )
+
+    messages = []
+    sink_id = logger.add(messages.append, level="ERROR", format="{message}")
+    try:
+        playlist_page_response = _post_listenbrainz_preview(client)
+        page = playlist_page_response.get_data(as_text=True)
+    finally:
+        logger.remove(sink_id)
+
+    assert any("Error code:" in message for message in messages)
+    # Too late for an error status, the page ends with the error instead
+    assert playlist_page_response.status_code == HTTPStatus.OK
+    soup = BeautifulSoup(page, "html.parser")
+    assert "selected-name-2" in page
+    assert "Spotify is down" in page
+    assert "ERROR CODE:" in soup.find("h3").string
+    assert not soup.find("input", {"name": "playlist_songs"})
+    assert page.rstrip().endswith("</html>")
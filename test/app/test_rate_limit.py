@@ -0,0 +1,103 @@
+from unittest.mock import patch
+
+import pytest
+from freezegun import freeze_time
+
+from mixtapestudy.rate_limit import RateLimiter, RateLimitExceededError
+
+
+def test_rate_limiter_refills() -> None:
+    rate_limiter = RateLimiter("test", rate=2, burst=2, max_wait=0)
+    rate_limiter.acquire()
+    rate_limiter.acquire()
+
+    with pytest.raises(RateLimitExceededError):
+        rate_limiter.acquire()
+
+    with freeze_time("2020-01-01 00:00:01"):
+        rate_limiter.acquire()
+        rate_limiter.acquire()
+
+
+def test_rate_limiter_shared_between_instances() -> None:
+    RateLimiter("test", rate=1, burst=1, max_wait=0).acquire()
+
+    with pytest.raises(RateLimitExceededError):
+        RateLimiter("test", rate=1, burst=1, max_wait=0).acquire()
+
+
+def test_rate_limiter_waits_for_token() -> None:
+    rate_limiter = RateLimiter("test", rate=4, burst=1, max_wait=1)
+    rate_limiter.acquire()
+
+    with (
+        freeze_time("2020-01-01") as frozen_time,
+        patch("mixtapestudy.rate_limit.time.sleep", side_effect=frozen_time.tick),
+    ):
+        rate_limiter.acquire()
+        assert frozen_time().isoformat() == "2020-01-01T00:00:00.250000"
+
+
+def test_rate_limiter_throttle() -> None:
+    rate_limiter = RateLimiter("test", rate=10, burst=10, max_wait=5)
+    rate_limiter.throttle(retry_after=30)
+
+    with pytest.raises(RateLimitExceededError):
+        rate_limiter.acquire()
+
+    with freeze_time("2020-01-01 00:00:30.1"):
+        rate_limiter.acquire()
+
+
+def test_rate_limiter_refills_after_throttle() -> None:
+    rate_limiter = RateLimiter("test", rate=10, burst=50, max_wait=0)
+    rate_limiter.throttle(retry_after=30)
+
+    # Only what refilled since the block ended, not the whole burst
+    with freeze_time("2020-01-01 00:00:31"):
+        for _ in range(10):
+            rate_limiter.acquire()
+        with pytest.raises(RateLimitExceededError):
+            rate_limiter.acquire()
+
+
+def test_rate_limiter_reserves_batch() -> None:
+    rate_limiter = RateLimiter("test", rate=1, burst=10, max_wait=0, batch=5)
+    rate_limiter.acquire()
+
+    # Another process only gets what's left in the bucket
+    other_rate_limiter = RateLimiter("test", rate=1, burst=10, max_wait=0, batch=5)
+    for _ in range(5):
+        other_rate_limiter.acquire()
+    with pytest.raises(RateLimitExceededError):
+        other_rate_limiter.acquire()
+
+    # While the first still has the rest of its batch
+    for _ in range(4):
+        rate_limiter.acquire()
+    with pytest.raises(RateLimitExceededError):
+        rate_limiter.acquire()
+
+
+def test_rate_limiter_reservation_lapses() -> None:
+    rate_limiter = RateLimiter("test", rate=1, burst=5, max_wait=0, batch=5)
+    rate_limiter.acquire()
+
+    # The unused 4 are gone, only the token that refilled is left
+    with freeze_time("2020-01-01 00:00:01"):
+        rate_limiter.acquire()
+        with pytest.raises(RateLimitExceededError):
+            rate_limiter.acquire()
+
+
+def test_rate_limiter_disabled() -> None:
+    rate_limiter = RateLimiter("test", rate=0, burst=0, max_wait=5, batch=10)
+    for _ in range(100):
+        rate_limiter.acquire()
+
+    rate_limiter.throttle(retry_after=30)
+    with pytest.raises(RateLimitExceededError):
+        rate_limiter.acquire()
+
+    with freeze_time("2020-01-01 00:00:30.1"):
+        rate_limiter.acquire()
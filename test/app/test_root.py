@@ -20,3 +20,15 @@ def test_render_login_without_active_session(
     soup = BeautifulSoup(r.text, "html.parser")
     login_button = soup.find(id="login-button")
     assert login_button.string == "Log in with Spotify"
+
+
+def test_metrics(client: FlaskClient) -> None:
+    client.get("/flask-health-check")
+
+    r = client.get("/metrics")
+    assert r.status_code == HTTPStatus.OK
+    assert r.mimetype == "text/plain"
+    assert (
+        'mixtapestudy_http_request_duration_seconds_count{route="root.flask_health_check"}'
+        in r.text
+    )
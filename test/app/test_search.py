@@ -7,8 +7,10 @@ from bs4 import BeautifulSoup
 from flask import session
 from flask.testing import FlaskClient
 from requests_mock import Mocker, adapter
+from sqlalchemy import select
 
 from mixtapestudy.config import SPOTIFY_BASE_URL
+from mixtapestudy.database import CacheEntry, get_session
 from test.app.conftest import FAKE_ACCESS_TOKEN, FAKE_USER_ID
 
 # TODO: Write tests to handle edge cases and errors
@@ -72,7 +74,7 @@ def test_load_empty_search_page(client: FlaskClient) -> None:
 
 def test_load_search_results(client: FlaskClient, mock_search_request: None) -> None:  # noqa: ARG001
     search_page_response = client.get(
-        f'/search?{urlencode({"search_term": "test-term"})}'
+        f"/search?{urlencode({'search_term': 'test-term'})}"
     )
     assert search_page_response.status_code == HTTPStatus.OK
 
@@ -121,7 +123,7 @@ def test_load_search_with_selected_songs(
         ]
 
     search_page_response = client.get(
-        f'/search?{urlencode({"search_term": "test-term"})}'
+        f"/search?{urlencode({'search_term': 'test-term'})}"
     )
 
     assert search_page_response.status_code == HTTPStatus.OK
@@ -264,3 +266,25 @@ def test_generate_playlist_button_disabled_until_three_songs_selected(
     soup = BeautifulSoup(search_page_response.text, features="html.parser")
     generate_playlist_button = soup.find(id="generate-playlist")
     assert "disabled" in generate_playlist_button.attrs
+
+
+def test_search_results_cached(
+    client: FlaskClient, mock_search_request: adapter._Matcher
+) -> None:
+    client.get(f"/search?{urlencode({'search_term': 'test-term'})}")
+    # Case, whitespace and Unicode width differences share the cached results
+    similar_term = "  \uff34\uff25\uff33\uff34-term "  # Full width "TEST"
+    search_page_response = client.get(
+        f"/search?{urlencode({'search_term': similar_term})}"
+    )
+
+    assert mock_search_request.call_count == 1
+    # Kept in this worker, whatever CACHE_BACKEND is
+    with get_session() as db_session:
+        assert not db_session.scalars(
+            select(CacheEntry).where(CacheEntry.namespace == "spotify_search")
+        ).all()
+
+    soup = BeautifulSoup(search_page_response.text, features="html.parser")
+    search_result_rows = soup.find("table", {"id": "search-results"}).find_all("tr")
+    assert len(search_result_rows) == 8 + 1  # noqa: PLR2004
@@ -0,0 +1,113 @@
+from datetime import UTC, datetime, timedelta
+from unittest.mock import patch
+from uuid import UUID
+
+from flask.testing import FlaskClient
+from freezegun import freeze_time
+from requests_mock import Mocker, adapter
+
+from mixtapestudy.database import User, get_session
+from mixtapestudy.routes.util import load_user
+from mixtapestudy.token_refresher import (
+    BACKGROUND_TOKEN_REFRESH_FAILURES,
+    BACKGROUND_TOKEN_REFRESHES,
+    refresh_expiring_tokens,
+)
+from test.app.conftest import FAKE_ACCESS_TOKEN, FAKE_USER_ID
+
+REVOKED_USER_ID = UUID("00000000-0000-4000-0000-000000000002")
+
+
+def _set_user_times(token_expires: datetime, last_seen: datetime | None) -> None:
+    with get_session() as db_session:
+        user = db_session.get(User, FAKE_USER_ID)
+        user.token_expires = token_expires
+        user.last_seen = last_seen
+
+
+def test_refreshes_active_users(
+    client: FlaskClient, mock_token_refresh: adapter._Matcher
+) -> None:
+    now = datetime.now(tz=UTC)
+    _set_user_times(token_expires=now + timedelta(minutes=10), last_seen=now)
+    refreshes = BACKGROUND_TOKEN_REFRESHES.value
+
+    assert refresh_expiring_tokens(client.application) == 1
+
+    assert mock_token_refresh.call_count == 1
+    assert BACKGROUND_TOKEN_REFRESHES.value == refreshes + 1
+    with get_session() as db_session:
+        user = db_session.get(User, FAKE_USER_ID)
+        assert user.access_token == f"{FAKE_ACCESS_TOKEN}_new"
+        assert user.token_expires == now + timedelta(hours=1)
+
+
+def test_skips_inactive_users_and_fresh_tokens(
+    client: FlaskClient, mock_token_refresh: adapter._Matcher
+) -> None:
+    now = datetime.now(tz=UTC)
+    _set_user_times(
+        token_expires=now + timedelta(minutes=10), last_seen=now - timedelta(days=1)
+    )
+    assert refresh_expiring_tokens(client.application) == 0
+
+    _set_user_times(token_expires=now + timedelta(minutes=30), last_seen=now)
+    assert refresh_expiring_tokens(client.application) == 0
+
+    assert not mock_token_refresh.called
+
+
+def test_backs_off_revoked_users(
+    client: FlaskClient,
+    requests_mock: Mocker,
+    mock_token_refresh: adapter._Matcher,
+) -> None:
+    now = datetime.now(tz=UTC)
+    _set_user_times(token_expires=now + timedelta(minutes=10), last_seen=now)
+    with get_session() as db_session:
+        db_session.add(
+            User(
+                id=REVOKED_USER_ID,
+                spotify_id="revoked-spotify-id",
+                email="revoked@email.com",
+                display_name="Revoked Display Name",
+                access_token="revoked-access-token",  # noqa: S106
+                token_expires=now + timedelta(minutes=5),
+                token_scope="fake-scope fake-scope",  # noqa: S106
+                refresh_token="revoked-refresh-token",  # noqa: S106
+                last_seen=now,
+            )
+        )
+    mock_revoked_refresh = requests_mock.post(
+        "https://accounts.spotify.com/api/token",
+        additional_matcher=lambda request: "revoked-refresh-token" in request.text,
+        status_code=400,
+        json={"error": "invalid_grant", "error_description": "Refresh token revoked"},
+    )
+    failures = BACKGROUND_TOKEN_REFRESH_FAILURES.value
+
+    # One user a batch, the revoked user first and then the other in the next
+    with patch("mixtapestudy.config.Config.token_refresh_batch_size", 1):
+        assert refresh_expiring_tokens(client.application) == 2  # noqa: PLR2004
+
+        assert mock_revoked_refresh.call_count == 1
+        assert mock_token_refresh.call_count == 1
+        assert BACKGROUND_TOKEN_REFRESH_FAILURES.value == failures + 1
+        with get_session() as db_session:
+            assert db_session.get(User, REVOKED_USER_ID).refresh_failed_at == now
+
+        # Left out until TOKEN_REFRESH_RETRY_AFTER has passed
+        assert refresh_expiring_tokens(client.application) == 0
+        assert mock_revoked_refresh.call_count == 1
+
+        with freeze_time("2020-01-01 01:00:01"):
+            refresh_expiring_tokens(client.application)
+        assert mock_revoked_refresh.call_count == 2  # noqa: PLR2004
+
+
+def test_load_user_marks_user_seen(client: FlaskClient) -> None:  # noqa: ARG001
+    _set_user_times(
+        token_expires=datetime.now(tz=UTC) + timedelta(hours=1), last_seen=None
+    )
+
+    assert load_user(FAKE_USER_ID).last_seen == datetime.now(tz=UTC)
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import pytest
+
+from mixtapestudy.build_track_match_index import build_track_match_index
+from mixtapestudy.feature_store import FeatureStore
+from mixtapestudy.track_match import (
+    TrackMatchIndex,
+    radio_match_keys,
+    store_match_keys,
+)
+
+
+@pytest.mark.parametrize(
+    ("title", "creator", "keys"),
+    [
+        ("Song", "Artist", [("song", "artist")]),
+        ("Song (Remastered 2011)", "ARTIST", [("song", "artist")]),
+        ("Song - Live at Wembley", "Artist", [("song", "artist")]),
+        ("(Untitled)", "Artist", [("untitled", "artist")]),
+        ("Söng!", "Ártist", [("song", "artist")]),
+        ("Song", "A feat. B", [("song", "a feat b"), ("song", "a")]),
+        ("Song", "A & B", [("song", "a b"), ("song", "a")]),
+        ("Song", "A, B", [("song", "a b"), ("song", "a")]),
+        ("Song", "", []),
+    ],
+)
+def test_radio_match_keys(title: str, creator: str, keys: list) -> None:
+    assert radio_match_keys(title, creator) == keys
+
+
+def test_store_match_keys() -> None:
+    assert store_match_keys("Song - 2011 Remaster", ["A", "B"]) == {
+        ("song", "a b"),
+        ("song", "a"),
+    }
+    assert store_match_keys("Song", []) == set()
+
+
+def test_track_match_index_find(radio_feature_store: str, tmp_path: Path) -> None:
+    feature_store = FeatureStore.open(radio_feature_store)
+    build_track_match_index(feature_store).save(str(tmp_path))
+    track_match_index = TrackMatchIndex.open(str(tmp_path))
+
+    assert [
+        song.id if song else None
+        for song in (
+            track_match_index.find(feature_store, f"song {i}", f"artist name {i}")
+            for i in range(5)
+        )
+    ] == ["local-song-0", "local-song-1", "local-song-2", None, None]
+    song = track_match_index.find(feature_store, "Song 1", "Artist Name 1 & Someone")
+    assert song.artist_raw == ["artist name 1", "someone"]
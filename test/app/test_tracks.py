@@ -0,0 +1,64 @@
+from urllib.parse import urlencode
+
+from requests_mock import Mocker
+
+from mixtapestudy.config import SPOTIFY_BASE_URL
+from mixtapestudy.models import Song
+from mixtapestudy.tracks import get_tracks
+from test.app.conftest import FAKE_ACCESS_TOKEN
+
+
+def _track_json(track_id: str) -> dict:
+    return {
+        "uri": f"spotify:track:{track_id}",
+        "id": track_id,
+        "name": f"name {track_id}",
+        "artists": [{"name": f"artist {track_id}"}, {"name": "other artist"}],
+    }
+
+
+def test_get_tracks_batched(requests_mock: Mocker) -> None:
+    track_ids = [f"song-{i}" for i in range(60)]
+    mock_tracks = [
+        requests_mock.get(
+            f"{SPOTIFY_BASE_URL}/tracks?{urlencode({'ids': ','.join(batch_ids)})}",
+            request_headers={"Authorization": f"Bearer {FAKE_ACCESS_TOKEN}"},
+            json={"tracks": [_track_json(track_id) for track_id in batch_ids]},
+            complete_qs=True,
+        )
+        for batch_ids in (track_ids[:50], track_ids[50:])
+    ]
+
+    # Duplicates are only looked up once
+    songs = get_tracks(track_ids + track_ids[:5], FAKE_ACCESS_TOKEN)
+
+    assert [mock.call_count for mock in mock_tracks] == [1, 1]
+    assert list(songs) == track_ids
+    assert songs["song-59"] == Song(
+        uri="spotify:track:song-59",
+        id="song-59",
+        name="name song-59",
+        artist="artist song-59, other artist",
+        artist_raw=["artist song-59", "other artist"],
+    )
+
+
+def test_get_tracks_cached(requests_mock: Mocker) -> None:
+    mock_first = requests_mock.get(
+        f"{SPOTIFY_BASE_URL}/tracks?ids=song-0,song-1",
+        json={"tracks": [_track_json("song-0"), None]},
+        complete_qs=True,
+    )
+    mock_second = requests_mock.get(
+        f"{SPOTIFY_BASE_URL}/tracks?ids=song-1,song-2",
+        json={"tracks": [None, _track_json("song-2")]},
+        complete_qs=True,
+    )
+
+    assert list(get_tracks(["song-0", "song-1"], FAKE_ACCESS_TOKEN)) == ["song-0"]
+    # Only song-0 was found, so it's the only one left out of the next request
+    songs = get_tracks(["song-0", "song-1", "song-2"], FAKE_ACCESS_TOKEN)
+
+    assert mock_first.call_count == 1
+    assert mock_second.call_count == 1
+    assert list(songs) == ["song-0", "song-2"]
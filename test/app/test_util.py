@@ -1,15 +1,27 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import UTC, datetime, timedelta
 from urllib.parse import urlencode
 
 import pytest
+from flask import g
 from flask.testing import FlaskClient
-from requests_mock import adapter
+from freezegun import freeze_time
+from loguru import logger
+from requests_mock import Mocker, adapter
 from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
+from mixtapestudy.data import UserData
 from mixtapestudy.database import User, get_session
 from mixtapestudy.errors import UserDatabaseRowMissingError, UserIDMissingError
-from mixtapestudy.routes.util import get_user
+from mixtapestudy.routes.util import (
+    TOKEN_REFRESHES,
+    TOKEN_REFRESHES_COALESCED,
+    forget_user,
+    get_user,
+    load_user,
+)
 from test.app.conftest import FAKE_ACCESS_TOKEN, FAKE_REFRESH_TOKEN, FAKE_USER_ID
 
 
@@ -63,3 +75,69 @@ def test_get_user_expired_token(
     assert db_user.access_token == f"{FAKE_ACCESS_TOKEN}_new"
     assert db_user.refresh_token == f"{FAKE_REFRESH_TOKEN}_new"
     assert db_user.token_expires == datetime(2020, 1, 1, 1, 0, 0, tzinfo=UTC)
+
+
+def test_get_user_expired_token_refreshed_once(
+    client: FlaskClient, requests_mock: Mocker
+) -> None:
+    with get_session() as db_session:
+        initial_user = db_session.get(User, FAKE_USER_ID)
+        initial_user.token_expires = datetime.now(tz=UTC) - timedelta(days=1)
+    refreshes = TOKEN_REFRESHES.value
+    coalesced = TOKEN_REFRESHES_COALESCED.value
+
+    def slow_token_response(*_: object) -> dict:
+        time.sleep(0.2)  # Long enough for the other requests to queue up
+        return {
+            "access_token": f"{FAKE_ACCESS_TOKEN}_new",
+            "expires_in": 3600,
+            "scope": "fake-scope fake-scope",
+        }
+
+    mock_token_refresh = requests_mock.post(
+        "https://accounts.spotify.com/api/token", json=slow_token_response
+    )
+
+    def load_user_in_app() -> UserData:
+        with client.application.app_context():
+            g.logger = logger.bind()
+            return load_user(FAKE_USER_ID)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        users = list(executor.map(lambda _: load_user_in_app(), range(4)))
+
+    assert mock_token_refresh.call_count == 1
+    assert {user.access_token for user in users} == {f"{FAKE_ACCESS_TOKEN}_new"}
+    assert TOKEN_REFRESHES.value == refreshes + 1
+    assert TOKEN_REFRESHES_COALESCED.value == coalesced + 3  # noqa: PLR2004
+
+
+def _get_user_in_new_request(client: FlaskClient) -> UserData:
+    with client.application.test_request_context() as context:
+        g.pop("user", None)  # The test app context outlives each request
+        context.session["id"] = FAKE_USER_ID
+        return get_user()
+
+
+def test_get_user_cached_between_requests(client: FlaskClient) -> None:
+    user = _get_user_in_new_request(client)
+    with get_session() as db_session:
+        db_session.get(User, FAKE_USER_ID).display_name = "New Display Name"
+
+    assert _get_user_in_new_request(client) is user
+
+    forget_user(FAKE_USER_ID)
+    assert _get_user_in_new_request(client).display_name == "New Display Name"
+
+
+def test_get_user_cache_skipped_near_expiry(
+    client: FlaskClient, mock_token_refresh: adapter._Matcher
+) -> None:
+    user = _get_user_in_new_request(client)
+
+    with freeze_time("2020-01-01 00:56:00"):
+        refreshed_user = _get_user_in_new_request(client)
+
+    assert mock_token_refresh.called
+    assert refreshed_user.access_token != user.access_token
+    assert _get_user_in_new_request(client) is refreshed_user
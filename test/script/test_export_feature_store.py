@@ -0,0 +1,38 @@
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+
+from mixtapestudy.feature_store import FeatureStore
+from track_data.export_feature_store import export_feature_store
+from track_data.generate_feature_sources import create_features_table
+
+
+def test_export_feature_store(tmp_path: Path) -> None:
+    with closing(sqlite3.connect(tmp_path / "features.db")) as connection:
+        create_features_table(connection)
+        connection.executemany(
+            "INSERT INTO features (spotify_id, isrc, track_name, artist, tempo, "
+            "explicit, key) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                ("id-b", "ISRC-B", "Name B", "['Artist', 'Ártist']", 120.5, "True", 5),
+                ("id-a", None, "Name A", None, "not a number", "False", "C#"),
+                (None, "ISRC-C", None, "Artist C", None, 1, 11),
+            ],
+        )
+        connection.commit()
+
+        tracks = export_feature_store(connection, str(tmp_path / "feature_store"))
+
+    store = FeatureStore.open(str(tmp_path / "feature_store"))
+    assert tracks == len(store) == 3  # noqa: PLR2004
+    # Text that isn't a number is unknown, not 0
+    np.testing.assert_array_equal(store.columns["tempo"], [120.5, np.nan, np.nan])
+    np.testing.assert_array_equal(store.columns["danceability"], [np.nan] * 3)
+    np.testing.assert_array_equal(store.columns["explicit"], [1, 0, 1])
+    np.testing.assert_array_equal(store.columns["key"], [5, -1, 11])
+    assert store.text("artist", 0) == "['Artist', 'Ártist']"
+    assert store.text("track_name", 2) == ""
+    assert list(store.find("spotify_id", ["id-a", "id-b"])) == [1, 0]
+    assert list(store.find("isrc", ["ISRC-C"])) == [2]
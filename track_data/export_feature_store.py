@@ -0,0 +1,129 @@
+"""Export features.db to the FEATURE_STORE LOCAL recommendations are served from.
+
+See mixtapestudy.feature_store for the format. Re-export whenever features.db
+changes, and rebuild any FEATURE_INDEX after, its rows are rows of the store.
+"""
+
+import argparse
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+from loguru import logger
+
+from mixtapestudy.feature_store import (
+    FLOAT_COLUMNS,
+    ID_COLUMNS,
+    INT8_COLUMNS,
+    TEXT_COLUMNS,
+    write_feature_store,
+)
+from track_data.logsetup import setup_logger
+
+setup_logger(logger)
+
+BATCH_SIZE = 100_000
+
+# The datasets disagree on types. The feature columns have numeric affinity, so
+# SQLite converted every well-formed number and anything still text or a blob
+# isn't one. Those are NULL like missing values, NaN or -1 in the store
+_NUMBER = "typeof({0}) IN ('integer', 'real')"
+_EXPRESSIONS = {
+    **{
+        column: f"CASE WHEN {_NUMBER.format(column)} THEN {column} END"
+        for column in FLOAT_COLUMNS
+    },
+    **{
+        column: f"CASE WHEN {_NUMBER.format(column)} THEN CAST({column} AS INTEGER) "
+        "ELSE -1 END"
+        for column in INT8_COLUMNS
+    },
+    "explicit": (
+        "CASE WHEN explicit IN ('True', 'true') THEN 1 "
+        "WHEN explicit IN ('False', 'false') THEN 0 "
+        f"WHEN {_NUMBER.format('explicit')} THEN CAST(explicit AS INTEGER) "
+        "ELSE -1 END"
+    ),
+    **{column: f"IFNULL({column}, '')" for column in (*ID_COLUMNS, *TEXT_COLUMNS)},
+}
+
+
+def export_feature_store(connection: sqlite3.Connection, store_dir: str) -> int:
+    """Write every track in features.db to the store, in rowid order.
+
+    Each batch is copied into the store's arrays as it's read, so no more than
+    a batch of rows is ever held as Python objects.
+    """
+    (tracks,) = connection.execute("SELECT count(*) FROM features").fetchone()
+    # NULL is NaN once it's in a float array
+    columns = {
+        **{column: np.empty(tracks, dtype=np.float32) for column in FLOAT_COLUMNS},
+        **{column: np.empty(tracks, dtype=np.int8) for column in INT8_COLUMNS},
+    }
+    id_batches = {column: [] for column in ID_COLUMNS}
+    text_blobs = {column: [] for column in TEXT_COLUMNS}
+    text_offsets = {
+        column: np.zeros(tracks + 1, dtype=np.int64) for column in TEXT_COLUMNS
+    }
+
+    read = 0
+    with closing(
+        connection.execute(
+            f"SELECT {', '.join(_EXPRESSIONS.values())} FROM features ORDER BY rowid"  # noqa: S608
+        )
+    ) as cursor:
+        while rows := cursor.fetchmany(BATCH_SIZE):
+            start, end = read, read + len(rows)
+            for column, values in zip(
+                _EXPRESSIONS, zip(*rows, strict=True), strict=True
+            ):
+                if column in columns:
+                    columns[column][start:end] = values
+                elif column in id_batches:
+                    id_batches[column].append(
+                        np.array([value.encode() for value in values])
+                    )
+                else:
+                    encoded = [value.encode() for value in values]
+                    offsets = text_offsets[column]
+                    np.cumsum(
+                        [len(value) for value in encoded],
+                        out=offsets[start + 1 : end + 1],
+                    )
+                    offsets[start + 1 : end + 1] += offsets[start]
+                    text_blobs[column].append(b"".join(encoded))
+            read = end
+            logger.debug("Read {} rows", read)
+
+    for column in ID_COLUMNS:
+        columns[column] = (
+            np.concatenate(id_batches[column]) if id_batches[column] else []
+        )
+    for column in TEXT_COLUMNS:
+        columns[column] = np.frombuffer(b"".join(text_blobs[column]), np.uint8)
+        columns[f"{column}_offsets"] = text_offsets[column]
+
+    write_feature_store(store_dir, columns)
+    return tracks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("features_db", nargs="?", default="../features.db")
+    parser.add_argument("store_dir", nargs="?", default="../feature_store")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with closing(sqlite3.connect(args.features_db)) as connection:
+        tracks = export_feature_store(connection, args.store_dir)
+    logger.info(
+        "Exported {} tracks to {} in {:.1f}s",
+        tracks,
+        args.store_dir,
+        time.perf_counter() - start,
+    )
+
+
+if __name__ == "__main__":
+    main()